@@ -0,0 +1,44 @@
+"""create appointments table
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "appointments",
+        sa.Column("appointment_id", sa.String(), primary_key=True),
+        sa.Column("doctor_id", sa.String(), nullable=True),
+        sa.Column("doctor_name", sa.String(), nullable=True),
+        sa.Column("doctor_email", sa.String(), nullable=True),
+        sa.Column("specialization", sa.String(), nullable=True),
+        sa.Column("patient_username", sa.String(), nullable=True),
+        sa.Column("patient_full_name", sa.String(), nullable=True),
+        sa.Column("patient_email", sa.String(), nullable=True),
+        sa.Column("time", sa.String(), nullable=True),
+        sa.Column("date", sa.String(), nullable=True),
+        sa.Column("diagnosis", sa.String(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False, server_default="pending"),
+        sa.Column("created_at", sa.String(), nullable=True),
+        sa.Column("updated_at", sa.String(), nullable=True),
+    )
+    op.create_index("ix_appointments_doctor_id_status", "appointments", ["doctor_id", "status"])
+    op.create_index("ix_appointments_patient_username_time", "appointments", ["patient_username", "time"])
+    op.create_index("ix_appointments_status", "appointments", ["status"])
+
+
+def downgrade():
+    op.drop_index("ix_appointments_status", table_name="appointments")
+    op.drop_index("ix_appointments_patient_username_time", table_name="appointments")
+    op.drop_index("ix_appointments_doctor_id_status", table_name="appointments")
+    op.drop_table("appointments")
@@ -0,0 +1,26 @@
+"""add appointment slot columns
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("appointments", sa.Column("start_at", sa.String(), nullable=True))
+    op.add_column("appointments", sa.Column("end_at", sa.String(), nullable=True))
+    op.create_index("ix_appointments_doctor_id_start_at", "appointments", ["doctor_id", "start_at"])
+
+
+def downgrade():
+    op.drop_index("ix_appointments_doctor_id_start_at", table_name="appointments")
+    op.drop_column("appointments", "end_at")
+    op.drop_column("appointments", "start_at")
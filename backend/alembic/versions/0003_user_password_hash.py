@@ -0,0 +1,27 @@
+"""add users.password_hash
+
+Existing rows keep password_plain until their next successful login,
+when the password is hashed and the plaintext cleared.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("password_hash", sa.String(), nullable=True))
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.alter_column("password_plain", existing_type=sa.String(), nullable=True)
+
+
+def downgrade():
+    op.drop_column("users", "password_hash")
@@ -0,0 +1,25 @@
+"""add users.notification_mode
+
+"immediate" (default) emails doctors on every booking change; "digest"
+batches them into one summary per DIGEST_WINDOW_MINUTES.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("notification_mode", sa.String(), nullable=False, server_default="immediate"))
+
+
+def downgrade():
+    op.drop_column("users", "notification_mode")
@@ -0,0 +1,30 @@
+"""create rate_limits table
+
+Token buckets shared by every API worker when RATE_LIMIT_BACKEND=database.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rate_limits",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("full_at", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_rate_limits_full_at", "rate_limits", ["full_at"])
+
+
+def downgrade():
+    op.drop_index("ix_rate_limits_full_at", table_name="rate_limits")
+    op.drop_table("rate_limits")
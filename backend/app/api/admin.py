@@ -1,62 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBasic, HTTPBasicCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
-from pathlib import Path
-import json
 import uuid
 import secrets
-from datetime import datetime
+import tempfile
+import time
+from datetime import date, datetime
 
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
+from app.db.appointment_archive import with_history
+from app.db.appointment_store import AppointmentStore, get_appointment_store
+from app.core.admission import admit_write
+from app.core.config import settings
+from app.core.passwords import apply_new_hash, credential_verifier
+from app.core.security import bearer_scheme, create_tokens, revocations, user_from_token
+from app.core.timing import TimedRoute, request_profiler, timed
 from app.models.user import User
-from pydantic import BaseModel
+from app.schemas.appointment import AppointmentPage
+from app.schemas.auth import TokenUser
+from app.schemas.doctor import DoctorOut
+from app.services.doctor_directory import doctor_directory, etag_matches
+from app.services.doctor_import import DoctorImport, detect_format
+from app.services.doctor_search import doctor_search
+from app.services.events import doctor_channel, publish_appointment
+from app.services.listing import AppointmentListing
+from app.services.scheduling import parse_slot
+from app.utils.lock_utils import doctor_locks, holding_appointment
+from pydantic import BaseModel, TypeAdapter
 
-router = APIRouter(prefix="/admin", tags=["admin"])
+router = APIRouter(prefix="/admin", tags=["admin"], route_class=TimedRoute)
 
-security = HTTPBasic()
+security = HTTPBasic(auto_error=False)
 
 # ======================
-# Hardcoded admin credentials
+# Hardcoded admin credentials (argon2 hashes)
 # ======================
 ADMINS = [
-    {"username": "danielle.johnsonA01", "password": "Admin#01Pass", "full_name": "Danielle Johnson", "email": "danielle.johnsonA01@example.com"},
-    {"username": "john.taylorA02", "password": "Admin#02Pass", "full_name": "John Taylor", "email": "john.taylorA02@example.com"},
-    {"username": "erica.mcclainA03", "password": "Admin#03Pass", "full_name": "Erica McClain", "email": "erica.mcclainA03@example.com"},
+    {"username": "danielle.johnsonA01", "password_hash": "$argon2id$v=19$m=65536,t=3,p=4$oLTWmtN6r9Xa+z/HWAuBkA$nRIBzDPbsWHXEIPLyYI0KDsfIhAWTX6WMt//6T5LbbU", "full_name": "Danielle Johnson", "email": "danielle.johnsonA01@example.com"},
+    {"username": "john.taylorA02", "password_hash": "$argon2id$v=19$m=65536,t=3,p=4$1FrrvRci5ByDkPL+f6/1Pg$bGWJ9UQrkyDuu+4dOH8iqO6e9SwlsPH1I3oNA8UaV1o", "full_name": "John Taylor", "email": "john.taylorA02@example.com"},
+    {"username": "erica.mcclainA03", "password_hash": "$argon2id$v=19$m=65536,t=3,p=4$hpCSUkppTam1dm5trdVaSw$ERLWH30uSIeb2yRa1TQTz++okjKn+z1y4KRX3Xu3T7Q", "full_name": "Erica McClain", "email": "erica.mcclainA03@example.com"},
 ]
 
-# ======================
-# Appointment file
-# ======================
-APPOINTMENT_FILE = Path(__file__).parent.parent / "db" / "appointments.json"
-
-def load_appointments() -> list[dict]:
-    if not APPOINTMENT_FILE.exists():
-        return []
-    try:
-        with open(APPOINTMENT_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if isinstance(data, dict) and "appointments" in data:
-            return data["appointments"]
-        raise HTTPException(status_code=500, detail="appointments.json format invalid")
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="appointments.json is invalid JSON")
-
-def save_appointments(appointments: list[dict]):
-    with open(APPOINTMENT_FILE, "w", encoding="utf-8") as f:
-        json.dump({"appointments": appointments}, f, indent=4)
-
 # ======================
 # Admin verification
 # ======================
 def verify_admin(username: str, password: str) -> dict | None:
     for admin in ADMINS:
-        if secrets.compare_digest(admin["username"], username) and secrets.compare_digest(admin["password"], password):
-            return admin
+        if secrets.compare_digest(admin["username"], username):
+            ok, _ = credential_verifier.verify_basic(password, admin["password_hash"])
+            return admin if ok else None
     return None
 
-def get_current_admin(credentials: HTTPBasicCredentials = Depends(security)) -> dict:
-    admin = verify_admin(credentials.username, credentials.password)
+@timed("auth")
+def get_current_admin(
+    token: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    credentials: HTTPBasicCredentials | None = Depends(security)
+) -> dict:
+    if token:
+        admin = user_from_token(token.credentials, "admin")
+        return {"username": admin.username, "full_name": admin.full_name, "email": admin.email}
+    admin = verify_admin(credentials.username, credentials.password) if credentials else None
     if not admin:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
     return admin
@@ -69,30 +76,47 @@ class AdminLogin(BaseModel):
     password: str
 
 @router.post("/login")
-def login(admin_login: AdminLogin, db: Session = Depends(get_db)):
-    admin = db.query(User).filter(
+async def login(admin_login: AdminLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(
         User.username == admin_login.username,
         User.role == "admin"
-    ).first()
-    if not admin or admin.password_plain != admin_login.password:
+    ))
+    admin = result.scalars().first()
+    if not admin:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    return {"message": "Login successful", "admin": admin.username}
+    ok, new_hash = await credential_verifier.verify(admin_login.password, admin.password_hash, admin.password_plain)
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        apply_new_hash(admin, new_hash)
+        await db.commit()
+    return {"message": "Login successful", "admin": admin.username, **create_tokens(TokenUser.from_user(admin))}
 
 # ======================
 # Doctor CRUD
 # ======================
-@router.get("/doctors", response_model=List[dict])
-def list_doctors(db: Session = Depends(get_db), current_admin: dict = Depends(get_current_admin)):
-    doctors = db.query(User).filter(User.role == "doctor").all()
-    return [
-        {
-            "id": str(d.id),
-            "name": d.full_name,
-            "email": d.email,
-            "specialization": d.specialization
-        }
-        for d in doctors
-    ]
+DOCTOR_LIST = TypeAdapter(List[DoctorOut])
+
+@router.get("/doctors", response_model=List[DoctorOut])
+def list_doctors(
+    if_none_match: str | None = Header(None),
+    db: Session = Depends(get_db),
+    current_admin: dict = Depends(get_current_admin)
+):
+    def render() -> bytes:
+        doctors = db.query(User).filter(User.role == "doctor").all()
+        return DOCTOR_LIST.dump_json([
+            DoctorOut(id=str(d.id), name=d.full_name, email=d.email, specialization=d.specialization)
+            for d in doctors
+        ])
+
+    # Served from the directory cache; the query only runs after a change or TTL expiry
+    view = doctor_directory.get("admin:list", render)
+    headers = {"ETag": view.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, view.etag):
+        doctor_directory.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=view.body, media_type="application/json", headers=headers)
 
 @router.post("/doctors")
 def add_doctor(
@@ -110,14 +134,43 @@ def add_doctor(
         username=username,
         full_name=full_name,
         email=email,
-        password_plain=password,
+        password_hash=credential_verifier.hash_sync(password),
         specialization=specialization
     )
     db.add(new_doctor)
     db.commit()
     db.refresh(new_doctor)
+    doctor_directory.invalidate()
+    doctor_search.upsert(new_doctor.id, new_doctor.full_name, new_doctor.specialization)
     return {"message": f"Doctor {full_name} added successfully", "id": str(new_doctor.id)}
 
+@router.post("/doctors/import")
+async def import_doctors(
+    request: Request,
+    format: str | None = None,
+    db: Session = Depends(get_db),
+    current_admin: dict = Depends(get_current_admin)
+):
+    """Bulk-add doctors from a CSV (text/csv) or NDJSON (application/x-ndjson) request body.
+
+    Columns: username, full_name, email, specialization and password (or an
+    existing password_hash). Bad rows are reported individually; the rest load.
+    """
+    fmt = detect_format(request.headers.get("content-type"), format)
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson (or pass ?format=csv|ndjson)")
+
+    # Spool the upload (memory first, disk past 1 MB), then validate and load it in one pass off the event loop
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        result = await run_in_threadpool(DoctorImport(db).run, upload, fmt)
+    if result["imported"]:
+        # Publishes on the change bus (a pg_notify round trip with Postgres), so off the event loop
+        await run_in_threadpool(doctor_directory.invalidate)
+    return result
+
 @router.put("/doctors/{doctor_id}")
 def update_doctor(
     doctor_id: str,
@@ -138,9 +191,14 @@ def update_doctor(
     if specialization:
         doctor.specialization = specialization
     if password:
-        doctor.password_plain = password
+        apply_new_hash(doctor, credential_verifier.hash_sync(password))
+        doctor.tokens_valid_after = time.time()
     db.commit()
     db.refresh(doctor)
+    doctor_directory.invalidate()
+    doctor_search.upsert(doctor.id, doctor.full_name, doctor.specialization)
+    if password:
+        revocations.revoke_subject(doctor.id, doctor.tokens_valid_after)
     return {"message": f"Doctor {doctor.full_name} updated successfully"}
 
 @router.delete("/doctors/{doctor_id}")
@@ -150,6 +208,9 @@ def delete_doctor(doctor_id: str, db: Session = Depends(get_db), current_admin:
         raise HTTPException(status_code=404, detail="Doctor not found")
     db.delete(doctor)
     db.commit()
+    doctor_directory.invalidate()
+    doctor_search.remove(doctor.id)
+    revocations.revoke_subject(doctor.id)
     return {"message": f"Doctor {doctor.full_name} deleted successfully"}
 # #---patient----
 # @router.get("/patients", response_model=List[dict])
@@ -170,70 +231,164 @@ def delete_doctor(doctor_id: str, db: Session = Depends(get_db), current_admin:
 # ======================
 # Appointment Management
 # ======================
-@router.get("/appointments")
-def view_appointments(current_admin: dict = Depends(get_current_admin)):
-    """View all appointments"""
-    return {"appointments": load_appointments()}
-
-@router.get("/appointments/doctor/{doctor_id}")
-def view_appointments_by_doctor(doctor_id: str, current_admin: dict = Depends(get_current_admin)):
-    """View all appointments assigned to a specific doctor"""
-    appointments = load_appointments()
-    doctor_appointments = [a for a in appointments if str(a.get("doctor_id")) == doctor_id]
-    return {"appointments": doctor_appointments}
-
-@router.post("/appointments/assign")
+@router.get("/appointments", response_model=AppointmentPage, response_model_exclude_unset=True)
+def view_appointments(
+    doctor_id: str | None = None,
+    listing: AppointmentListing = Depends(),
+    store: AppointmentStore = Depends(get_appointment_store),
+    current_admin: dict = Depends(get_current_admin)
+):
+    """View appointments, a page at a time (or streamed with format=ndjson|csv)"""
+    if listing.streaming:
+        return listing.export(store, "appointments", doctor_id=doctor_id)
+    appointments, next_cursor = listing.fetch(store, doctor_id=doctor_id)
+    return {"appointments": appointments, "next_cursor": next_cursor}
+
+@router.get("/appointments/doctor/{doctor_id}", response_model=AppointmentPage, response_model_exclude_unset=True)
+def view_appointments_by_doctor(
+    doctor_id: str,
+    listing: AppointmentListing = Depends(),
+    store: AppointmentStore = Depends(get_appointment_store),
+    current_admin: dict = Depends(get_current_admin)
+):
+    """View appointments assigned to a specific doctor, paginated like /appointments"""
+    if listing.streaming:
+        return listing.export(store, f"appointments-{doctor_id}", doctor_id=doctor_id)
+    appointments, next_cursor = listing.fetch(store, doctor_id=doctor_id)
+    return {"appointments": appointments, "next_cursor": next_cursor}
+
+@router.post("/appointments/assign", dependencies=[Depends(admit_write, scope="function")])
 def assign_appointment_to_doctor(
     appointment_id: str,
     doctor_id: str,
     db: Session = Depends(get_db),
+    store: AppointmentStore = Depends(get_appointment_store),
     current_admin: dict = Depends(get_current_admin)
 ):
     """Assign an existing appointment to a doctor"""
-    appointments = load_appointments()
-    for appt in appointments:
-        if appt["appointment_id"] == appointment_id:
-            doctor = db.query(User).filter(User.id == doctor_id, User.role == "doctor").first()
-            if not doctor:
-                raise HTTPException(status_code=404, detail="Doctor not found")
-            appt["doctor_id"] = doctor_id
-            appt["doctor"] = doctor.full_name
-            save_appointments(appointments)
-            return {"message": f"Appointment {appointment_id} assigned to Dr. {doctor.full_name}"}
-    raise HTTPException(status_code=404, detail="Appointment not found")
-
-@router.put("/appointments/{appointment_id}")
+    doctor = db.query(User).filter(User.id == doctor_id, User.role == "doctor").first()
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    # Moves the appointment between two doctors' schedules, so hold both
+    with holding_appointment(store, appointment_id, doctor_id) as appointment:
+        updated = store.update_if_free(
+            appointment_id,
+            doctor_id=doctor_id,
+            doctor_name=doctor.full_name,
+            doctor_email=doctor.email,
+            specialization=doctor.specialization,
+        )
+        if updated is None:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+    # The previous doctor hears about it too
+    publish_appointment("updated", updated, doctor_channel(appointment.get("doctor_id")))
+    return {"message": f"Appointment {appointment_id} assigned to Dr. {doctor.full_name}"}
+
+@router.put("/appointments/{appointment_id}", dependencies=[Depends(admit_write, scope="function")])
 def update_appointment(
     appointment_id: str,
     diagnosis: str | None = None,
     date: str | None = None,
     time: str | None = None,
     status_value: str | None = None,
+    store: AppointmentStore = Depends(get_appointment_store),
     current_admin: dict = Depends(get_current_admin)
 ):
     """Update appointment details"""
-    appointments = load_appointments()
-    for appt in appointments:
-        if appt["appointment_id"] == appointment_id:
-            if diagnosis:
-                appt["diagnosis"] = diagnosis
-            if date:
-                appt["date"] = date
-            if time:
-                appt["time"] = time
-            if status_value:
-                appt["status"] = status_value
-            save_appointments(appointments)
-            return {"message": f"Appointment {appointment_id} updated successfully"}
-    raise HTTPException(status_code=404, detail="Appointment not found")
-
-@router.delete("/appointments/doctor/{doctor_id}")
-def delete_appointments_by_doctor(doctor_id: str, current_admin: dict = Depends(get_current_admin)):
-    """Delete all appointments for a given doctor"""
-    appointments = load_appointments()
-    remaining = [a for a in appointments if str(a.get("doctor_id")) != doctor_id]
-    deleted_count = len(appointments) - len(remaining)
+    changes = {}
+    if diagnosis:
+        changes["diagnosis"] = diagnosis
+    if date:
+        changes["date"] = date
+    if time:
+        changes["time"] = time
+    if status_value:
+        changes["status"] = status_value
+    with holding_appointment(store, appointment_id) as appointment:
+        if time or date:
+            slot = parse_slot(time or appointment.get("time"), date or appointment.get("date"))
+            changes["start_at"], changes["end_at"] = slot if slot else (None, None)
+        updated = store.update_if_free(appointment_id, **changes)
+        if updated is None:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+    publish_appointment("updated", updated)
+    return {"message": f"Appointment {appointment_id} updated successfully"}
+
+@router.delete("/appointments/doctor/{doctor_id}", dependencies=[Depends(admit_write, scope="function")])
+def delete_appointments_by_doctor(
+    doctor_id: str,
+    store: AppointmentStore = Depends(get_appointment_store),
+    current_admin: dict = Depends(get_current_admin)
+):
+    """Delete all appointments for a given doctor, archived ones included"""
+    with doctor_locks.hold(doctor_id):
+        deleted_count = with_history(store).delete_where(doctor_id=doctor_id)
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="No appointments found for this doctor")
-    save_appointments(remaining)
     return {"message": f"Deleted {deleted_count} appointments for doctor ID {doctor_id}"}
+
+# ======================
+# Dashboard Stats
+# ======================
+@router.get("/stats")
+def appointment_stats(
+    date_from: date | None = None,
+    date_to: date | None = None,
+    store: AppointmentStore = Depends(get_appointment_store),
+    current_admin: dict = Depends(get_current_admin)
+):
+    """Appointment counts by status, by doctor and by day (date_from/date_to limit the days),
+    read from counters every write keeps up to date, archived appointments included"""
+    counters = with_history(store).counters()
+    return counters.report(date_from.isoformat() if date_from else None, date_to.isoformat() if date_to else None)
+
+@router.post("/stats/rebuild")
+def rebuild_appointment_stats(
+    store: AppointmentStore = Depends(get_appointment_store),
+    current_admin: dict = Depends(get_current_admin)
+):
+    """Recount the stats counters from every stored appointment"""
+    source = with_history(store)
+    source.rebuild_counters()
+    return {"message": "Appointment stats rebuilt", "total": source.counters().total}
+
+# ======================
+# Request Profiling
+# ======================
+@router.post("/profiling")
+def enable_profiling(
+    sample_rate: float = Query(0.01, gt=0, le=1),
+    duration_seconds: float = Query(300, gt=0, le=settings.PROFILE_MAX_SECONDS),
+    current_admin: dict = Depends(get_current_admin)
+):
+    """Profile a random `sample_rate` of requests for the next `duration_seconds`"""
+    request_profiler.enable(sample_rate, duration_seconds)
+    return request_profiler.status()
+
+@router.delete("/profiling")
+def disable_profiling(current_admin: dict = Depends(get_current_admin)):
+    """Stop sampling; profiles collected so far stay downloadable"""
+    request_profiler.disable()
+    return request_profiler.status()
+
+@router.get("/profiling")
+def profiling_status(current_admin: dict = Depends(get_current_admin)):
+    return request_profiler.status()
+
+@router.get("/profiling/{profile_id}")
+def download_profile(
+    profile_id: str,
+    format: str = Query("pstats", pattern="^(pstats|text)$"),
+    current_admin: dict = Depends(get_current_admin)
+):
+    """A collected profile: pstats data (snakeviz, `python -m pstats`) or a text summary"""
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return Response(request_profiler.render_text(profile["data"]), media_type="text/plain")
+    return Response(
+        profile["data"],
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'},
+    )
@@ -1,58 +1,65 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from pathlib import Path
-import json
 
-from app.db.session import get_db
+from app.db.session import get_async_db
+from app.db.appointment_store import AppointmentStore, get_appointment_store
 from app.models.user import User
-from app.utils.email_utils import send_email
+from app.schemas.appointment import BookingResponse
+from app.services.events import publish_appointment
+from app.services.notifications import notify_doctor
+from app.services.scheduling import parse_slot
+from app.utils.id_utils import new_appointment_id
+from app.utils.lock_utils import doctor_locks
+from app.core.admission import admit_write
+from app.core.timing import TimedRoute
 
-router = APIRouter(prefix="/appointments", tags=["appointments"])
+router = APIRouter(prefix="/appointments", tags=["appointments"], route_class=TimedRoute)
 
-APPOINTMENT_FILE = Path(__file__).parent.parent / "db" / "appointments.json"
-
-def load_appointments() -> list[dict]:
-    if not APPOINTMENT_FILE.exists():
-        return []
-    with open(APPOINTMENT_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data.get("appointments", [])
-
-def save_appointments(appointments: list[dict]):
-    with open(APPOINTMENT_FILE, "w", encoding="utf-8") as f:
-        json.dump({"appointments": appointments}, f, indent=4)
-
-@router.post("/book")
+@router.post("/book", response_model=BookingResponse, dependencies=[Depends(admit_write, scope="function")])
 async def book_appointment(
     doctor_name: str,
     patient_name: str,
     time: str,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    store: AppointmentStore = Depends(get_appointment_store)
 ):
-    appointments = load_appointments()
-    
-    appointment_id = f"APT-{int(datetime.utcnow().timestamp())}"
+    result = await db.execute(select(User).where(User.full_name == doctor_name))
+    doctor = result.scalars().first()
+
+    appointment_id = new_appointment_id()
+    slot = parse_slot(time)
     appointment = {
         "appointment_id": appointment_id,
-        "doctor": doctor_name,
-        "patient": patient_name,
+        "doctor_name": doctor_name,
+        "doctor_id": str(doctor.id) if doctor else None,
+        "patient_full_name": patient_name,
         "time": time,
+        "start_at": slot[0] if slot else None,
+        "end_at": slot[1] if slot else None,
         "status": "booked",
         "created_at": datetime.utcnow().isoformat() + "Z"
     }
-    appointments.append(appointment)
-    save_appointments(appointments)
+    # Lock wait and store I/O are blocking, so they run in the threadpool
+    def reserve():
+        with doctor_locks.hold(appointment["doctor_id"]):
+            store.add_if_free(appointment)
+
+    await run_in_threadpool(reserve)
+    # May be a pg_notify round trip (change bus), so it stays off the event loop too
+    await run_in_threadpool(publish_appointment, "booked", appointment)
 
-    
-    doctor = db.query(User).filter(User.full_name == doctor_name).first()
     if doctor and doctor.email:
         body = f"""
         <p>Dear Dr. {doctor.full_name},</p>
         <p>You have a new appointment booked by <b>{patient_name}</b> at <b>{time}</b>.</p>
         <p>Appointment ID: {appointment_id}</p>
         """
-        background_tasks.add_task(send_email, [doctor.email], "New Appointment Booked", body)
+        await run_in_threadpool(
+            notify_doctor, doctor.id, doctor.email, appointment_id, "booked", "New Appointment Booked", body,
+            patient_name=patient_name, time_label=time, mode=doctor.notification_mode
+        )
 
     return {"message": "Appointment booked successfully", "appointment_id": appointment_id}
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session
+
+from app.core.security import bearer_scheme, create_tokens, decode_token, revocations
+from app.core.timing import TimedRoute
+from app.db.session import get_db
+from app.models.user import User
+from app.schemas.auth import LogoutRequest, RefreshRequest, TokenUser
+
+router = APIRouter(tags=["Auth"], route_class=TimedRoute)
+
+# ======================
+# Token refresh
+# ======================
+@router.post("/refresh")
+def refresh_tokens(request: RefreshRequest, db: Session = Depends(get_db)):
+    """Swap a refresh token for a new access/refresh pair (the old refresh token is revoked)."""
+    payload = decode_token(request.refresh_token, "refresh")
+    # One lookup per refresh so profile changes and deleted accounts are picked up
+    user = db.query(User).filter(User.id == payload["sub"], User.role == payload["role"]).first()
+    # ...and the stored revocations, which the in-memory check may have lost to a restart
+    if not user or revocations.revoked_in_database(db, payload, user.tokens_valid_after):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    revocations.store(db, payload)
+    return create_tokens(TokenUser.from_user(user))
+
+# ======================
+# Logout
+# ======================
+@router.post("/logout")
+def logout(
+    request: LogoutRequest | None = None,
+    token: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    db: Session = Depends(get_db)
+):
+    """Revoke the presented access token and, if given, the refresh token."""
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    payload = decode_token(token.credentials)
+    revoked = [payload]
+    if request and request.refresh_token:
+        refresh = decode_token(request.refresh_token, "refresh")
+        if refresh["sub"] == payload["sub"]:
+            revoked.append(refresh)
+    revocations.store(db, *revoked)
+    return {"message": "Logged out"}
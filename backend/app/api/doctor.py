@@ -1,45 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
-from pathlib import Path
-import json
-import secrets
+import time
 
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
+from app.db.appointment_store import AppointmentStore, get_appointment_store
+from app.core.admission import admit_write
+from app.core.passwords import apply_new_hash, credential_verifier
+from app.core.security import bearer_scheme, create_tokens, revocations, user_from_token
+from app.core.timing import TimedRoute, timed
 from app.models.user import User
-from app.utils.email_utils import send_email
-
-router = APIRouter(prefix="/doctor", tags=["Doctor"])
+from app.schemas.appointment import BatchDecisionRequest, BatchDecisionResponse, DecisionResult, PendingAppointments
+from app.schemas.auth import TokenUser
+from app.schemas.doctor import DoctorProfile, DoctorSearchResult
+from app.services.doctor_directory import doctor_directory
+from app.services.doctor_search import doctor_search
+from app.services.events import doctor_channel, event_hub, event_stream, publish_appointment
+from app.services.notifications import NOTIFICATION_MODES, preferences
+from app.utils.email_utils import send_email, send_emails
+from app.utils.lock_utils import doctor_locks
 
-security = HTTPBasic()
-APPOINTMENT_FILE = Path(__file__).parent.parent / "db" / "appointments.json"
+router = APIRouter(prefix="/doctor", tags=["Doctor"], route_class=TimedRoute)
 
-# Load & Save Appointments
-def load_appointments() -> list[dict]:
-    if not APPOINTMENT_FILE.exists():
-        return []
-    try:
-        with open(APPOINTMENT_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data.get("appointments", [])
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Invalid appointments.json")
-
-def save_appointments(appointments: list[dict]):
-    with open(APPOINTMENT_FILE, "w", encoding="utf-8") as f:
-        json.dump({"appointments": appointments}, f, indent=4)
+security = HTTPBasic(auto_error=False)
 
 # Authentication
-def get_current_doctor(credentials: HTTPBasicCredentials = Depends(security), db: Session = Depends(get_db)) -> User:
-    doctor = db.query(User).filter(
-        User.username == credentials.username,
-        User.role == "doctor"
-    ).first()
-    if not doctor or not secrets.compare_digest(doctor.password_plain, credentials.password):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    return doctor
+@timed("auth")
+def get_current_doctor(
+    token: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    credentials: HTTPBasicCredentials | None = Depends(security),
+    db: Session = Depends(get_db)
+) -> TokenUser:
+    # Bearer token from /login: verified in memory, no users query
+    if token:
+        return user_from_token(token.credentials, "doctor")
+
+    # HTTP Basic is still accepted for older clients
+    if credentials:
+        doctor = db.query(User).filter(
+            User.username == credentials.username,
+            User.role == "doctor"
+        ).first()
+        if doctor:
+            ok, new_hash = credential_verifier.verify_basic(credentials.password, doctor.password_hash, doctor.password_plain)
+            if ok:
+                if new_hash:
+                    apply_new_hash(doctor, new_hash)
+                    db.commit()
+                return TokenUser.from_user(doctor)
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
 
 # Login
 class DoctorLogin(BaseModel):
@@ -47,78 +63,182 @@ class DoctorLogin(BaseModel):
     password: str
 
 @router.post("/login")
-def login(doctor_login: DoctorLogin, db: Session = Depends(get_db)):
-    doctor = db.query(User).filter(
+async def login(doctor_login: DoctorLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(
         User.username == doctor_login.username,
         User.role == "doctor"
-    ).first()
-    if not doctor or doctor.password_plain != doctor_login.password:
+    ))
+    doctor = result.scalars().first()
+    if not doctor:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    # Hash verification runs on the bounded password pool, not the event loop
+    ok, new_hash = await credential_verifier.verify(doctor_login.password, doctor.password_hash, doctor.password_plain)
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    return {"message": "Login successful", "doctor": doctor.full_name}
+    if new_hash:
+        # Lazy migration: plaintext (or outdated hash) replaced on first successful login
+        apply_new_hash(doctor, new_hash)
+        await db.commit()
+    return {"message": "Login successful", "doctor": doctor.full_name, **create_tokens(TokenUser.from_user(doctor))}
 
 # View Appointments
-@router.get("/appointments/pending")
-def view_pending_appointments(current_doctor: User = Depends(get_current_doctor)):
-    appointments = load_appointments()
-    pending = [a for a in appointments if a.get("doctor") == current_doctor.full_name and a.get("status") == "pending"]
+@router.get("/appointments/pending", response_model=PendingAppointments, response_model_exclude_unset=True)
+def view_pending_appointments(
+    store: AppointmentStore = Depends(get_appointment_store),
+    current_doctor: TokenUser = Depends(get_current_doctor)
+):
+    pending = store.find(doctor_id=str(current_doctor.id), status="pending")
     return {"pending_appointments": pending}
 
+DECISIONS = ("accepted", "rejected")
+
+# Most decisions a doctor can send in one batch request
+MAX_BATCH_DECISIONS = 200
+
+
+def decision_email(a: dict, decision: str, doctor_name: str) -> tuple[str, str]:
+    patient_name = a.get("patient_full_name", a.get("patient"))
+    time = a.get("time")
+    if decision == "accepted":
+        subject = "Appointment Confirmed"
+        body = f"""
+        <p>Dear {patient_name},</p>
+        <p>Your appointment with Dr. {doctor_name} at <b>{time}</b> has been <b>confirmed</b>.</p>
+        <p>Appointment ID: {a["appointment_id"]}</p>
+        """
+    else:
+        subject = "Appointment Rejected"
+        body = f"""
+        <p>Dear {patient_name},</p>
+        <p>We are sorry. Your appointment with Dr. {doctor_name} at <b>{time}</b> has been <b>rejected</b>.</p>
+        <p>Appointment ID: {a["appointment_id"]}</p>
+        """
+    return subject, body
+
 # Accept/Reject Appointments
-@router.put("/appointments/{appointment_id}/decision")
+@router.put("/appointments/{appointment_id}/decision", dependencies=[Depends(admit_write, scope="function")])
 def decide_appointment(
     appointment_id: str,
     decision: str,  # "accepted" or "rejected"
-    background_tasks: BackgroundTasks,
-    current_doctor: User = Depends(get_current_doctor)
+    store: AppointmentStore = Depends(get_appointment_store),
+    current_doctor: TokenUser = Depends(get_current_doctor)
 ):
-    if decision not in ["accepted", "rejected"]:
+    if decision not in DECISIONS:
         raise HTTPException(status_code=400, detail="Decision must be 'accepted' or 'rejected'")
 
-    appointments = load_appointments()
-    found = False
-
-    for a in appointments:
-        if a.get("appointment_id") == appointment_id and a.get("doctor") == current_doctor.full_name:
-            a["status"] = decision
-            a["updated_at"] = datetime.utcnow().isoformat()
-            found = True
-
-            # Send email to patient
-            patient_email = a.get("patient_email")
-            patient_name = a.get("patient")
-            time = a.get("time")
-            if patient_email:
-                if decision == "accepted":
-                    subject = "Appointment Confirmed"
-                    body = f"""
-                    <p>Dear {patient_name},</p>
-                    <p>Your appointment with Dr. {current_doctor.full_name} at <b>{time}</b> has been <b>confirmed</b>.</p>
-                    <p>Appointment ID: {appointment_id}</p>
-                    """
-                else:
-                    subject = "Appointment Rejected"
-                    body = f"""
-                    <p>Dear {patient_name},</p>
-                    <p>We are sorry. Your appointment with Dr. {current_doctor.full_name} at <b>{time}</b> has been <b>rejected</b>.</p>
-                    <p>Appointment ID: {appointment_id}</p>
-                    """
-                background_tasks.add_task(send_email, [patient_email], subject, body)
-            break
-
-    if not found:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-
-    save_appointments(appointments)
+    with doctor_locks.hold(current_doctor.id):
+        a = store.get(appointment_id)
+        if not a or a.get("doctor_id") != str(current_doctor.id):
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        a = store.update(appointment_id, status=decision, updated_at=datetime.utcnow().isoformat())
+    publish_appointment(decision, a)
+
+    # Send email to patient
+    if a.get("patient_email"):
+        send_email([a["patient_email"]], *decision_email(a, decision, current_doctor.full_name))
+
     return {"message": f"Appointment {appointment_id} has been {decision}"}
 
+# Accept/Reject many appointments at once
+@router.put("/appointments/decisions", response_model=BatchDecisionResponse,
+            dependencies=[Depends(admit_write, scope="function")])
+def decide_appointments(
+    batch: BatchDecisionRequest,
+    store: AppointmentStore = Depends(get_appointment_store),
+    current_doctor: TokenUser = Depends(get_current_doctor)
+):
+    if len(batch.decisions) > MAX_BATCH_DECISIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_DECISIONS} decisions per request")
+
+    results: dict[int, DecisionResult] = {}
+    changes: dict[str, dict] = {}
+    now = datetime.utcnow().isoformat()
+
+    with doctor_locks.hold(current_doctor.id):
+        existing = store.get_many(item.appointment_id for item in batch.decisions)
+        for i, item in enumerate(batch.decisions):
+            error = None
+            a = existing.get(item.appointment_id)
+            if item.decision not in DECISIONS:
+                error = "Decision must be 'accepted' or 'rejected'"
+            elif item.appointment_id in changes:
+                error = "Duplicate appointment_id in batch"
+            elif not a or a.get("doctor_id") != str(current_doctor.id):
+                error = "Appointment not found"
+            if error:
+                results[i] = DecisionResult(appointment_id=item.appointment_id, decision=item.decision, ok=False, error=error)
+            else:
+                changes[item.appointment_id] = {"status": item.decision, "updated_at": now}
+
+        if batch.all_or_nothing and results:
+            raise HTTPException(status_code=409, detail=[r.model_dump() for r in results.values()])
+        # One journal write / one transaction for the whole batch
+        updated = store.update_many(changes) if changes else {}
+
+    emails = []
+    for i, item in enumerate(batch.decisions):
+        if i in results:
+            continue
+        a = updated.get(item.appointment_id)
+        if a is None:
+            results[i] = DecisionResult(appointment_id=item.appointment_id, decision=item.decision, ok=False, error="Appointment not found")
+            continue
+        results[i] = DecisionResult(appointment_id=item.appointment_id, decision=item.decision, ok=True)
+        publish_appointment(item.decision, a)
+        if a.get("patient_email"):
+            emails.append(([a["patient_email"]], *decision_email(a, item.decision, current_doctor.full_name)))
+    # All patient notifications queued in one outbox transaction
+    if emails:
+        send_emails(emails)
+
+    ordered = [results[i] for i in range(len(batch.decisions))]
+    applied = sum(r.ok for r in ordered)
+    return BatchDecisionResponse(applied=applied, failed=len(ordered) - applied, results=ordered)
+
+# ======================
+# Live Appointment Events
+# ======================
+@timed("auth")
+def get_streaming_doctor(
+    token: str | None = Query(None, description="Access token, for EventSource clients that cannot send headers"),
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    basic: HTTPBasicCredentials | None = Depends(security),
+    db: Session = Depends(get_db)
+) -> TokenUser:
+    if token:
+        return user_from_token(token, "doctor")
+    return get_current_doctor(credentials, basic, db)
+
+@router.get("/events")
+async def stream_appointment_events(current_doctor: TokenUser = Depends(get_streaming_doctor)):
+    """Server-sent events for this doctor's appointments, replacing polling of /appointments/pending"""
+    subscription = event_hub.subscribe(doctor_channel(current_doctor.id))
+    return StreamingResponse(event_stream(subscription), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ======================
+# Doctor Search
+# ======================
+@router.get("/search", response_model=DoctorSearchResult)
+def search_doctors(
+    q: str | None = Query(None, max_length=100, description="Name or name prefix"),
+    specialization: List[str] = Query([], description="Repeat to match any of several"),
+    fuzzy: bool = True,
+    offset: int = Query(0, ge=0, le=10_000),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Find doctors by name (prefix, typo-tolerant) and specialization, with per-specialization counts"""
+    return doctor_search.search(q, specialization, offset=offset, limit=limit, fuzzy=fuzzy)
+
 # Doctor Profile
-@router.get("/profile")
-def view_profile(current_doctor: User = Depends(get_current_doctor)):
+@router.get("/profile", response_model=DoctorProfile)
+def view_profile(current_doctor: TokenUser = Depends(get_current_doctor)):
     return {
         "id": str(current_doctor.id),
         "name": current_doctor.full_name,
         "email": current_doctor.email,
         "username": current_doctor.username,
+        "notification_mode": preferences.get(current_doctor.id),
     }
 
 @router.put("/profile")
@@ -126,15 +246,34 @@ def update_profile(
     name: str | None = None,
     email: str | None = None,
     password: str | None = None,
+    notification_mode: str | None = None,
     db: Session = Depends(get_db),
-    current_doctor: User = Depends(get_current_doctor)
+    current_doctor: TokenUser = Depends(get_current_doctor)
 ):
+    if notification_mode and notification_mode not in NOTIFICATION_MODES:
+        raise HTTPException(status_code=400, detail="notification_mode must be 'immediate' or 'digest'")
+    doctor = db.query(User).filter(User.id == current_doctor.id, User.role == "doctor").first()
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
     if name:
-        current_doctor.full_name = name
+        doctor.full_name = name
     if email:
-        current_doctor.email = email
+        doctor.email = email
     if password:
-        current_doctor.password_plain = password
+        apply_new_hash(doctor, credential_verifier.hash_sync(password))
+        # Stored so the cutoff outlives restarts; tokens issued below come after it
+        doctor.tokens_valid_after = time.time()
+    if notification_mode:
+        doctor.notification_mode = notification_mode
     db.commit()
-    db.refresh(current_doctor)
-    return {"message": "Profile updated successfully"}
+    if name or email:
+        doctor_directory.invalidate()
+    if name:
+        doctor_search.upsert(doctor.id, doctor.full_name, doctor.specialization)
+    if notification_mode:
+        preferences.set(doctor.id, notification_mode)
+    if password:
+        # Tokens issued under the old password stop working
+        revocations.revoke_subject(doctor.id, doctor.tokens_valid_after)
+    # Fresh tokens carrying the updated profile
+    return {"message": "Profile updated successfully", **create_tokens(TokenUser.from_user(doctor))}
@@ -1,42 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from typing import List
 from datetime import datetime
-from pathlib import Path
-import secrets
-import json
 
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
+from app.db.appointment_store import AppointmentStore, get_appointment_store
+from app.core.admission import admit_patient_write
+from app.core.idempotency import IdempotentRoute, idempotent
+from app.core.passwords import apply_new_hash, credential_verifier
+from app.core.security import bearer_scheme, create_tokens, user_from_token
+from app.core.timing import timed
 from app.models.user import User
-from app.utils.email_utils import send_email
-
-router = APIRouter(prefix="/patient", tags=["Patient"])
-
-# JSON file path
-APPOINTMENT_FILE = Path(__file__).parent.parent / "db" / "appointments.json"
-
-# ========================
-# Helper Functions
-# ========================
-def load_appointments() -> list[dict]:
-    if not APPOINTMENT_FILE.exists():
-        return []
-    try:
-        with open(APPOINTMENT_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data.get("appointments", [])
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Invalid appointments.json")
-
-
-def save_appointments(appointments: list[dict]):
-    try:
-        with open(APPOINTMENT_FILE, "w", encoding="utf-8") as f:
-            json.dump({"appointments": appointments}, f, indent=4)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving appointments: {e}")
+from app.schemas.appointment import AppointmentOut, BookingResponse
+from app.schemas.auth import TokenUser
+from app.services.events import event_hub, event_stream, patient_channel, publish_appointment
+from app.services.listing import AppointmentListing
+from app.services.notifications import notify_doctor
+from app.services.scheduling import parse_slot
+from app.utils.id_utils import new_appointment_id
+from app.utils.lock_utils import doctor_locks, holding_appointment
 
+router = APIRouter(prefix="/patient", tags=["Patient"], route_class=IdempotentRoute)
 
 # ========================
 # Schemas
@@ -72,7 +62,7 @@ def register_patient(patient: PatientRegister, db: Session = Depends(get_db)):
         full_name=patient.full_name,
         email=patient.email,
         role="patient",
-        password_plain=patient.password
+        password_hash=credential_verifier.hash_sync(patient.password)
     )
     db.add(new_patient)
     db.commit()
@@ -81,41 +71,52 @@ def register_patient(patient: PatientRegister, db: Session = Depends(get_db)):
 
 
 @router.post("/login")
-def login_patient(patient_login: PatientLogin, db: Session = Depends(get_db)):
-    patient = db.query(User).filter(
+async def login_patient(patient_login: PatientLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(
         User.username == patient_login.username,
         User.role == "patient"
-    ).first()
+    ))
+    patient = result.scalars().first()
+    if not patient:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not patient or not secrets.compare_digest(patient.password_plain, patient_login.password):
+    ok, new_hash = await credential_verifier.verify(patient_login.password, patient.password_hash, patient.password_plain)
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        apply_new_hash(patient, new_hash)
+        await db.commit()
 
-    return {"message": "Login successful", "patient_username": patient.username}
+    return {"message": "Login successful", "patient_username": patient.username, **create_tokens(TokenUser.from_user(patient))}
 
 
 # ========================
 # Appointment Booking
 # ========================
-@router.post("/appointments/book")
+@router.post("/appointments/book", response_model=BookingResponse,
+             dependencies=[Depends(admit_patient_write, scope="function")])
+@idempotent
 async def book_appointment(
     appointment: AppointmentBook,
     patient_username: str,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    store: AppointmentStore = Depends(get_appointment_store)
 ):
     # Get patient
-    patient = db.query(User).filter(User.username == patient_username, User.role == "patient").first()
+    result = await db.execute(select(User).where(User.username == patient_username, User.role == "patient"))
+    patient = result.scalars().first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # Get doctor
-    doctor = db.query(User).filter(User.id == appointment.doctor_id, User.role == "doctor").first()
+    result = await db.execute(select(User).where(User.id == appointment.doctor_id, User.role == "doctor"))
+    doctor = result.scalars().first()
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
     # Create new appointment
-    appointments = load_appointments()
-    appointment_id = f"APT-{int(datetime.utcnow().timestamp())}"
+    appointment_id = new_appointment_id()
+    slot = parse_slot(appointment.time)
 
     new_appointment = {
         "appointment_id": appointment_id,
@@ -127,12 +128,20 @@ async def book_appointment(
         "patient_full_name": patient.full_name,   # for display
         "patient_email": patient.email,
         "time": appointment.time,
+        "start_at": slot[0] if slot else None,
+        "end_at": slot[1] if slot else None,
         "status": "pending",
         "created_at": datetime.utcnow().isoformat()
     }
 
-    appointments.append(new_appointment)
-    save_appointments(appointments)
+    # Lock wait and store I/O are blocking, so they run in the threadpool
+    def reserve():
+        with doctor_locks.hold(doctor.id):
+            store.add_if_free(new_appointment)
+
+    await run_in_threadpool(reserve)
+    # May be a pg_notify round trip (change bus), so it stays off the event loop too
+    await run_in_threadpool(publish_appointment, "booked", new_appointment)
 
     # Email doctor
     body = f"""
@@ -142,7 +151,10 @@ async def book_appointment(
     <p>Specialization: {doctor.specialization}</p>
     <p>Status: Pending.</p>
     """
-    background_tasks.add_task(send_email, [doctor.email], "New Appointment", body)
+    await run_in_threadpool(
+        notify_doctor, doctor.id, doctor.email, appointment_id, "booked", "New Appointment", body,
+        patient_name=patient.full_name, time_label=appointment.time, mode=doctor.notification_mode
+    )
 
     return {"message": "Appointment booked successfully", "appointment_id": appointment_id}
 
@@ -150,46 +162,89 @@ async def book_appointment(
 # ========================
 # View Appointments
 # ========================
-@router.get("/appointments/{patient_username}", response_model=List[dict])
-def view_my_appointments(patient_username: str, db: Session = Depends(get_db)):
+@router.get("/appointments/{patient_username}", response_model=List[AppointmentOut], response_model_exclude_unset=True)
+def view_my_appointments(
+    patient_username: str,
+    response: Response,
+    doctor_id: str | None = None,
+    listing: AppointmentListing = Depends(),
+    db: Session = Depends(get_db),
+    store: AppointmentStore = Depends(get_appointment_store)
+):
     patient = db.query(User).filter(User.username == patient_username, User.role == "patient").first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    appointments = load_appointments()
-    my_appointments = [a for a in appointments if a.get("patient_username") == patient.username]
-    return my_appointments
+    if listing.streaming:
+        return listing.export(store, f"appointments-{patient.username}",
+                              patient_username=patient.username, doctor_id=doctor_id)
+    # Body stays a plain list; the next page's cursor travels in a header
+    appointments, next_cursor = listing.fetch(store, patient_username=patient.username, doctor_id=doctor_id)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return appointments
+
+
+# ========================
+# Live Appointment Events
+# ========================
+@timed("auth")
+def get_streaming_patient(
+    token: str | None = Query(None, description="Access token, for EventSource clients that cannot send headers"),
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme)
+) -> TokenUser:
+    if token:
+        return user_from_token(token, "patient")
+    if credentials:
+        return user_from_token(credentials.credentials, "patient")
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+
+
+@router.get("/events/{patient_username}")
+async def stream_my_appointment_events(patient_username: str, current_patient: TokenUser = Depends(get_streaming_patient)):
+    """Server-sent events for this patient's appointments: booked, accepted, rejected, rescheduled, cancelled, updated"""
+    if current_patient.username != patient_username:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your appointments")
+    subscription = event_hub.subscribe(patient_channel(current_patient.username))
+    return StreamingResponse(event_stream(subscription), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 # ========================
 # Reschedule Appointment
 # ========================
-@router.put("/appointments/reschedule/{appointment_id}")
+@router.put("/appointments/reschedule/{appointment_id}", dependencies=[Depends(admit_patient_write, scope="function")])
+@idempotent
 def reschedule_appointment(
     appointment_id: str,
     new_time: str,
     patient_username: str,
-    background_tasks: BackgroundTasks
+    store: AppointmentStore = Depends(get_appointment_store)
 ):
-    appointments = load_appointments()
-    appointment = next(
-        (a for a in appointments if a["appointment_id"] == appointment_id and a["patient_username"] == patient_username),
-        None
-    )
-
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-
-    appointment["time"] = new_time
-    appointment["status"] = "rescheduled"
-    save_appointments(appointments)
+    slot = parse_slot(new_time)
+    with holding_appointment(store, appointment_id) as appointment:
+        if appointment.get("patient_username") != patient_username:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        updated = store.update_if_free(
+            appointment_id,
+            time=new_time,
+            start_at=slot[0] if slot else None,
+            end_at=slot[1] if slot else None,
+            status="rescheduled"
+        )
+        if updated is None:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+    publish_appointment("rescheduled", updated)
 
     # Email doctor
     body = f"""
     <p>Dear Dr. {appointment['doctor_name']},</p>
     <p>Appointment <b>{appointment_id}</b> has been rescheduled by <b>{appointment['patient_full_name']}</b> to <b>{new_time}</b>.</p>
     """
-    background_tasks.add_task(send_email, [appointment["doctor_email"]], "Appointment Rescheduled", body)
+    notify_doctor(
+        appointment.get("doctor_id"), appointment.get("doctor_email"), appointment_id, "rescheduled",
+        "Appointment Rescheduled", body, patient_name=appointment.get("patient_full_name"), time_label=new_time
+    )
 
     return {"message": "Appointment rescheduled successfully"}
 
@@ -197,29 +252,28 @@ def reschedule_appointment(
 # ========================
 # Cancel Appointment
 # ========================
-@router.delete("/appointments/cancel/{appointment_id}")
+@router.delete("/appointments/cancel/{appointment_id}", dependencies=[Depends(admit_patient_write, scope="function")])
+@idempotent
 def cancel_appointment(
     appointment_id: str,
     patient_username: str,
-    background_tasks: BackgroundTasks
+    store: AppointmentStore = Depends(get_appointment_store)
 ):
-    appointments = load_appointments()
-    appointment = next(
-        (a for a in appointments if a["appointment_id"] == appointment_id and a["patient_username"] == patient_username),
-        None
-    )
-
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-
-    appointments.remove(appointment)
-    save_appointments(appointments)
+    with holding_appointment(store, appointment_id) as appointment:
+        if appointment.get("patient_username") != patient_username:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        if store.delete(appointment_id) is None:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+    publish_appointment("cancelled", {**appointment, "status": "cancelled"})
 
     # Email doctor
     body = f"""
     <p>Dear Dr. {appointment['doctor_name']},</p>
     <p>Appointment <b>{appointment_id}</b> has been cancelled by <b>{appointment['patient_full_name']}</b>.</p>
     """
-    background_tasks.add_task(send_email, [appointment["doctor_email"]], "Appointment Cancelled", body)
+    notify_doctor(
+        appointment.get("doctor_id"), appointment.get("doctor_email"), appointment_id, "cancelled",
+        "Appointment Cancelled", body, patient_name=appointment.get("patient_full_name"), time_label=appointment.get("time")
+    )
 
     return {"message": "Appointment cancelled successfully"}
@@ -0,0 +1,269 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import case, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+
+# How often the database backend drops buckets that have refilled completely
+PURGE_INTERVAL_SECONDS = 60
+
+
+class MemoryBuckets:
+    """Token buckets in this worker process (each worker enforces the limits on its own).
+
+    A bucket is stored as the time it will next be full: holding `burst`
+    tokens that refill at `rate` per second, a request may take one when
+    full_at - now <= (burst - 1) / rate, and taking one moves full_at
+    1 / rate later. One float per key, and one compare to check it.
+    Past max_keys the least recently used buckets are forgotten (by then
+    almost always full again, which is what a forgotten bucket counts as).
+    """
+    name = "memory"
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._full_at: OrderedDict[str, float] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take a token; returns 0 if one was available, else seconds until there is one."""
+        now = time.time()
+        interval = 1 / rate
+        with self._lock:
+            full_at = max(self._full_at.get(key, now), now)
+            wait = full_at - now - (burst - 1) * interval
+            if wait > 0:
+                return wait
+            self._full_at[key] = full_at + interval
+            self._full_at.move_to_end(key)
+            while len(self._full_at) > self.max_keys:
+                self._full_at.popitem(last=False)
+        return 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"keys": len(self._full_at)}
+
+
+class DatabaseBuckets:
+    """The same buckets in the rate_limits table, shared by every worker and host.
+
+    Each take is one INSERT ... ON CONFLICT DO UPDATE that only moves
+    full_at when a token is available, so concurrent requests can't both
+    take the last one. Full buckets are purged every PURGE_INTERVAL_SECONDS.
+    """
+    name = "database"
+
+    def __init__(self, engine_factory):
+        self._engine_factory = engine_factory
+        self._next_purge = 0.0
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        from app.models.rate_limit import RateLimit  # keeps the model out of the memory backend's imports
+
+        engine = self._engine_factory()
+        table = RateLimit.__table__
+        dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+        now = time.time()
+        interval = 1 / rate
+        tolerance = (burst - 1) * interval
+        statement = dialect.insert(table).values(key=key, full_at=now + interval)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"full_at": case((table.c.full_at > now, table.c.full_at), else_=now) + interval},
+            where=table.c.full_at - now <= tolerance,
+        ).returning(table.c.full_at)
+        async with engine.begin() as conn:
+            if (await conn.execute(statement)).first() is not None:
+                wait = 0.0
+            else:
+                full_at = (await conn.execute(select(table.c.full_at).where(table.c.key == key))).scalar()
+                wait = max((full_at or now) - now - tolerance, 0.001)
+            if now >= self._next_purge:
+                self._next_purge = now + PURGE_INTERVAL_SECONDS
+                await conn.execute(delete(table).where(table.c.full_at <= now))
+        return wait
+
+    def snapshot(self) -> dict:
+        return {}
+
+
+def create_bucket_backend():
+    """Token bucket backend picked by RATE_LIMIT_BACKEND."""
+    if settings.RATE_LIMIT_BACKEND == "database":
+        from app.db.session import database
+
+        return DatabaseBuckets(lambda: database.async_engine)
+    return MemoryBuckets(settings.RATE_LIMIT_MAX_KEYS)
+
+
+class WriteGate:
+    """Cap on appointment writes in flight in this worker, with a short bounded queue.
+
+    Up to `limit` requests hold a slot; up to `queue` more wait for one,
+    each for at most `timeout` seconds. Past that a request is turned away
+    at once instead of piling onto the store lock and the threadpool.
+    A released slot goes straight to the longest waiter. Lives on the
+    worker's event loop, so needs no lock.
+    """
+
+    def __init__(self, limit: int, queue: int, timeout: float):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self.hold_avg = 0.05  # moving average of how long a slot is held, for Retry-After
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead has likely drained."""
+        return max(1, math.ceil(self.hold_avg * (self.waiting + 1) / max(self.limit, 1)))
+
+    async def acquire(self) -> str | None:
+        """Take a slot; returns None once held, or why the request was shed."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.queue:
+            return "queue_full"
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            return "queue_timeout"
+        except asyncio.CancelledError:
+            # Client went away; hand on a slot that reached us meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            self._discard(waiter)
+            raise
+        return None  # release() handed its slot to us
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, held: float | None = None):
+        if held is not None:
+            self.hold_avg += (held - self.hold_avg) * 0.1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionControl:
+    """Admission for appointment writes: per-patient and per-IP token buckets
+    (429 when empty), then a slot from the WriteGate (503 when the queue is
+    full or the wait runs out). Both responses carry Retry-After, so a
+    booking burst is shed in microseconds instead of timing out."""
+
+    def __init__(self, buckets, gate: WriteGate):
+        self.buckets = buckets
+        self.gate = gate
+        self.admitted = 0
+        self.queued = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.rate_limited = {"patient": 0, "ip": 0}
+        self.shed = {"queue_full": 0, "queue_timeout": 0}
+        self.backend_errors = 0
+
+    async def _check_rate(self, scope: str, key: str, rate: float, burst: int):
+        if rate <= 0:
+            return
+        try:
+            wait = await self.buckets.take(f"{scope}:{key}", rate, burst)
+        except Exception:
+            # A shared backend that is down must not take bookings down with it
+            self.backend_errors += 1
+            return
+        if wait > 0:
+            self.rate_limited[scope] += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, slow down",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    @asynccontextmanager
+    async def admit(self, request: Request, patient: str | None = None):
+        client_ip = request.client.host if request.client else "unknown"
+        await self._check_rate("ip", client_ip, settings.RATE_LIMIT_IP_PER_SECOND, settings.RATE_LIMIT_IP_BURST)
+        if patient is not None:
+            await self._check_rate("patient", patient, settings.RATE_LIMIT_PATIENT_PER_SECOND,
+                                   settings.RATE_LIMIT_PATIENT_BURST)
+        if self.gate.limit <= 0:
+            self.admitted += 1
+            yield
+            return
+
+        queued = self.gate.active >= self.gate.limit or self.gate.waiting > 0
+        started = time.perf_counter()
+        shed = await self.gate.acquire()
+        if shed is not None:
+            self.shed[shed] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many bookings in progress, retry shortly",
+                headers={"Retry-After": str(self.gate.retry_after())},
+            )
+        acquired = time.perf_counter()
+        self.admitted += 1
+        if queued:
+            self.queued += 1
+            self.queue_wait_total += acquired - started
+            self.queue_wait_max = max(self.queue_wait_max, acquired - started)
+        try:
+            yield
+        finally:
+            self.gate.release(time.perf_counter() - acquired)
+
+    def snapshot(self) -> dict:
+        return {
+            "backend": self.buckets.name,
+            "in_flight": self.gate.active,
+            "waiting": self.gate.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "avg_queue_wait_ms": round(self.queue_wait_total / self.queued * 1000, 3) if self.queued else 0.0,
+            "max_queue_wait_ms": round(self.queue_wait_max * 1000, 3),
+            "rate_limited": dict(self.rate_limited),
+            "shed": dict(self.shed),
+            "backend_errors": self.backend_errors,
+            **self.buckets.snapshot(),
+        }
+
+
+admission = AdmissionControl(
+    create_bucket_backend(),
+    WriteGate(settings.WRITE_CONCURRENCY, settings.WRITE_QUEUE, settings.WRITE_QUEUE_TIMEOUT_SECONDS),
+)
+
+
+# Dependencies, declared with scope="function" so the slot is freed when the endpoint returns
+async def admit_write(request: Request):
+    async with admission.admit(request):
+        yield
+
+
+async def admit_patient_write(request: Request, patient_username: str):
+    async with admission.admit(request, patient=patient_username):
+        yield
@@ -0,0 +1,333 @@
+import hashlib
+import itertools
+import os
+import select
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable
+
+import orjson
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+
+# Postgres caps NOTIFY payloads at 8000 bytes; bigger changes go out as a
+# bare "resync" for their topic and receivers reload that state instead
+MAX_MESSAGE_BYTES = 7000
+
+# Unix datagram sockets of the workers running this checkout live here (short: AF_UNIX paths max out near 108 bytes)
+SOCKET_DIR = Path(tempfile.gettempdir()) / f"hs-bus-{hashlib.sha1(str(Path(__file__).resolve().parents[1]).encode()).hexdigest()[:8]}"
+
+
+class ChangeBus:
+    """Change notifications between the worker processes of one deployment.
+
+    Every in-memory cache or index publishes after it applies a write
+    locally (publish(topic, data)) and subscribes a handler that applies
+    the same change in the other processes, plus a resync callback that
+    drops or reloads the local copy when messages may have been missed:
+    a gap in a sender's sequence numbers, a reconnect, a failing handler
+    or a change too large to send. Handlers run on the transport thread.
+
+    publish() does nothing until start(), so scripts and tests need no bus.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()  # keeps sequence numbers in send order
+        self._seq = itertools.count(1)
+        self._subscriptions: dict[str, tuple[Callable[[dict | None], None], Callable[[], None] | None]] = {}
+        self._peers: dict[str, int] = {}  # origin -> last sequence number seen
+        self._topics: dict[str, dict] = {}
+        self.transport = None
+        self.published = 0
+        self.send_errors = 0
+        self.oversized = 0
+        self.gaps = 0
+        self.handler_errors = 0
+        self.resyncs = 0
+
+    def subscribe(self, topic: str, handler: Callable[[dict | None], None], resync: Callable[[], None] | None = None):
+        self._subscriptions[topic] = (handler, resync)
+
+    def start(self, transport):
+        self.transport = transport
+        transport.start(self._receive, self.resync)
+
+    def stop(self):
+        transport, self.transport = self.transport, None
+        if transport is not None:
+            transport.stop()
+
+    # ======================
+    # Sending
+    # ======================
+    def publish(self, topic: str, data: dict | None = None):
+        """Tell the other processes about a change already applied here. Never raises."""
+        transport = self.transport
+        if transport is None:
+            return
+        with self._send_lock:
+            message = {"o": self.origin, "s": next(self._seq), "t": topic, "at": time.time(), "d": data}
+            raw = orjson.dumps(message)
+            if len(raw) > MAX_MESSAGE_BYTES:
+                message["d"], message["resync"] = None, True
+                raw = orjson.dumps(message)
+                with self._lock:
+                    self.oversized += 1
+            try:
+                transport.send(raw)
+            except Exception:
+                # The write already happened here; peers notice the sequence gap and resync
+                with self._lock:
+                    self.send_errors += 1
+                return
+        with self._lock:
+            self.published += 1
+
+    # ======================
+    # Receiving
+    # ======================
+    def _receive(self, raw: bytes):
+        try:
+            message = orjson.loads(raw)
+            origin, seq, topic = message["o"], message["s"], message["t"]
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            return  # not one of ours
+        if origin == self.origin:
+            return  # NOTIFY is delivered to our own listener too
+        lag = max(time.time() - message["at"], 0.0)
+        with self._lock:
+            last = self._peers.get(origin)
+            self._peers[origin] = seq
+            gap = last is not None and seq != last + 1
+            stats = self._topics.setdefault(topic, {"received": 0, "lag_total": 0.0, "lag_max": 0.0, "last_lag": 0.0, "last_at": 0.0})
+            stats["received"] += 1
+            stats["lag_total"] += lag
+            stats["lag_max"] = max(stats["lag_max"], lag)
+            stats["last_lag"] = lag
+            stats["last_at"] = time.monotonic()
+            if gap:
+                self.gaps += 1
+        if gap:
+            self.resync()
+        handler, resync = self._subscriptions.get(topic, (None, None))
+        if handler is None:
+            return
+        try:
+            if message.get("resync"):
+                if resync is not None:
+                    resync()
+            else:
+                handler(message["d"])
+        except Exception:
+            with self._lock:
+                self.handler_errors += 1
+            if resync is not None:
+                resync()
+
+    def resync(self):
+        """Drop or reload every subscribed state (messages may have been missed)."""
+        with self._lock:
+            self.resyncs += 1
+        for _, resync in self._subscriptions.values():
+            if resync is not None:
+                resync()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "transport": self.transport.name if self.transport else "off",
+                "origin": self.origin,
+                "peers_seen": len(self._peers),
+                "published": self.published,
+                "send_errors": self.send_errors,
+                "oversized": self.oversized,
+                "gaps": self.gaps,
+                "handler_errors": self.handler_errors,
+                "resyncs": self.resyncs,
+                "topics": {
+                    topic: {
+                        "received": s["received"],
+                        "avg_lag_ms": round(s["lag_total"] / s["received"] * 1000, 3),
+                        "max_lag_ms": round(s["lag_max"] * 1000, 3),
+                        "last_lag_ms": round(s["last_lag"] * 1000, 3),
+                        "last_received_s_ago": round(now - s["last_at"], 1),
+                    }
+                    for topic, s in self._topics.items()
+                },
+                **(self.transport.snapshot() if self.transport else {}),
+            }
+
+
+# ======================
+# Transports
+# ======================
+class SocketTransport:
+    """One Unix datagram socket per worker in a shared directory (workers on one host).
+
+    Sends never block: a peer whose queue is full misses the message and
+    resyncs when it sees the sequence gap.
+    """
+    name = "socket"
+
+    def __init__(self, directory: Path, origin: str):
+        self.directory = Path(directory)
+        self.path = self.directory / f"{origin}.sock"
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.peers = 0
+        self.dropped = 0
+
+    def start(self, receive: Callable[[bytes], None], resync: Callable[[], None]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(str(self.path))
+        self._sock.settimeout(0.5)
+        self._out = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._out.setblocking(False)
+        self._thread = threading.Thread(target=self._run, args=(receive,), name="change-bus", daemon=True)
+        self._thread.start()
+
+    def _run(self, receive: Callable[[bytes], None]):
+        while not self._stopped.is_set():
+            try:
+                raw = self._sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            receive(raw)
+
+    def send(self, raw: bytes):
+        peers = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".sock") or entry.path == str(self.path):
+                continue
+            try:
+                self._out.sendto(raw, entry.path)
+                peers += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Left behind by a worker that died without cleaning up
+                Path(entry.path).unlink(missing_ok=True)
+            except BlockingIOError:
+                self.dropped += 1
+        self.peers = peers
+
+    def stop(self):
+        self._stopped.set()
+        self._sock.close()
+        self._out.close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.path.unlink(missing_ok=True)
+
+    def snapshot(self) -> dict:
+        return {"peers": self.peers, "dropped": self.dropped}
+
+
+class PostgresTransport:
+    """LISTEN/NOTIFY on one channel, for workers on any host sharing the database.
+
+    The listening connection reconnects with backoff after a failure, then
+    triggers a resync, since anything sent meanwhile is lost.
+    """
+    name = "postgres"
+
+    def __init__(self, dsn: str, channel: str):
+        self.dsn = dsn
+        self.channel = channel
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._send_conn = None
+        self.reconnects = 0
+
+    def _connect(self, listen: bool = False):
+        import psycopg2  # only needed for this transport
+
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        if listen:
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN "{self.channel}"')
+        return conn
+
+    def start(self, receive: Callable[[bytes], None], resync: Callable[[], None]):
+        self._listen_conn = self._connect(listen=True)
+        self._thread = threading.Thread(target=self._run, args=(receive, resync), name="change-bus", daemon=True)
+        self._thread.start()
+
+    def _run(self, receive: Callable[[bytes], None], resync: Callable[[], None]):
+        backoff = 0.5
+        while not self._stopped.is_set():
+            conn = self._listen_conn
+            try:
+                if conn is None:
+                    conn = self._listen_conn = self._connect(listen=True)
+                    backoff = 0.5
+                    resync()
+                if select.select([conn], [], [], 0.5) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    receive(conn.notifies.pop(0).payload.encode())
+            except Exception:
+                if self._stopped.is_set():
+                    return
+                self.reconnects += 1
+                if conn is not None:
+                    conn.close()
+                self._listen_conn = None
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def send(self, raw: bytes):
+        try:
+            if self._send_conn is None or self._send_conn.closed:
+                self._send_conn = self._connect()
+            with self._send_conn.cursor() as cur:
+                cur.execute("SELECT pg_notify(%s, %s)", (self.channel, raw.decode()))
+        except Exception:
+            if self._send_conn is not None:
+                self._send_conn.close()
+                self._send_conn = None
+            raise
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for conn in (self._listen_conn, self._send_conn):
+            if conn is not None:
+                conn.close()
+
+    def snapshot(self) -> dict:
+        return {"channel": self.channel, "reconnects": self.reconnects}
+
+
+def create_transport(origin: str):
+    """Transport picked by CHANGE_BUS_BACKEND; "auto" is postgres on a Postgres database,
+    else Unix sockets where available. None when off."""
+    backend = settings.CHANGE_BUS_BACKEND
+    if backend == "auto":
+        if settings.DATABASE_URL and make_url(settings.DATABASE_URL).get_backend_name() == "postgresql":
+            backend = "postgres"
+        elif hasattr(socket, "AF_UNIX"):
+            backend = "socket"
+        else:
+            backend = "off"
+    if backend == "postgres":
+        dsn = make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        return PostgresTransport(dsn, settings.CHANGE_BUS_CHANNEL)
+    if backend == "socket":
+        return SocketTransport(Path(settings.CHANGE_BUS_DIR) if settings.CHANGE_BUS_DIR else SOCKET_DIR, origin)
+    return None
+
+
+change_bus = ChangeBus()
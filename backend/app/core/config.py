@@ -1,31 +1,110 @@
 import os
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
-from fastapi_mail import ConnectionConfig
 
 load_dotenv()
 
 class Settings(BaseSettings):
-    DATABASE_URL: str = os.getenv("DATABASE_URL")
+    # Required, but only checked when the first engine is created (see app/db/session.py)
+    DATABASE_URL: str | None = os.getenv("DATABASE_URL")
+    # Optional; derived from DATABASE_URL (asyncpg / aiosqlite) when unset
+    ASYNC_DATABASE_URL: str | None = os.getenv("ASYNC_DATABASE_URL")
 
-    MAIL_USERNAME: str = os.getenv("MAIL_USERNAME")
-    MAIL_PASSWORD: str = os.getenv("MAIL_PASSWORD")
-    MAIL_FROM: str = os.getenv("MAIL_FROM")
+    # Connection pool (applies to both the sync and async engines)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "True") == "True"
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_ECHO: bool = os.getenv("DB_ECHO", "False") == "True"
+    # Connections each engine opens at startup, before the worker takes traffic
+    DB_POOL_WARM: int = int(os.getenv("DB_POOL_WARM", DB_POOL_SIZE))
+
+    # "json" keeps appointments in app/db/appointments.json, "sql" uses the appointments table
+    APPOINTMENT_BACKEND: str = os.getenv("APPOINTMENT_BACKEND", "json")
+    # Snapshot file for the "json" backend; defaults to app/db/appointments.json
+    APPOINTMENT_PATH: str | None = os.getenv("APPOINTMENT_PATH")
+    # Length of one booking; used to turn an appointment time into a start/end slot
+    APPOINTMENT_SLOT_MINUTES: int = int(os.getenv("APPOINTMENT_SLOT_MINUTES", 30))
+    # Appointments that started this many days ago move to the compressed monthly archive (0 keeps everything hot)
+    APPOINTMENT_ARCHIVE_AFTER_DAYS: int = int(os.getenv("APPOINTMENT_ARCHIVE_AFTER_DAYS", 90))
+    # How often the archiver looks for appointments to move
+    APPOINTMENT_ARCHIVE_INTERVAL_SECONDS: float = float(os.getenv("APPOINTMENT_ARCHIVE_INTERVAL_SECONDS", 3600))
+    # Archive directory for the "json" backend; defaults to archive/ next to the snapshot file
+    APPOINTMENT_ARCHIVE_DIR: str | None = os.getenv("APPOINTMENT_ARCHIVE_DIR")
+
+    # Signed access/refresh tokens issued at login
+    SECRET_KEY: str = os.getenv("SECRET_KEY", "")
+    ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+
+    # Password hashing pool: concurrent hashes, and how many more may wait before logins get a 503
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+    PASSWORD_HASH_QUEUE: int = int(os.getenv("PASSWORD_HASH_QUEUE", 32))
+
+    # Appointment writes in flight per worker, and how many more may wait (for up to the timeout) before a 503
+    WRITE_CONCURRENCY: int = int(os.getenv("WRITE_CONCURRENCY", 8))
+    WRITE_QUEUE: int = int(os.getenv("WRITE_QUEUE", 32))
+    WRITE_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("WRITE_QUEUE_TIMEOUT_SECONDS", 2))
+    # Token buckets for appointment writes: sustained requests per second and burst size (rate 0 turns one off)
+    RATE_LIMIT_PATIENT_PER_SECOND: float = float(os.getenv("RATE_LIMIT_PATIENT_PER_SECOND", 0.5))
+    RATE_LIMIT_PATIENT_BURST: int = int(os.getenv("RATE_LIMIT_PATIENT_BURST", 5))
+    RATE_LIMIT_IP_PER_SECOND: float = float(os.getenv("RATE_LIMIT_IP_PER_SECOND", 5))
+    RATE_LIMIT_IP_BURST: int = int(os.getenv("RATE_LIMIT_IP_BURST", 20))
+    # "memory" keeps the buckets per worker process; "database" shares them through the rate_limits table
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    # Buckets kept by the "memory" backend before the least recently used are dropped
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+
+    # Idempotency-Key results on the patient write endpoints: how long they are replayed, and how many are kept
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+    IDEMPOTENCY_MAX_KEYS: int = int(os.getenv("IDEMPOTENCY_MAX_KEYS", 10000))
+    # How long a duplicate waits for the original request still in flight before a 409
+    IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 10))
+
+    # Only needed to send email (app/services/outbox.py); importing the app works without them
+    MAIL_USERNAME: str | None = os.getenv("MAIL_USERNAME")
+    MAIL_PASSWORD: str | None = os.getenv("MAIL_PASSWORD")
+    MAIL_FROM: str | None = os.getenv("MAIL_FROM")
     MAIL_PORT: int = int(os.getenv("MAIL_PORT", 587))
     MAIL_SERVER: str = os.getenv("MAIL_SERVER", "smtp.gmail.com")
     MAIL_STARTTLS: bool = os.getenv("MAIL_STARTTLS", "True") == "True"
     MAIL_SSL_TLS: bool = os.getenv("MAIL_SSL_TLS", "False") == "True"
     USE_CREDENTIALS: bool = os.getenv("USE_CREDENTIALS", "True") == "True"
 
-settings = Settings()
+    # Outbound email queue (app/services/outbox.py); defaults to app/db/outbox.sqlite3
+    OUTBOX_PATH: str | None = os.getenv("OUTBOX_PATH")
+    OUTBOX_SMTP_CONNECTIONS: int = int(os.getenv("OUTBOX_SMTP_CONNECTIONS", 2))
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+    OUTBOX_RETRY_BASE_SECONDS: float = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", 30))
+    OUTBOX_RETRY_MAX_SECONDS: float = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", 3600))
+    OUTBOX_IDLE_SECONDS: float = float(os.getenv("OUTBOX_IDLE_SECONDS", 60))
+    OUTBOX_POLL_SECONDS: float = float(os.getenv("OUTBOX_POLL_SECONDS", 5))
 
-MAIL_CONFIG = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=settings.MAIL_PASSWORD,
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.MAIL_SERVER,
-    MAIL_STARTTLS=settings.MAIL_STARTTLS,
-    MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
-    USE_CREDENTIALS=settings.USE_CREDENTIALS
-)
+    # In-process cache of the doctor directory (app/services/doctor_directory.py)
+    DOCTOR_CACHE_TTL_SECONDS: float = float(os.getenv("DOCTOR_CACHE_TTL_SECONDS", 60))
+    DOCTOR_CACHE_MAX_ENTRIES: int = int(os.getenv("DOCTOR_CACHE_MAX_ENTRIES", 128))
+
+    # Doctors in "digest" notification mode get one summary email per window
+    DIGEST_WINDOW_MINUTES: int = int(os.getenv("DIGEST_WINDOW_MINUTES", 60))
+    DIGEST_POLL_SECONDS: float = float(os.getenv("DIGEST_POLL_SECONDS", 30))
+
+    # Server-sent appointment events (app/services/events.py)
+    EVENT_BUFFER_SIZE: int = int(os.getenv("EVENT_BUFFER_SIZE", 256))  # per subscriber, in events
+    EVENT_MAX_SUBSCRIBERS: int = int(os.getenv("EVENT_MAX_SUBSCRIBERS", 10000))
+    EVENT_HEARTBEAT_SECONDS: float = float(os.getenv("EVENT_HEARTBEAT_SECONDS", 15))
+    EVENT_STREAM_MAX_SECONDS: float = float(os.getenv("EVENT_STREAM_MAX_SECONDS", 3600))
+
+    # Cross-process change notifications (app/core/change_bus.py): auto, postgres, socket or off
+    CHANGE_BUS_BACKEND: str = os.getenv("CHANGE_BUS_BACKEND", "auto")
+    CHANGE_BUS_CHANNEL: str = os.getenv("CHANGE_BUS_CHANNEL", "healthcare_changes")  # postgres NOTIFY channel
+    CHANGE_BUS_DIR: str | None = os.getenv("CHANGE_BUS_DIR")  # socket directory; defaults to one per checkout in the temp dir
+
+    # Request timing (app/core/timing.py)
+    SERVER_TIMING: bool = os.getenv("SERVER_TIMING", "True") == "True"  # per-phase Server-Timing response header
+    PROFILE_MAX_PROFILES: int = int(os.getenv("PROFILE_MAX_PROFILES", 50))  # sampled profiles kept in memory
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", 3600))  # longest an admin can leave sampling on
+
+settings = Settings()
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+
+from app.core.change_bus import change_bus
+from app.core.config import settings
+from app.core.timing import TimedRoute
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+# A peer worker's claim on a key is honoured this long, in case that worker died mid-request
+CLAIM_SECONDS = 60
+
+
+def _keep(status_code: int) -> bool:
+    """Whether a response is the request's outcome; a 429 or 5xx means it should run again."""
+    return status_code < 500 and status_code != status.HTTP_429_TOO_MANY_REQUESTS
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "response", "expires_at", "local", "done")
+
+    def __init__(self, fingerprint: str, expires_at: float, local: bool):
+        self.fingerprint = fingerprint
+        self.response: tuple[int, list[tuple[str, str]], bytes] | None = None  # set once finished
+        self.expires_at = expires_at  # end of the claim while in flight, then end of the replays
+        self.local = local  # claimed by a request in this process
+        self.done = asyncio.Event()
+
+
+class IdempotencyCache:
+    """Responses of requests sent with an Idempotency-Key, replayed when the key comes again.
+
+    The first request with a key claims it and runs; its response (a
+    success, or a 4xx it raised) is kept for `ttl` seconds and sent back
+    as-is to a retry with the same key and the same request, without
+    running the endpoint again. A duplicate arriving while the first is
+    still running waits up to `wait` seconds for its response instead of
+    running too. The same key on a different request is a 422. At most
+    `max_keys` entries are kept, oldest dropped first.
+
+    Claims and results go to the other workers over the change bus, so a
+    retry that lands on another worker is replayed as well (two copies
+    sent within one bus hop of each other can still both run).
+    """
+
+    def __init__(self, max_keys: int, ttl: float, wait: float):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.wait = wait
+        self._lock = threading.Lock()  # the bus thread writes entries too
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.stored = 0
+        self.replayed = 0
+        self.waited = 0
+        self.mismatched = 0
+        self.in_progress = 0
+        self.evicted = 0
+
+    # ======================
+    # Entries (under _lock)
+    # ======================
+    def _get(self, key: str, now: float) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._drop(key)
+            return None
+        return entry
+
+    def _put(self, key: str, entry: _Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        now = time.time()
+        while self._entries:
+            oldest_key, oldest = next(iter(self._entries.items()))
+            if len(self._entries) > self.max_keys:
+                self.evicted += 1
+            elif oldest.expires_at > now:
+                break
+            self._drop(oldest_key)
+
+    def _drop(self, key: str):
+        self._wake(self._entries.pop(key))
+
+    def _wake(self, entry: _Entry):
+        """Let requests waiting on the entry look again (safe from any thread)."""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(entry.done.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    # ======================
+    # Requests
+    # ======================
+    async def run(self, key: str, fingerprint: str, call) -> Response:
+        """The response for a request with this key; `call()` produces it when the key is new."""
+        self._loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.wait
+        waited = False
+        while True:
+            now = time.time()
+            with self._lock:
+                entry = self._get(key, now)
+                if entry is None:
+                    entry = _Entry(fingerprint, math.inf, local=True)
+                    self._put(key, entry)
+                    break
+            if entry.fingerprint != fingerprint:
+                self.mismatched += 1
+                raise HTTPException(status_code=422, detail=f"{HEADER} was already used for a different request")
+            if entry.response is not None:
+                self.replayed += 1
+                return self._replay(entry.response)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.in_progress += 1
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"A request with this {HEADER} is still in progress",
+                    headers={"Retry-After": "1"},
+                )
+            if not waited:
+                waited = True
+                self.waited += 1
+            try:
+                await asyncio.wait_for(entry.done.wait(), min(remaining, entry.expires_at - now))
+            except asyncio.TimeoutError:
+                pass
+        return await self._run_claimed(key, entry, call)
+
+    async def _run_claimed(self, key: str, entry: _Entry, call) -> Response:
+        await self._publish({"key": key, "fingerprint": entry.fingerprint, "claim": time.time() + CLAIM_SECONDS})
+        try:
+            response = await call()
+        except HTTPException as exc:
+            if _keep(exc.status_code):
+                # Kept as the body FastAPI renders for it; this request still raises as usual
+                await self._finish(key, entry, JSONResponse({"detail": exc.detail}, exc.status_code, exc.headers))
+            else:
+                await self._release(key, entry)
+            raise
+        except BaseException:
+            await self._release(key, entry)
+            raise
+        if getattr(response, "body", None) is None or not _keep(response.status_code):
+            await self._release(key, entry)  # streamed bodies aren't kept
+        else:
+            await self._finish(key, entry, response)
+        return response
+
+    @staticmethod
+    async def _publish(message: dict):
+        # May be a pg_notify round trip (change bus), so it stays off the event loop
+        await run_in_threadpool(change_bus.publish, "idempotency", message)
+
+    async def _finish(self, key: str, entry: _Entry, response: Response):
+        headers = [(name, value) for name, value in response.headers.items() if name != "content-length"]
+        entry.response = (response.status_code, headers, bytes(response.body))
+        with self._lock:
+            entry.expires_at = time.time() + self.ttl
+            if self._entries.get(key) in (None, entry):
+                self._put(key, entry)
+        self.stored += 1
+        entry.done.set()
+        try:
+            body = entry.response[2].decode()
+        except UnicodeDecodeError:
+            return  # not JSON; the other workers just won't have it
+        await self._publish({"key": key, "fingerprint": entry.fingerprint,
+                             "response": [response.status_code, headers, body], "expires_at": entry.expires_at})
+
+    async def _release(self, key: str, entry: _Entry):
+        """Give up the claim without a result; the next request with the key runs."""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+        await self._publish({"key": key, "fingerprint": entry.fingerprint, "release": True})
+
+    @staticmethod
+    def _replay(stored: tuple[int, list[tuple[str, str]], bytes]) -> Response:
+        status_code, headers, body = stored
+        response = Response(content=body, status_code=status_code)
+        for name, value in headers:
+            response.headers.append(name, value)
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    # ======================
+    # Other workers
+    # ======================
+    def apply_message(self, message: dict):
+        """A claim, result or release published by another worker process."""
+        key = message["key"]
+        with self._lock:
+            entry = self._get(key, time.time())
+            if "response" in message:
+                if entry is not None and entry.local and entry.response is None:
+                    return  # ran here too; ours finishes on its own
+                status_code, headers, body = message["response"]
+                finished = _Entry(message["fingerprint"], message["expires_at"], local=False)
+                finished.response = (status_code, [tuple(header) for header in headers], body.encode())
+                self._put(key, finished)
+                if entry is not None:
+                    self._wake(entry)
+            elif message.get("release"):
+                if entry is not None and not entry.local and entry.response is None:
+                    self._drop(key)
+            elif entry is None:
+                self._put(key, _Entry(message["fingerprint"], message["claim"], local=False))
+
+    def resync(self):
+        """Messages may have been missed: stop waiting on other workers' claims."""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if not e.local and e.response is None]:
+                self._drop(key)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            keys = len(self._entries)
+            in_flight = sum(1 for entry in self._entries.values() if entry.response is None)
+        return {
+            "keys": keys,
+            "in_flight": in_flight,
+            "stored": self.stored,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "mismatched": self.mismatched,
+            "in_progress": self.in_progress,
+            "evicted": self.evicted,
+        }
+
+
+idempotency_cache = IdempotencyCache(
+    settings.IDEMPOTENCY_MAX_KEYS, settings.IDEMPOTENCY_TTL_SECONDS, settings.IDEMPOTENCY_WAIT_SECONDS
+)
+change_bus.subscribe("idempotency", idempotency_cache.apply_message, idempotency_cache.resync)
+
+
+async def request_fingerprint(request: Request) -> str:
+    """Hash of what makes two requests the same: method, path, query and body."""
+    digest = hashlib.sha256(f"{request.method} {request.url.path}".encode())
+    for name, value in sorted(request.query_params.multi_items()):
+        digest.update(f"\0{name}={value}".encode())
+    digest.update(b"\0\0" + await request.body())
+    return digest.hexdigest()
+
+
+# ======================
+# Route class
+# ======================
+def idempotent(endpoint):
+    """Mark an endpoint (on an IdempotentRoute router) as honouring Idempotency-Key."""
+    endpoint.idempotent = True
+    return endpoint
+
+
+class IdempotentRoute(TimedRoute):
+    """TimedRoute that answers requests with an Idempotency-Key from idempotency_cache
+    on endpoints marked @idempotent. Wraps the whole handler, dependencies
+    included, so a replay or a waiting duplicate costs no lookup, rate
+    limit token or write slot."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not getattr(self.endpoint, "idempotent", False):
+            return handler
+
+        async def idempotent_handler(request: Request):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return await handler(request)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                raise HTTPException(status_code=400, detail=f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+            return await idempotency_cache.run(key, await request_fingerprint(request), lambda: handler(request))
+
+        return idempotent_handler
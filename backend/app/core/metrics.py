@@ -0,0 +1,148 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+
+class RequestQueries:
+    """Queries issued while serving one request (shared with threadpool workers via contextvars)."""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_current_request: ContextVar[RequestQueries | None] = ContextVar("current_request", default=None)
+
+
+class DbMetrics:
+    """Connection pool and per-route query counters exposed on /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = []
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.routes: dict[str, dict] = {}
+
+    # ======================
+    # Pool
+    # ======================
+    def record_checkout_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_total += seconds
+            self.checkout_wait_max = max(self.checkout_wait_max, seconds)
+
+    def _on_checkout(self, *args):
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def _on_checkin(self, *args):
+        with self._lock:
+            self.in_use -= 1
+
+    # ======================
+    # Queries
+    # ======================
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        queries = _current_request.get()
+        if queries is not None:
+            queries.count += 1
+            queries.seconds += time.perf_counter() - started
+
+    def instrument(self, engine):
+        """Attach pool and query listeners to a sync Engine (use async_engine.sync_engine for async)."""
+        self._engines.append(engine)
+        event.listen(engine.pool, "checkout", self._on_checkout)
+        event.listen(engine.pool, "checkin", self._on_checkin)
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    @contextmanager
+    def track_request(self):
+        queries = RequestQueries()
+        token = _current_request.set(queries)
+        try:
+            yield queries
+        finally:
+            _current_request.reset(token)
+
+    def record_request(self, route: str, queries: RequestQueries, seconds: float):
+        with self._lock:
+            stats = self.routes.setdefault(route, {
+                "requests": 0, "request_seconds": 0.0, "queries": 0, "query_seconds": 0.0, "max_queries": 0
+            })
+            stats["requests"] += 1
+            stats["request_seconds"] += seconds
+            stats["queries"] += queries.count
+            stats["query_seconds"] += queries.seconds
+            stats["max_queries"] = max(stats["max_queries"], queries.count)
+
+    # ======================
+    # Report
+    # ======================
+    def snapshot(self) -> dict:
+        with self._lock:
+            pools = [
+                {
+                    "engine": engine.url.render_as_string(hide_password=True),
+                    "size": engine.pool.size(),
+                    "checked_out": engine.pool.checkedout(),
+                    "overflow": engine.pool.overflow(),
+                }
+                for engine in self._engines
+            ]
+            routes = {
+                route: {
+                    "requests": s["requests"],
+                    "avg_request_ms": round(s["request_seconds"] / s["requests"] * 1000, 3),
+                    "queries": s["queries"],
+                    "avg_queries": round(s["queries"] / s["requests"], 2),
+                    "max_queries": s["max_queries"],
+                    "avg_query_ms": round(s["query_seconds"] / s["queries"] * 1000, 3) if s["queries"] else 0.0,
+                }
+                for route, s in self.routes.items()
+            }
+            return {
+                "pool": {
+                    "checkouts": self.checkouts,
+                    "avg_checkout_wait_ms": round(self.checkout_wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                    "max_checkout_wait_ms": round(self.checkout_wait_max * 1000, 3),
+                    "in_use": self.in_use,
+                    "peak_in_use": self.peak_in_use,
+                    "engines": pools,
+                },
+                "routes": routes,
+            }
+
+
+db_metrics = DbMetrics()
+
+
+def instrumented_pool(pool_cls):
+    """Subclass a QueuePool flavour so the time spent waiting for a connection is recorded."""
+
+    class InstrumentedPool(pool_cls):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                db_metrics.record_checkout_wait(time.perf_counter() - started)
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_cls.__name__}"
+    return InstrumentedPool
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+# argon2 for new hashes; bcrypt hashes still verify and get upgraded on next login
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
+
+# How long a successful HTTP Basic check is remembered, so Basic clients
+# don't pay a full hash verification on every request
+BASIC_CACHE_SECONDS = 300
+BASIC_CACHE_SIZE = 1024
+
+
+def check_password(password: str, password_hash: str | None, legacy_plain: str | None = None) -> tuple[bool, str | None]:
+    """Return (ok, new_hash). new_hash is set when the stored credential should be replaced:
+    a plaintext row being migrated, or a hash made with outdated settings."""
+    if password_hash:
+        return pwd_context.verify_and_update(password, password_hash)
+    if legacy_plain is not None and secrets.compare_digest(legacy_plain.encode(), password.encode()):
+        return True, pwd_context.hash(password)
+    return False, None
+
+
+class CredentialVerifier:
+    """Runs password hashing on a bounded worker pool.
+
+    Hashing is deliberately slow CPU work; doing it on the event loop
+    would stall every other request on the worker. At most
+    PASSWORD_HASH_WORKERS hashes run at once and at most
+    PASSWORD_HASH_QUEUE may be waiting; beyond that callers get a 503
+    straight away instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self._basic_cache: OrderedDict[str, float] = OrderedDict()
+        self.completed = 0
+        self.rejected = 0
+
+    def _submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future):
+        self._slots.release()
+        with self._lock:
+            self.completed += 1
+
+    # ======================
+    # Async (login endpoints)
+    # ======================
+    async def verify(self, password: str, password_hash: str | None, legacy_plain: str | None = None) -> tuple[bool, str | None]:
+        return await asyncio.wrap_future(self._submit(check_password, password, password_hash, legacy_plain))
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(pwd_context.hash, password))
+
+    # ======================
+    # Sync (def routes, already off the loop)
+    # ======================
+    def verify_sync(self, password: str, password_hash: str | None, legacy_plain: str | None = None) -> tuple[bool, str | None]:
+        return self._submit(check_password, password, password_hash, legacy_plain).result()
+
+    def hash_sync(self, password: str) -> str:
+        return self._submit(pwd_context.hash, password).result()
+
+    def hash_many(self, passwords: list[str]) -> list[str]:
+        """Bulk hashing for imports. Keeps at most `workers` hashes in flight and
+        waits for free slots instead of failing, leaving the queue to logins."""
+        futures: list[Future] = []
+        for i, password in enumerate(passwords):
+            if i >= self.workers:
+                futures[i - self.workers].result()
+            self._slots.acquire()
+            future = self._executor.submit(pwd_context.hash, password)
+            future.add_done_callback(self._release)
+            futures.append(future)
+        return [f.result() for f in futures]
+
+    def verify_basic(self, password: str, password_hash: str | None, legacy_plain: str | None = None) -> tuple[bool, str | None]:
+        """verify_sync with a short-lived cache of successful checks, keyed on the stored credential."""
+        key = hashlib.sha256(f"{password_hash or legacy_plain}\0{password}".encode()).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            expires = self._basic_cache.get(key)
+            if expires is not None and expires > now:
+                return True, None
+        ok, new_hash = self.verify_sync(password, password_hash, legacy_plain)
+        if ok:
+            with self._lock:
+                self._basic_cache[key] = now + BASIC_CACHE_SECONDS
+                self._basic_cache.move_to_end(key)
+                while len(self._basic_cache) > BASIC_CACHE_SIZE:
+                    self._basic_cache.popitem(last=False)
+        return ok, new_hash
+
+
+credential_verifier = CredentialVerifier(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE)
+
+
+def apply_new_hash(user, new_hash: str | None):
+    """Store an upgraded hash on a User row and drop any plaintext copy (caller commits)."""
+    if new_hash:
+        user.password_hash = new_hash
+        user.password_plain = None
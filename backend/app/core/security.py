@@ -0,0 +1,185 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, status
+from fastapi.security import HTTPBearer
+from jose import JWTError, jwt
+
+from app.core.change_bus import change_bus
+from app.core.config import settings
+from app.schemas.auth import TokenUser
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# Shortest SECRET_KEY accepted: an HS256 key much shorter than the hash can be brute-forced offline
+MIN_SECRET_KEY_LENGTH = 32
+
+
+def signing_key() -> str:
+    """SECRET_KEY, refusing to sign or verify with a missing or short one (anyone could forge tokens)."""
+    key = settings.SECRET_KEY
+    if len(key) < MIN_SECRET_KEY_LENGTH:
+        raise RuntimeError(f"SECRET_KEY must be set to at least {MIN_SECRET_KEY_LENGTH} characters")
+    return key
+
+
+class RevocationList:
+    """In-memory record of tokens that must no longer be accepted.
+
+    Two compact structures: revoked token ids (logouts), kept only until
+    the token would have expired anyway, and a per-user "not before"
+    time (password changes, deletes) that invalidates every token issued
+    earlier for that user. Revocations are forwarded to the other worker
+    processes over the change bus.
+
+    This is the cache access tokens are checked against. What outlives
+    a restart is stored (users.tokens_valid_after, revoked_tokens) and
+    loaded by reload() at startup and whenever bus messages were missed;
+    refresh checks the stored copy itself (revoked_in_database).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked: dict[str, float] = {}  # jti -> exp
+        self._not_before: dict[str, float] = {}  # user id -> unix time
+        self._next_prune = 0.0
+        self._next_purge = 0.0  # of expired revoked_tokens rows
+
+    def revoke_token(self, jti: str, exp: float, broadcast: bool = True):
+        with self._lock:
+            self._revoked[jti] = exp
+            self._prune()
+        if broadcast:
+            change_bus.publish("revocations", {"jti": jti, "exp": exp})
+
+    def revoke_subject(self, subject: str, at: float | None = None, broadcast: bool = True):
+        at = at or time.time()
+        with self._lock:
+            self._not_before[str(subject)] = max(self._not_before.get(str(subject), 0.0), at)
+            self._prune()
+        if broadcast:
+            change_bus.publish("revocations", {"sub": str(subject), "at": at})
+
+    def apply(self, change: dict):
+        """A revocation published by another worker process."""
+        if "jti" in change:
+            self.revoke_token(change["jti"], change["exp"], broadcast=False)
+        else:
+            self.revoke_subject(change["sub"], change["at"], broadcast=False)
+
+    def store(self, db, *payloads: dict):
+        """Revoke tokens for good (logout, a swapped refresh token): stored, then dropped here and in the other workers."""
+        from app.models.revoked_token import RevokedToken
+
+        now = time.time()
+        for payload in payloads:
+            db.merge(RevokedToken(jti=payload["jti"], user_id=str(payload["sub"]), expires_at=payload["exp"]))
+        if now >= self._next_purge:
+            self._next_purge = now + 3600
+            db.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete(synchronize_session=False)
+        db.commit()
+        for payload in payloads:
+            self.revoke_token(payload["jti"], payload["exp"])
+
+    @staticmethod
+    def revoked_in_database(db, payload: dict, tokens_valid_after: float | None) -> bool:
+        """The stored revocations, checked on refresh: they hold across restarts and missed bus messages."""
+        from app.models.revoked_token import RevokedToken
+
+        if tokens_valid_after is not None and payload.get("iat", 0) < tokens_valid_after:
+            return True
+        return db.get(RevokedToken, payload["jti"]) is not None
+
+    def reload(self, session_factory=None):
+        """Merge in the stored revocations that can still matter for an access token."""
+        from app.db.session import SessionLocal
+        from app.models.revoked_token import RevokedToken
+        from app.models.user import User
+
+        now = time.time()
+        db = (session_factory or SessionLocal)()
+        try:
+            horizon = now - settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+            not_before = db.query(User.id, User.tokens_valid_after).filter(User.tokens_valid_after > horizon).all()
+            # Refresh tokens are only accepted after a database check, so only (short-lived) access tokens are loaded
+            access_horizon = now + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+            revoked = db.query(RevokedToken.jti, RevokedToken.expires_at).filter(
+                RevokedToken.expires_at > now, RevokedToken.expires_at <= access_horizon
+            ).all()
+        finally:
+            db.close()
+        with self._lock:
+            for subject, at in not_before:
+                self._not_before[subject] = max(self._not_before.get(subject, 0.0), at)
+            self._revoked.update(revoked)
+
+    def is_revoked(self, payload: dict) -> bool:
+        if payload.get("jti") in self._revoked:
+            return True
+        not_before = self._not_before.get(payload.get("sub"))
+        return not_before is not None and payload.get("iat", 0) < not_before
+
+    def _prune(self):
+        now = time.time()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + 60
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        # Nothing issued before this is still within its lifetime
+        horizon = now - settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+        self._not_before = {sub: t for sub, t in self._not_before.items() if t > horizon}
+
+    def __len__(self):
+        return len(self._revoked) + len(self._not_before)
+
+
+revocations = RevocationList()
+change_bus.subscribe("revocations", revocations.apply, revocations.reload)
+
+
+
+def _create_token(user: TokenUser, token_type: str, lifetime: timedelta) -> str:
+    now = datetime.now(timezone.utc)
+    # iat keeps sub-second precision so a password change revokes tokens issued a moment earlier
+    payload = {
+        "sub": user.id,
+        "role": user.role,
+        "username": user.username,
+        "name": user.full_name,
+        "email": user.email,
+        "type": token_type,
+        "jti": uuid.uuid4().hex,
+        "iat": now.timestamp(),
+        "exp": int((now + lifetime).timestamp()),
+    }
+    return jwt.encode(payload, signing_key(), algorithm=settings.ALGORITHM)
+
+
+def create_tokens(user: TokenUser) -> dict:
+    """Access + refresh token pair returned by the login endpoints."""
+    return {
+        "access_token": _create_token(user, "access", timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)),
+        "refresh_token": _create_token(user, "refresh", timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)),
+        "token_type": "bearer",
+    }
+
+
+def decode_token(token: str, token_type: str = "access") -> dict:
+    key = signing_key()
+    try:
+        payload = jwt.decode(token, key, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    if payload.get("type") != token_type or revocations.is_revoked(payload):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    return payload
+
+
+def user_from_token(token: str, role: str) -> TokenUser:
+    """Verify an access token for the given role; no database access."""
+    payload = decode_token(token)
+    if payload.get("role") != role:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    return TokenUser.from_claims(payload)
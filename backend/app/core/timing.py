@@ -0,0 +1,345 @@
+import cProfile
+import functools
+import inspect
+import io
+import itertools
+import marshal
+import pstats
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+
+# Phases broken out per request. They may overlap: with the sql backend
+# the store phase includes the queries it runs, which also count as db.
+PHASES = ("auth", "db", "store", "serialize")
+
+# Latency histogram bucket upper bounds, in milliseconds (plus one overflow bucket)
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class RequestTiming:
+    """Per-phase time spent serving one request (shared with threadpool workers via contextvars)."""
+    __slots__ = ("phases", "active", "endpoint_done", "profiles")
+
+    def __init__(self, profile: bool = False):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.active: set[str] = set()
+        self.endpoint_done: float | None = None
+        self.profiles: list[cProfile.Profile] | None = [] if profile else None
+
+
+_current_timing: ContextVar[RequestTiming | None] = ContextVar("current_timing", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Add the time spent in the block to `name` for the current request (outermost block only)."""
+    timing = _current_timing.get()
+    if timing is None or name in timing.active:
+        yield
+        return
+    timing.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.phases[name] += time.perf_counter() - started
+        timing.active.discard(name)
+
+
+def timed(name: str):
+    """Decorator form of phase(); keeps the signature so it works on FastAPI dependencies."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with phase(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_methods(name: str, *methods: str):
+    """Class decorator: time the listed methods as phase `name`."""
+    def decorator(cls):
+        for method in methods:
+            setattr(cls, method, timed(name)(getattr(cls, method)))
+        return cls
+    return decorator
+
+
+@contextmanager
+def profiled():
+    """cProfile the block on this thread when the current request was picked for profiling."""
+    timing = _current_timing.get()
+    if timing is None or timing.profiles is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        timing.profiles.append(profile)
+
+
+# ======================
+# Route class
+# ======================
+def _mark_endpoint_done():
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.endpoint_done = time.perf_counter()
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that attributes the time between the endpoint returning and the
+    response being built (response model validation + JSON rendering) to the
+    serialize phase, and runs profiled requests under cProfile.
+
+    Sync endpoints run on a worker thread, so they get their own profile there;
+    the handler's profile covers the event loop side.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def timed_endpoint(*args, **kw):
+                try:
+                    return await endpoint(*args, **kw)
+                finally:
+                    _mark_endpoint_done()
+        else:
+            @functools.wraps(endpoint)
+            def timed_endpoint(*args, **kw):
+                try:
+                    with profiled():
+                        return endpoint(*args, **kw)
+                finally:
+                    _mark_endpoint_done()
+        super().__init__(path, timed_endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            with profiled():
+                response = await handler(request)
+            timing = _current_timing.get()
+            if timing is not None and timing.endpoint_done is not None:
+                timing.phases["serialize"] += time.perf_counter() - timing.endpoint_done
+            return response
+
+        return timed_handler
+
+
+# ======================
+# Histograms
+# ======================
+class LatencyHistogram:
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, ms: float):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += ms
+        self.count += 1
+        self.max = max(self.max, ms)
+
+    def percentile(self, pct: float) -> float:
+        """Estimate, interpolating linearly inside the bucket that holds the percentile."""
+        rank = pct / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS_MS[i - 1] if i else 0.0
+                upper = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+                return round(lower + (upper - lower) * (rank - seen) / n, 3)
+            seen += n
+        return 0.0
+
+
+class RequestTimings:
+    """Per-route latency histograms and phase totals exposed on /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: dict[str, dict] = {}
+
+    @contextmanager
+    def track(self, profile: bool = False):
+        timing = RequestTiming(profile)
+        token = _current_timing.set(timing)
+        try:
+            yield timing
+        finally:
+            _current_timing.reset(token)
+
+    def record(self, route: str, timing: RequestTiming, seconds: float):
+        with self._lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = {"histogram": LatencyHistogram(), "phases": dict.fromkeys(PHASES, 0.0)}
+            stats["histogram"].record(seconds * 1000)
+            for name, spent in timing.phases.items():
+                stats["phases"][name] += spent
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            report = {}
+            for route, stats in self.routes.items():
+                histogram = stats["histogram"]
+                report[route] = {
+                    "requests": histogram.count,
+                    "avg_ms": round(histogram.total / histogram.count, 3),
+                    "p50_ms": histogram.percentile(50),
+                    "p95_ms": histogram.percentile(95),
+                    "p99_ms": histogram.percentile(99),
+                    "max_ms": round(histogram.max, 3),
+                    "avg_phase_ms": {
+                        name: round(spent / histogram.count * 1000, 3) for name, spent in stats["phases"].items()
+                    },
+                    "buckets_ms": {
+                        str(bound): n for bound, n in zip((*BUCKETS_MS, "+Inf"), histogram.counts)
+                    },
+                }
+            return report
+
+
+request_timings = RequestTimings()
+
+
+def server_timing(timing: RequestTiming, queries: int, seconds: float) -> str:
+    """Server-Timing header value: total plus each phase that took any time."""
+    parts = [f"total;dur={seconds * 1000:.2f}"]
+    for name, spent in timing.phases.items():
+        if name == "db":
+            parts.append(f'db;dur={spent * 1000:.2f};desc="{queries} queries"')
+        elif spent:
+            parts.append(f"{name};dur={spent * 1000:.2f}")
+    return ", ".join(parts)
+
+
+# ======================
+# Sampling profiler
+# ======================
+class RequestProfiler:
+    """On-demand cProfile of a sample of requests.
+
+    Switched on by an admin for a limited time; while on, each request is
+    profiled with probability `sample_rate`, at most one at a time (two
+    profilers on the event loop thread would clobber each other, and it
+    caps the overhead). Sampled profiles also capture whatever else ran on
+    the event loop meanwhile. The newest `keep` profiles are held in
+    memory as pstats data, ready for snakeviz or pstats.
+    """
+
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._profiles: OrderedDict[str, dict] = OrderedDict()
+        self._busy = False
+        self.sample_rate = 0.0
+        self.until: float | None = None  # monotonic deadline while enabled
+        self.sampled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.until is not None and time.monotonic() < self.until
+
+    def enable(self, sample_rate: float, seconds: float):
+        with self._lock:
+            self.sample_rate = sample_rate
+            self.until = time.monotonic() + seconds
+
+    def disable(self):
+        with self._lock:
+            self.until = None
+
+    def should_sample(self) -> bool:
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if self._busy:
+                return False
+            self._busy = True
+            return True
+
+    def collect(self, route: str, path: str, timing: RequestTiming, seconds: float):
+        """Store the profile of a sampled request (call once it is done, even if it failed)."""
+        try:
+            if not timing.profiles:
+                return
+            stats = pstats.Stats(timing.profiles[0])
+            for profile in timing.profiles[1:]:
+                stats.add(profile)
+            entry = {
+                "id": f"prof-{next(self._ids)}",
+                "route": route,
+                "path": path,
+                "duration_ms": round(seconds * 1000, 3),
+                "phases_ms": {name: round(spent * 1000, 3) for name, spent in timing.phases.items()},
+                "created_at": datetime.utcnow().isoformat(),
+                "data": marshal.dumps(stats.stats),
+            }
+            with self._lock:
+                self.sampled += 1
+                self._profiles[entry["id"]] = entry
+                while len(self._profiles) > self.keep:
+                    self._profiles.popitem(last=False)
+        finally:
+            with self._lock:
+                self._busy = False
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "seconds_left": round(max(self.until - time.monotonic(), 0), 1) if self.enabled else 0,
+                "sampled": self.sampled,
+                "profiles": [{k: v for k, v in p.items() if k != "data"} for p in reversed(self._profiles.values())],
+            }
+
+    def get(self, profile_id: str) -> dict | None:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    @staticmethod
+    def render_text(data: bytes, limit: int = 60) -> str:
+        """Top functions by cumulative time, as pstats prints them."""
+        stats = pstats.Stats.__new__(pstats.Stats)
+        stats.init(None)
+        stats.stats = marshal.loads(data)
+        stats.get_top_level_stats()
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+request_profiler = RequestProfiler(settings.PROFILE_MAX_PROFILES)
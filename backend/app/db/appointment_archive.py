@@ -0,0 +1,437 @@
+import asyncio
+import gzip
+import os
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import orjson
+
+from app.core.config import settings
+from app.db.appointment_store import INDEXED_FIELDS, AppointmentStore, _check_filters, appointment_store
+from app.services.appointment_stats import AppointmentCounters
+
+try:
+    import fcntl
+except ImportError:  # Windows: single worker, no need to keep other archivers out
+    fcntl = None
+
+# Decoded segments kept in memory for history queries (the most recently used ones)
+SEGMENT_CACHE_SIZE = 6
+
+# Appointments moved out of the hot store per write-locked batch
+ARCHIVE_BATCH_SIZE = 1000
+
+_MONTH = re.compile(r"^\d{4}-\d{2}")
+
+
+def archive_date(record: dict) -> str | None:
+    """The ISO timestamp that decides when an appointment is old: its slot, else when it was made."""
+    return record.get("start_at") or record.get("created_at")
+
+
+def _count(records) -> AppointmentCounters:
+    counters = AppointmentCounters()
+    for record in records:
+        if record.get("deleted"):
+            counters.replace(record, None)  # a tombstone takes its appointment back out
+        else:
+            counters.replace(None, record)
+    return counters
+
+
+class AppointmentArchive:
+    """Appointments moved out of the hot store, in one segment per month of start_at.
+
+    A segment (YYYY-MM.jsonl.gz) is append-only: each archiver run adds a
+    gzip member of JSON lines. manifest.json records, per segment, its
+    committed size and the range of start dates and appointment ids plus
+    the doctor_id / patient_username / status values it contains, so a
+    query only opens the segments that can hold a match, and the segment's
+    dashboard counts, so stats never open one. Bytes past the
+    committed size (an append cut short by a crash) are ignored and
+    overwritten by the next append. Deleting appends a tombstone (the
+    record with "deleted": true) to the appointment's segment.
+    """
+
+    def __init__(self, directory: Path, cache_size: int = SEGMENT_CACHE_SIZE):
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / "manifest.json"
+        self.lock_path = self.directory / ".lock"
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._segments: dict[str, dict] = {}
+        self._manifest_id: tuple[int, int] | None = None  # (mtime_ns, size) of the manifest loaded
+        self._cache: OrderedDict[str, tuple[int, list[str], dict[str, dict]]] = OrderedDict()
+        self._counters = AppointmentCounters()  # sum of every segment's counts
+        self.archived = 0
+        self.queries = 0
+        self.segments_read = 0
+        self.segments_skipped = 0
+        self.cache_misses = 0
+
+    # ======================
+    # Manifest
+    # ======================
+    def _refresh(self):
+        """Reload the manifest if another process (or a run here) rewrote it."""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            self._segments, self._manifest_id = {}, None
+            return
+        manifest_id = (stat.st_mtime_ns, stat.st_size)
+        if manifest_id == self._manifest_id:
+            return
+        with open(self.manifest_path, "rb") as f:
+            segments = orjson.loads(f.read())["segments"]
+        counters = AppointmentCounters()
+        for month, meta in segments.items():
+            meta["values"] = {field: set(values) for field, values in meta["values"].items()}
+            if "counts" not in meta:
+                # Archived before segments carried counts
+                meta["counts"] = _count(self._segment(month, meta)[1].values()).to_dict()
+            counters.absorb(meta["counts"])
+        self._segments, self._manifest_id, self._counters = segments, manifest_id, counters
+
+    @contextmanager
+    def locked(self, wait: bool = True):
+        """Hold the cross-process archive lock for appends and recounts.
+        Yields False instead of waiting when wait=False and it is taken."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "ab") as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write_manifest(self):
+        segments = {
+            month: {**meta, "values": {field: sorted(values) for field, values in meta["values"].items()}}
+            for month, meta in self._segments.items()
+        }
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps({"segments": segments}, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        stat = os.stat(self.manifest_path)
+        self._manifest_id = (stat.st_mtime_ns, stat.st_size)
+
+    # ======================
+    # Writes
+    # ======================
+    def append(self, records: list[dict]):
+        """Add records to their monthly segments, then commit them in the manifest.
+
+        Called with locked() held. Records without a usable date
+        are rejected, since no segment could be found for them again.
+        """
+        by_month: dict[str, list[dict]] = {}
+        for record in records:
+            key = archive_date(record)
+            if not key or not _MONTH.match(key):
+                raise ValueError(f"Appointment {record.get('appointment_id')} has no date to archive it by")
+            by_month.setdefault(key[:7], []).append(record)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._refresh()
+            for month, batch in sorted(by_month.items()):
+                meta = self._segments.get(month) or {
+                    "file": f"{month}.jsonl.gz", "bytes": 0, "count": 0,
+                    "min_start": None, "max_start": None, "min_id": None, "max_id": None,
+                    "values": {field: set() for field in INDEXED_FIELDS},
+                    "counts": AppointmentCounters().to_dict(),
+                }
+                with open(self.directory / meta["file"], "ab") as f:
+                    f.truncate(meta["bytes"])  # drop a member left half-written by a crash
+                    f.write(gzip.compress(b"".join(orjson.dumps(r, option=orjson.OPT_APPEND_NEWLINE) for r in batch)))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    meta["bytes"] = f.tell()
+
+                dates = [archive_date(r) for r in batch]
+                ids = [r["appointment_id"] for r in batch]
+                meta["count"] += sum(-1 if r.get("deleted") else 1 for r in batch)
+                meta["min_start"] = min(filter(None, (meta["min_start"], *dates)))
+                meta["max_start"] = max(filter(None, (meta["max_start"], *dates)))
+                meta["min_id"] = min(filter(None, (meta["min_id"], *ids)))
+                meta["max_id"] = max(filter(None, (meta["max_id"], *ids)))
+                for field in INDEXED_FIELDS:
+                    meta["values"][field].update(str(r[field]) for r in batch if r.get(field) is not None)
+                added = _count(batch).to_dict()
+                segment_counts = AppointmentCounters()
+                segment_counts.absorb(meta["counts"])
+                segment_counts.absorb(added)
+                meta["counts"] = segment_counts.to_dict()
+                self._counters.absorb(added)
+                self._segments[month] = meta
+            self._write_manifest()
+            self.archived += len(records)
+
+    # ======================
+    # Reads
+    # ======================
+    def _can_match(self, meta: dict, after: str | None, start_from: str | None,
+                   start_before: str | None, filters: dict) -> bool:
+        if after is not None and meta["max_id"] <= after:
+            return False
+        # Both bounds need a start_at, and every start_at in the segment is inside [min_start, max_start]
+        if start_from is not None and meta["max_start"] < start_from:
+            return False
+        if start_before is not None and meta["min_start"] >= start_before:
+            return False
+        return all(str(value) in meta["values"][field] for field, value in filters.items())
+
+    def _segment(self, month: str, meta: dict) -> tuple[list[str], dict[str, dict]]:
+        """Sorted ids and records of one segment (the last copy of a record appended twice wins)."""
+        cached = self._cache.get(month)
+        if cached is not None and cached[0] == meta["bytes"]:
+            self._cache.move_to_end(month)
+            return cached[1], cached[2]
+        self.cache_misses += 1
+        with open(self.directory / meta["file"], "rb") as f:
+            data = gzip.decompress(f.read(meta["bytes"]))
+        records = {}
+        for line in data.splitlines():
+            record = orjson.loads(line)
+            if record.get("deleted"):
+                records.pop(record["appointment_id"], None)
+            else:
+                records[record["appointment_id"]] = record
+        ids = sorted(records)
+        self._cache[month] = (meta["bytes"], ids, records)
+        self._cache.move_to_end(month)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return ids, records
+
+    def page(self, limit: int, after: str | None = None, start_from: str | None = None,
+             start_before: str | None = None, **filters) -> list[dict]:
+        """AppointmentStore.page() over the archive, opening only segments that can match."""
+        _check_filters(filters)
+        found: dict[str, dict] = {}
+        with self._lock:
+            self._refresh()
+            self.queries += 1
+            for month, meta in sorted(self._segments.items()):
+                if not self._can_match(meta, after, start_from, start_before, filters):
+                    self.segments_skipped += 1
+                    continue
+                self.segments_read += 1
+                ids, records = self._segment(month, meta)
+                matched = 0
+                for appointment_id in ids[bisect_right(ids, after) if after is not None else 0:]:
+                    record = records[appointment_id]
+                    if any(str(record.get(f)) != str(v) for f, v in filters.items()):
+                        continue
+                    if start_from is not None or start_before is not None:
+                        start_at = record.get("start_at")
+                        if start_at is None or (start_from is not None and start_at < start_from) \
+                                or (start_before is not None and start_at >= start_before):
+                            continue
+                    found[appointment_id] = record
+                    matched += 1
+                    if matched >= limit:
+                        break
+        return [dict(found[i]) for i in sorted(found)[:limit]]
+
+    def delete_where(self, **filters) -> set[str]:
+        """Tombstone every archived appointment matching the indexed filters; returns their ids.
+        Called with locked() held."""
+        _check_filters(filters)
+        with self._lock:
+            self._refresh()
+            doomed = []
+            for month, meta in sorted(self._segments.items()):
+                if not self._can_match(meta, None, None, None, filters):
+                    continue
+                doomed.extend(
+                    record for record in self._segment(month, meta)[1].values()
+                    if all(str(record.get(f)) == str(v) for f, v in filters.items())
+                )
+        if doomed:
+            self.append([{**record, "deleted": True} for record in doomed])
+        return {record["appointment_id"] for record in doomed}
+
+    def all(self) -> list[dict]:
+        """Every archived appointment once (the copy in the latest month), e.g. to export it."""
+        with self._lock:
+            self._refresh()
+            found: dict[str, dict] = {}
+            for month, meta in sorted(self._segments.items()):
+                found.update(self._segment(month, meta)[1])
+            return [dict(record) for record in found.values()]
+
+    def counters(self) -> AppointmentCounters:
+        with self._lock:
+            self._refresh()
+            return self._counters.copy()
+
+    def recount(self, exclude: set[str] = frozenset()):
+        """Recount every segment from its records, counting each appointment once
+        (the copy in the latest month) and leaving out the `exclude` ids.
+        Called with locked() held."""
+        with self._lock:
+            self._refresh()
+            seen = set(exclude)
+            counters = AppointmentCounters()
+            for month in sorted(self._segments, reverse=True):
+                meta = self._segments[month]
+                records = self._segment(month, meta)[1]
+                segment_counts = _count(r for i, r in records.items() if i not in seen)
+                seen.update(records)
+                meta["counts"] = segment_counts.to_dict()
+                counters.absorb(meta["counts"])
+            self._counters = counters
+            if self._segments:
+                self._write_manifest()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "segments": len(self._segments),
+                "appointments": sum(m["count"] for m in self._segments.values()),
+                "bytes": sum(m["bytes"] for m in self._segments.values()),
+                "oldest": min((m["min_start"] for m in self._segments.values()), default=None),
+                "archived_here": self.archived,
+                "queries": self.queries,
+                "segments_read": self.segments_read,
+                "segments_skipped": self.segments_skipped,
+                "cache_misses": self.cache_misses,
+            }
+
+
+class AppointmentHistory:
+    """Hot store plus archive behind the page() interface, for queries that reach into the past.
+
+    An appointment in both (archived, then a crash before it left the
+    hot store) comes from the hot store.
+    """
+
+    def __init__(self, store: AppointmentStore, archive: AppointmentArchive):
+        self.store = store
+        self.archive = archive
+
+    def page(self, limit: int, after: str | None = None, start_from: str | None = None,
+             start_before: str | None = None, **filters) -> list[dict]:
+        hot = self.store.page(limit, after, start_from, start_before, **filters)
+        archived = self.archive.page(limit, after, start_from, start_before, **filters)
+        if not archived:
+            return hot
+        still_hot = self.store.get_many(r["appointment_id"] for r in archived)
+        merged = {r["appointment_id"]: r for r in archived if r["appointment_id"] not in still_hot}
+        merged.update((r["appointment_id"], r) for r in hot)
+        return [merged[i] for i in sorted(merged)[:limit]]
+
+    def delete_where(self, **filters) -> int:
+        """Delete from the hot store and the archive (holding the archive lock, so
+        nothing is archived in between); returns how many appointments went."""
+        with self.archive.locked():
+            hot = {a["appointment_id"] for a in self.store.find(**filters)}
+            self.store.delete_where(**filters)
+            return len(hot | self.archive.delete_where(**filters))
+
+    def counters(self) -> AppointmentCounters:
+        counters = self.store.counters()
+        counters.absorb(self.archive.counters().to_dict())
+        return counters
+
+    def rebuild_counters(self):
+        """Recount the hot store, then the archive minus what is still hot
+        (holding the archive lock, so nothing moves in between)."""
+        with self.archive.locked():
+            self.store.rebuild_counters()
+            self.archive.recount({a["appointment_id"] for a in self.store.all()})
+
+
+class Archiver:
+    """Background task that moves appointments older than APPOINTMENT_ARCHIVE_AFTER_DAYS
+    out of the hot store every APPOINTMENT_ARCHIVE_INTERVAL_SECONDS (json backend only)."""
+
+    def __init__(self, store: AppointmentStore, archive: AppointmentArchive):
+        self.store = store
+        self.archive = archive
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.moved = 0
+        self.last_run: str | None = None
+        self.last_error: str | None = None
+
+    def run_once(self, now: datetime | None = None) -> int:
+        """Archive what is due; returns how many appointments moved (0 if another worker is at it)."""
+        days = settings.APPOINTMENT_ARCHIVE_AFTER_DAYS
+        if days <= 0:
+            return 0
+        cutoff = ((now or datetime.utcnow()) - timedelta(days=days)).isoformat(timespec="seconds")
+
+        def due(record: dict) -> bool:
+            key = archive_date(record)
+            return key is not None and key < cutoff and _MONTH.match(key) is not None
+
+        with self.archive.locked(wait=False) as acquired:
+            if not acquired:
+                return 0
+            moved = self.store.evict(due, self.archive.append, ARCHIVE_BATCH_SIZE)
+        self.runs += 1
+        self.moved += moved
+        self.last_run = datetime.utcnow().isoformat()
+        return moved
+
+    def start(self):
+        if settings.APPOINTMENT_BACKEND != "sql" and settings.APPOINTMENT_ARCHIVE_AFTER_DAYS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+                self.last_error = None
+            except Exception as e:
+                # Keep going: whatever didn't move stays in the hot store until the next run
+                self.last_error = repr(e)
+            await asyncio.sleep(settings.APPOINTMENT_ARCHIVE_INTERVAL_SECONDS)
+
+    def snapshot(self) -> dict:
+        return {
+            "after_days": settings.APPOINTMENT_ARCHIVE_AFTER_DAYS,
+            "runs": self.runs,
+            "moved": self.moved,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+            **self.archive.snapshot(),
+        }
+
+
+appointment_archive = AppointmentArchive(
+    Path(settings.APPOINTMENT_ARCHIVE_DIR) if settings.APPOINTMENT_ARCHIVE_DIR else appointment_store.path.parent / "archive"
+)
+archiver = Archiver(appointment_store, appointment_archive)
+
+
+def with_history(store):
+    """What history queries should read: the json store's hot set plus its archive.
+    The sql backend keeps every appointment in its indexed table, so it is used as is."""
+    if isinstance(store, AppointmentStore):
+        return AppointmentHistory(store, appointment_archive)
+    return store
@@ -0,0 +1,721 @@
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+
+from app.core.change_bus import change_bus
+from app.core.config import settings
+from app.core.timing import phase, timed_methods
+from app.db.session import get_db
+from app.models.appointment import Appointment
+from app.services.appointment_stats import AppointmentCounters, sql_counters
+from app.services.scheduling import ACTIVE_STATUSES, SLOT_FIELDS, SlotIndex, SlotTaken, occupies_slot, parse_slot
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process write lock, so run a single worker there
+    fcntl = None
+
+# Snapshot + journal live next to each other in app/db/
+APPOINTMENT_FILE = Path(__file__).parent / "appointments.json"
+
+# Fields that get a hash index (field value -> ordered set of appointment ids)
+INDEXED_FIELDS = ("doctor_id", "patient_username", "status")
+
+# Rewrite the snapshot once this many journal entries have piled up
+COMPACT_EVERY = 500
+
+# Public methods timed as the "store" phase of a request (Server-Timing, /metrics)
+STORE_METHODS = ("get", "get_many", "all", "find", "page", "find_conflicts", "count",
+                 "add", "add_if_free", "update", "update_if_free", "update_many", "delete", "delete_where")
+
+
+def _file_id(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def _check_filters(filters: dict):
+    for field in filters:
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"{field} is not an indexed field")
+
+
+@timed_methods("store", *STORE_METHODS)
+class AppointmentStore:
+    """In-memory appointment repository with hash indexes.
+
+    The full data set is kept in memory and indexed by appointment_id,
+    doctor_id, patient_username and status, plus a SlotIndex per doctor
+    for conflict checks, and AppointmentCounters for the dashboard stats.
+    Every change is appended to a
+    journal file (one JSON line per operation) instead of rewriting
+    appointments.json; the snapshot is rebuilt from memory every
+    COMPACT_EVERY journal entries.
+
+    Several worker processes can share the files: writers take a file
+    lock and first catch up on what the others appended, and catch_up()
+    (run on change-bus notifications) brings readers up to date. A
+    snapshot replaced by another process's compaction means a full reload.
+    """
+
+    def __init__(self, path: Path = APPOINTMENT_FILE, journal_path: Path | None = None,
+                 compact_every: int = COMPACT_EVERY):
+        self.path = Path(path)
+        self.journal_path = Path(journal_path) if journal_path else self.path.with_suffix(".journal")
+        self.lock_path = self.path.with_suffix(".lock")
+        self.compact_every = compact_every
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._records: dict[str, dict] = {}
+        self._indexes: dict[str, dict[str, dict[str, None]]] = {f: {} for f in INDEXED_FIELDS}
+        self._slots: dict[str, SlotIndex] = {}
+        self._order: list[str] | None = None  # sorted appointment ids for page(), built on first use
+        self._sorted_buckets: dict[tuple[str, str], list[str]] = {}  # same per index bucket, for filtered pages
+        self._counters = AppointmentCounters()
+        self._journal = None
+        self._journal_entries = 0
+        self._journal_offset = 0  # bytes of the journal applied to memory
+        self._snapshot_id: tuple[int, int] | None = None  # which snapshot file memory was loaded from
+        self._lock_file = None
+        self._lock_depth = 0
+        self._unpublished = False  # journal written, other processes not told yet
+        self.reloads = 0
+
+    # ======================
+    # Loading / persistence
+    # ======================
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._records.clear()
+            for index in self._indexes.values():
+                index.clear()
+            self._slots.clear()
+            self._order = None
+            self._sorted_buckets.clear()
+            self._counters = AppointmentCounters()
+
+            # Taken first: a compaction racing this load shows up as a changed id on the next catch-up
+            self._snapshot_id = _file_id(self.path)
+            if self.path.exists():
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except json.JSONDecodeError:
+                    raise ValueError(f"{self.path.name} is invalid JSON")
+                if not isinstance(data, dict) or "appointments" not in data:
+                    raise ValueError(f"{self.path.name} format invalid")
+                for record in data["appointments"]:
+                    if "start_at" not in record:
+                        # Records written before slots were tracked
+                        slot = parse_slot(record.get("time"), record.get("date"))
+                        if slot:
+                            record["start_at"], record["end_at"] = slot
+                    self._put(record)
+
+            self._journal_entries = 0
+            self._journal_offset = 0
+            self._read_journal()
+            self._loaded = True
+
+    def _read_journal(self) -> int:
+        """Apply journal entries past the last one read; returns how many."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        end = data.rfind(b"\n") + 1  # a line still being written is picked up next time
+        applied = 0
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn by a crash mid-append; the entries after it are intact
+                continue
+            self._replay(entry)
+            applied += 1
+        self._journal_offset += end
+        self._journal_entries += applied
+        return applied
+
+    def catch_up(self) -> int:
+        """Apply what other processes wrote since we last looked; returns entries applied (no-op until loaded)."""
+        with self._lock:
+            if not self._loaded:
+                return 0
+            if _file_id(self.path) != self._snapshot_id:
+                # Another process compacted: its snapshot has everything, start over from it
+                self.reloads += 1
+                self._loaded = False
+                self.close()
+                self.load()
+                return len(self._records)
+            return self._read_journal()
+
+    @contextmanager
+    def _writing(self):
+        """Hold the store for a write: this process's lock, the cross-process file lock,
+        and a catch-up so the write applies on top of every other process's writes.
+        Other processes are told about the write once both locks are released (a
+        pg_notify round trip with Postgres shouldn't hold up every writer)."""
+        self.load()
+        publish = False
+        try:
+            with self._lock:
+                if fcntl is not None and self._lock_depth == 0:
+                    if self._lock_file is None:
+                        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+                        self._lock_file = open(self.lock_path, "ab")
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    if self._lock_depth == 1:
+                        self.catch_up()
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    if self._lock_depth == 0:
+                        if fcntl is not None:
+                            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                        publish, self._unpublished = self._unpublished, False
+        finally:
+            if publish:
+                change_bus.publish("appointments")
+
+    def _replay(self, entry: dict):
+        if entry["op"] == "put":
+            self._put(entry["record"])
+        elif entry["op"] == "del":
+            self._remove(entry["id"])
+
+    def _append(self, entries: Iterable[dict], compact: bool = True):
+        if self._journal is None:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self.journal_path, "ab")
+        if os.fstat(self._journal.fileno()).st_size > self._journal_offset:
+            # All that's left past our catch-up is a line torn by a crash; end it so ours starts clean
+            self._journal.write(b"\n")
+        written = 0
+        for entry in entries:
+            self._journal.write(json.dumps(entry, separators=(",", ":")).encode() + b"\n")
+            written += 1
+        self._journal.flush()
+        # Under the write lock nobody else appended since our catch-up
+        self._journal_offset = self._journal.tell()
+        self._journal_entries += written
+        self._unpublished = True
+        if compact and self._journal_entries >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Write the in-memory state as a fresh snapshot and truncate the journal."""
+        with self._writing():
+            tmp_path = self.path.with_suffix(".json.tmp")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"appointments": list(self._records.values())}, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._snapshot_id = _file_id(self.path)
+
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self.journal_path.unlink(missing_ok=True)
+            self._journal_entries = 0
+            self._journal_offset = 0
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def snapshot(self) -> dict:
+        """Size and staleness: journal bytes other processes wrote that aren't applied here yet."""
+        with self._lock:
+            try:
+                journal_size = os.stat(self.journal_path).st_size
+            except FileNotFoundError:
+                journal_size = 0
+            replaced = self._loaded and _file_id(self.path) != self._snapshot_id
+            return {
+                "loaded": self._loaded,
+                "appointments": len(self._records),
+                "journal_entries": self._journal_entries,
+                "unapplied_journal_bytes": journal_size if replaced else max(journal_size - self._journal_offset, 0),
+                "snapshot_replaced": replaced,
+                "reloads": self.reloads,
+            }
+
+    # ======================
+    # Index maintenance
+    # ======================
+    def _put(self, record: dict):
+        appointment_id = record["appointment_id"]
+        old = self._records.get(appointment_id)
+        if old is not None:
+            self._unindex(old)
+        elif self._order is not None:
+            insort(self._order, appointment_id)
+        self._counters.replace(old, record)
+        self._records[appointment_id] = record
+        for field in INDEXED_FIELDS:
+            value = record.get(field)
+            if value is not None:
+                self._indexes[field].setdefault(str(value), {})[appointment_id] = None
+                ordered = self._sorted_buckets.get((field, str(value)))
+                if ordered is not None:
+                    insort(ordered, appointment_id)
+        if occupies_slot(record):
+            self._slots.setdefault(str(record["doctor_id"]), SlotIndex()).add(
+                record["start_at"], record["end_at"], appointment_id
+            )
+
+    def _remove(self, appointment_id: str) -> dict | None:
+        record = self._records.pop(appointment_id, None)
+        if record is not None:
+            self._unindex(record)
+            self._counters.replace(record, None)
+            if self._order is not None:
+                del self._order[bisect_left(self._order, appointment_id)]
+        return record
+
+    def _unindex(self, record: dict):
+        appointment_id = record["appointment_id"]
+        for field in INDEXED_FIELDS:
+            value = record.get(field)
+            if value is None:
+                continue
+            bucket = self._indexes[field].get(str(value))
+            if bucket is not None and appointment_id in bucket:
+                del bucket[appointment_id]
+                ordered = self._sorted_buckets.get((field, str(value)))
+                if ordered is not None:
+                    del ordered[bisect_left(ordered, appointment_id)]
+                if not bucket:
+                    del self._indexes[field][str(value)]
+                    self._sorted_buckets.pop((field, str(value)), None)
+        if occupies_slot(record):
+            slots = self._slots.get(str(record["doctor_id"]))
+            if slots is not None:
+                slots.remove(record["start_at"], record["end_at"], appointment_id)
+
+    # ======================
+    # Reads
+    # ======================
+    def get(self, appointment_id: str) -> dict | None:
+        self.load()
+        record = self._records.get(appointment_id)
+        return dict(record) if record is not None else None
+
+    def get_many(self, appointment_ids: Iterable[str]) -> dict[str, dict]:
+        """appointment_id -> record for the ids that exist."""
+        self.load()
+        with self._lock:
+            return {i: dict(self._records[i]) for i in appointment_ids if i in self._records}
+
+    def all(self) -> list[dict]:
+        self.load()
+        with self._lock:
+            return [dict(r) for r in self._records.values()]
+
+    def find(self, **filters) -> list[dict]:
+        """Return appointments matching every given indexed field, e.g. find(doctor_id=..., status="pending")."""
+        self.load()
+        _check_filters(filters)
+        if not filters:
+            return self.all()
+
+        with self._lock:
+            buckets = [self._indexes[f].get(str(v), {}) for f, v in filters.items()]
+            smallest = min(buckets, key=len)
+            others = [b for b in buckets if b is not smallest]
+            return [
+                dict(self._records[appointment_id])
+                for appointment_id in smallest
+                if all(appointment_id in b for b in others)
+            ]
+
+    def page(self, limit: int, after: str | None = None, start_from: str | None = None,
+             start_before: str | None = None, **filters) -> list[dict]:
+        """Up to `limit` matching appointments in appointment_id order, starting after the `after` id.
+
+        start_from / start_before bound start_at (ISO strings); appointments
+        without a parsed slot are left out when either is given.
+        """
+        self.load()
+        _check_filters(filters)
+        with self._lock:
+            if filters:
+                keys = [(f, str(v)) for f, v in filters.items()]
+                smallest = min(keys, key=lambda key: len(self._indexes[key[0]].get(key[1], {})))
+                others = [self._indexes[f].get(v, {}) for f, v in keys if (f, v) != smallest]
+                ordered = self._sorted_bucket(*smallest)
+            else:
+                if self._order is None:
+                    self._order = sorted(self._records)
+                others = []
+                ordered = self._order
+            start = bisect_right(ordered, after) if after is not None else 0
+            candidates = (ordered[i] for i in range(start, len(ordered)))
+
+            result = []
+            for appointment_id in candidates:
+                if not all(appointment_id in b for b in others):
+                    continue
+                record = self._records[appointment_id]
+                if start_from is not None or start_before is not None:
+                    start_at = record.get("start_at")
+                    if start_at is None or (start_from is not None and start_at < start_from) \
+                            or (start_before is not None and start_at >= start_before):
+                        continue
+                result.append(dict(record))
+                if len(result) >= limit:
+                    break
+            return result
+
+    def _sorted_bucket(self, field: str, value: str) -> list[str]:
+        """The index bucket's ids in order, kept up to date by _put / _unindex once asked for."""
+        ordered = self._sorted_buckets.get((field, value))
+        if ordered is None:
+            bucket = self._indexes[field].get(value)
+            if bucket is None:
+                return []
+            ordered = self._sorted_buckets[(field, value)] = sorted(bucket)
+        return ordered
+
+    def find_conflicts(self, doctor_id: str, start_at: str, end_at: str, exclude_id: str | None = None) -> list[dict]:
+        """Active appointments of doctor_id overlapping [start_at, end_at), other than exclude_id."""
+        self.load()
+        with self._lock:
+            slots = self._slots.get(str(doctor_id))
+            if slots is None:
+                return []
+            return [
+                dict(self._records[appointment_id])
+                for appointment_id in slots.overlapping(start_at, end_at)
+                if appointment_id != exclude_id
+            ]
+
+    def count(self) -> int:
+        self.load()
+        return len(self._records)
+
+    def counters(self) -> AppointmentCounters:
+        """Copy of the stats counters (size independent of the number of appointments)."""
+        self.load()
+        with self._lock:
+            return self._counters.copy()
+
+    def rebuild_counters(self):
+        """Recount the stats counters from every record in memory."""
+        self.load()
+        with self._lock:
+            counters = AppointmentCounters()
+            for record in self._records.values():
+                counters.replace(None, record)
+            self._counters = counters
+
+    # ======================
+    # Writes
+    # ======================
+    def add(self, record: dict) -> dict:
+        with self._writing():
+            if record["appointment_id"] in self._records:
+                raise ValueError(f"Appointment {record['appointment_id']} already exists")
+            record = dict(record)
+            self._put(record)
+            self._append([{"op": "put", "record": record}])
+            return dict(record)
+
+    def add_if_free(self, record: dict) -> dict:
+        """add(), unless the record's slot overlaps another active appointment of its doctor (SlotTaken).
+
+        Checked under the write lock, after catching up on the other
+        processes' writes, so two workers can't both take the slot.
+        """
+        with self._writing():
+            self._check_free(record)
+            return self.add(record)
+
+    def update_if_free(self, appointment_id: str, **changes) -> dict | None:
+        """update(), checking the slot like add_if_free when the changes can move the appointment into one."""
+        with self._writing():
+            current = self._records.get(appointment_id)
+            if current is None:
+                return None
+            if SLOT_FIELDS & changes.keys():
+                self._check_free({**current, **changes})
+            return self.update(appointment_id, **changes)
+
+    def _check_free(self, record: dict):
+        if occupies_slot(record) and self.find_conflicts(
+            record["doctor_id"], record["start_at"], record["end_at"], exclude_id=record["appointment_id"]
+        ):
+            raise SlotTaken()
+
+    def update(self, appointment_id: str, **changes) -> dict | None:
+        """Apply field changes to one appointment; returns the updated record or None if it doesn't exist."""
+        with self._writing():
+            current = self._records.get(appointment_id)
+            if current is None:
+                return None
+            record = {**current, **changes}
+            self._put(record)
+            self._append([{"op": "put", "record": record}])
+            return dict(record)
+
+    def update_many(self, changes: dict[str, dict]) -> dict[str, dict | None]:
+        """update() for several appointments under one lock and one journal write.
+
+        Returns appointment_id -> updated record (None for ids that don't exist).
+        """
+        with self._writing():
+            results, entries = {}, []
+            for appointment_id, fields in changes.items():
+                current = self._records.get(appointment_id)
+                if current is None:
+                    results[appointment_id] = None
+                    continue
+                record = {**current, **fields}
+                self._put(record)
+                entries.append({"op": "put", "record": record})
+                results[appointment_id] = dict(record)
+            if entries:
+                self._append(entries)
+            return results
+
+    def delete(self, appointment_id: str) -> dict | None:
+        with self._writing():
+            record = self._remove(appointment_id)
+            if record is not None:
+                self._append([{"op": "del", "id": appointment_id}])
+            return record
+
+    def delete_where(self, **filters) -> int:
+        """Delete every appointment matching the indexed filters; returns how many were removed."""
+        with self._writing():
+            ids = [a["appointment_id"] for a in self.find(**filters)]
+            for appointment_id in ids:
+                self._remove(appointment_id)
+            if ids:
+                self._append({"op": "del", "id": appointment_id} for appointment_id in ids)
+            return len(ids)
+
+    def evict(self, predicate: Callable[[dict], bool], write: Callable[[list[dict]], None],
+              batch_size: int = 1000) -> int:
+        """Remove every appointment matching `predicate`, handing each batch to write() first.
+
+        write() runs under the write lock, so a batch can't change between
+        being written elsewhere and leaving the store; if it raises, the
+        batch stays. Compacts once at the end rather than every
+        COMPACT_EVERY deletions. Returns how many were removed.
+        """
+        self.load()
+        with self._lock:
+            candidates = [i for i, record in self._records.items() if predicate(record)]
+        removed = 0
+        for start in range(0, len(candidates), batch_size):
+            with self._writing():
+                batch = [
+                    dict(record) for i in candidates[start:start + batch_size]
+                    if (record := self._records.get(i)) is not None and predicate(record)
+                ]
+                if not batch:
+                    continue
+                write(batch)
+                for record in batch:
+                    self._remove(record["appointment_id"])
+                self._append(({"op": "del", "id": r["appointment_id"]} for r in batch), compact=False)
+                removed += len(batch)
+        if removed and self._journal_entries >= self.compact_every:
+            self.compact()
+        return removed
+
+
+@timed_methods("store", *STORE_METHODS)
+class SqlAppointmentStore:
+    """Same interface as AppointmentStore, backed by the indexed appointments table.
+
+    Writes commit through sql_counters, which counts what they changed.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, appointment_id: str) -> dict | None:
+        appointment = self.db.get(Appointment, appointment_id)
+        return appointment.to_dict() if appointment else None
+
+    def get_many(self, appointment_ids: Iterable[str]) -> dict[str, dict]:
+        query = select(Appointment).where(Appointment.appointment_id.in_(list(appointment_ids)))
+        return {a.appointment_id: a.to_dict() for a in self.db.scalars(query)}
+
+    def all(self) -> list[dict]:
+        return [a.to_dict() for a in self.db.scalars(select(Appointment).order_by(Appointment.created_at))]
+
+    def find(self, **filters) -> list[dict]:
+        _check_filters(filters)
+        query = select(Appointment).filter_by(**filters).order_by(Appointment.created_at)
+        return [a.to_dict() for a in self.db.scalars(query)]
+
+    def page(self, limit: int, after: str | None = None, start_from: str | None = None,
+             start_before: str | None = None, **filters) -> list[dict]:
+        _check_filters(filters)
+        query = select(Appointment).filter_by(**filters)
+        if after is not None:
+            query = query.where(Appointment.appointment_id > after)
+        if start_from is not None:
+            query = query.where(Appointment.start_at >= start_from)
+        if start_before is not None:
+            query = query.where(Appointment.start_at < start_before)
+        query = query.order_by(Appointment.appointment_id).limit(limit)
+        return [a.to_dict() for a in self.db.scalars(query)]
+
+    def find_conflicts(self, doctor_id: str, start_at: str, end_at: str, exclude_id: str | None = None) -> list[dict]:
+        query = select(Appointment).where(
+            Appointment.doctor_id == str(doctor_id),
+            Appointment.status.in_(ACTIVE_STATUSES),
+            Appointment.start_at < end_at,
+            Appointment.end_at > start_at,
+        )
+        if exclude_id is not None:
+            query = query.where(Appointment.appointment_id != exclude_id)
+        return [a.to_dict() for a in self.db.scalars(query)]
+
+    def count(self) -> int:
+        return self.db.query(Appointment).count()
+
+    def counters(self) -> AppointmentCounters:
+        return sql_counters.current()
+
+    def rebuild_counters(self):
+        sql_counters.rebuild()
+
+    def add(self, record: dict) -> dict:
+        appointment = Appointment(**Appointment.normalize(record))
+        self.db.add(appointment)
+        sql_counters.commit(self.db, lambda: [(None, appointment.to_dict())])
+        return appointment.to_dict()
+
+    def add_if_free(self, record: dict) -> dict:
+        """add(), unless the slot is taken (SlotTaken); see _check_free for how it holds across processes."""
+        appointment = Appointment(**Appointment.normalize(record))
+        self._lock_doctor(appointment.doctor_id)
+        self.db.add(appointment)
+        self._check_free(appointment)
+        sql_counters.commit(self.db, lambda: [(None, appointment.to_dict())])
+        return appointment.to_dict()
+
+    def update_if_free(self, appointment_id: str, **changes) -> dict | None:
+        # Row locked first (Postgres), so it can't change or move to another doctor before the check
+        appointment = self.db.get(Appointment, appointment_id, with_for_update=True, populate_existing=True)
+        if appointment is None:
+            return None
+        old = appointment.to_dict()
+        for key, value in Appointment.normalize(changes).items():
+            setattr(appointment, key, value)
+        if SLOT_FIELDS & changes.keys():
+            self._lock_doctor(appointment.doctor_id)
+            self._check_free(appointment)
+        sql_counters.commit(self.db, lambda: [(old, appointment.to_dict())])
+        return appointment.to_dict()
+
+    def _lock_doctor(self, doctor_id: str | None):
+        """On Postgres, hold the doctor's slot checks until this transaction ends (advisory lock)."""
+        if doctor_id is not None and self.db.get_bind().dialect.name == "postgresql":
+            self.db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"doctor:{doctor_id}"})
+
+    def _check_free(self, appointment: Appointment):
+        """Raise SlotTaken (rolling back) if the pending write overlaps another active appointment.
+
+        Flushed first: on Postgres the doctor's advisory lock keeps other
+        writers out until commit; on SQLite the flush takes the database
+        write lock, so whatever committed before it is seen by the check.
+        """
+        self.db.flush()
+        record = appointment.to_dict()
+        if occupies_slot(record) and self.find_conflicts(
+            record["doctor_id"], record["start_at"], record["end_at"], exclude_id=record["appointment_id"]
+        ):
+            self.db.rollback()
+            raise SlotTaken()
+
+    def update(self, appointment_id: str, **changes) -> dict | None:
+        appointment = self.db.get(Appointment, appointment_id)
+        if appointment is None:
+            return None
+        old = appointment.to_dict()
+        for key, value in Appointment.normalize(changes).items():
+            setattr(appointment, key, value)
+        sql_counters.commit(self.db, lambda: [(old, appointment.to_dict())])
+        return appointment.to_dict()
+
+    def update_many(self, changes: dict[str, dict]) -> dict[str, dict | None]:
+        """All changes in one SELECT ... IN and one commit."""
+        rows = {
+            a.appointment_id: a
+            for a in self.db.scalars(select(Appointment).where(Appointment.appointment_id.in_(list(changes))))
+        }
+        old = {appointment_id: row.to_dict() for appointment_id, row in rows.items()}
+        for appointment_id, fields in changes.items():
+            if appointment_id in rows:
+                for key, value in Appointment.normalize(fields).items():
+                    setattr(rows[appointment_id], key, value)
+        sql_counters.commit(self.db, lambda: [(old[i], rows[i].to_dict()) for i in old])
+        return {
+            appointment_id: rows[appointment_id].to_dict() if appointment_id in rows else None
+            for appointment_id in changes
+        }
+
+    def delete(self, appointment_id: str) -> dict | None:
+        appointment = self.db.get(Appointment, appointment_id)
+        if appointment is None:
+            return None
+        record = appointment.to_dict()
+        self.db.delete(appointment)
+        sql_counters.commit(self.db, lambda: [(record, None)])
+        return record
+
+    def delete_where(self, **filters) -> int:
+        deleted = self.db.execute(
+            delete(Appointment).filter_by(**filters).returning(Appointment.status, Appointment.doctor_id, Appointment.start_at)
+        ).mappings().all()
+        sql_counters.commit(self.db, lambda: [(dict(row), None) for row in deleted])
+        return len(deleted)
+
+
+appointment_store = AppointmentStore(Path(settings.APPOINTMENT_PATH) if settings.APPOINTMENT_PATH else APPOINTMENT_FILE)
+# Other workers' writes (JSON backend only; the sql backend keeps nothing in memory)
+change_bus.subscribe("appointments", lambda data: appointment_store.catch_up(), appointment_store.catch_up)
+
+
+# Dependency
+def get_appointment_store(db: Session = Depends(get_db)) -> AppointmentStore | SqlAppointmentStore:
+    if settings.APPOINTMENT_BACKEND == "sql":
+        return SqlAppointmentStore(db)
+    try:
+        with phase("store"):
+            appointment_store.load()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return appointment_store
@@ -0,0 +1,76 @@
+"""Bulk-load an existing appointments.json, and its archive, into the appointments table.
+
+Usage (from backend/):
+    python -m app.db.import_appointments [path/to/appointments.json] [--archive-dir DIR] [--batch-size 1000]
+
+Rows whose appointment_id is already in the table are skipped, so the
+import can be re-run safely.
+"""
+import argparse
+from pathlib import Path
+
+from sqlalchemy import insert, select
+
+from app.core.config import settings
+from app.db.appointment_archive import AppointmentArchive
+from app.db.appointment_store import APPOINTMENT_FILE, AppointmentStore
+from app.db.session import SessionLocal
+from app.models.appointment import Appointment
+
+BATCH_SIZE = 1000
+
+
+def read_appointments(path: Path, archive_dir: Path | None = None) -> list[dict]:
+    """The hot appointments plus the archived ones (default archive: archive/ next to `path`)."""
+    # Goes through the store so any un-compacted journal entries are included
+    hot = AppointmentStore(path).all()
+    hot_ids = {a["appointment_id"] for a in hot}
+    archive = AppointmentArchive(archive_dir or path.parent / "archive")
+    # A copy still in the hot store (archived, then a crash before it left) wins, as in history queries
+    return hot + [a for a in archive.all() if a["appointment_id"] not in hot_ids]
+
+
+def import_appointments(appointments: list[dict], batch_size: int = BATCH_SIZE) -> tuple[int, int]:
+    """Insert appointments in batches of batch_size; returns (inserted, skipped)."""
+    inserted = skipped = 0
+    columns = Appointment.columns()
+    db = SessionLocal()
+    try:
+        for start in range(0, len(appointments), batch_size):
+            rows = []
+            for a in appointments[start:start + batch_size]:
+                row = dict.fromkeys(columns)  # same keys on every row so the batch is one executemany
+                row.update(Appointment.normalize(a))
+                row["status"] = row["status"] or "pending"
+                rows.append(row)
+
+            ids = [row["appointment_id"] for row in rows]
+            existing = set(db.scalars(select(Appointment.appointment_id).where(Appointment.appointment_id.in_(ids))))
+            new_rows = {row["appointment_id"]: row for row in rows if row["appointment_id"] not in existing}
+
+            if new_rows:
+                # executemany with one statement per batch
+                db.execute(insert(Appointment), list(new_rows.values()))
+                db.commit()
+            inserted += len(new_rows)
+            skipped += len(rows) - len(new_rows)
+    finally:
+        db.close()
+    return inserted, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import appointments.json into the appointments table")
+    parser.add_argument("path", nargs="?", default=str(APPOINTMENT_FILE))
+    parser.add_argument("--archive-dir", default=settings.APPOINTMENT_ARCHIVE_DIR,
+                        help="Monthly archive segments; defaults to archive/ next to the snapshot")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    appointments = read_appointments(Path(args.path), Path(args.archive_dir) if args.archive_dir else None)
+    inserted, skipped = import_appointments(appointments, args.batch_size)
+    print(f"Imported {inserted} appointments ({skipped} already present)")
+
+
+if __name__ == "__main__":
+    main()
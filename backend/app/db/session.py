@@ -1,13 +1,118 @@
+import threading
+from contextlib import AsyncExitStack, ExitStack
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
+from app.core.metrics import db_metrics, instrumented_pool
+
+# Async drivers for the sync URLs we get in DATABASE_URL
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+def async_database_url(url: str) -> str:
+    """postgresql+psycopg2://... -> postgresql+asyncpg://..., sqlite://... -> sqlite+aiosqlite://..."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return url.render_as_string(hide_password=False)
+
+def database_url() -> str:
+    if not settings.DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is not set")
+    return settings.DATABASE_URL
+
+def pool_options() -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "echo": settings.DB_ECHO,
+    }
+
+class Database:
+    """The sync and async engines, created on first use.
+
+    Importing this module connects to nothing. The app lifespan calls
+    warm() before taking traffic and dispose() on shutdown; scripts and
+    tests get the engines the first time they open a session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine: Engine | None = None
+        self._async_engine: AsyncEngine | None = None
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = create_engine(database_url(), poolclass=instrumented_pool(QueuePool), **pool_options())
+                    db_metrics.instrument(engine)
+                    self._engine = engine
+        return self._engine
+
+    @property
+    def async_engine(self) -> AsyncEngine:
+        """Async engine for async def routes, so DB round trips don't block the event loop."""
+        if self._async_engine is None:
+            with self._lock:
+                if self._async_engine is None:
+                    engine = create_async_engine(
+                        settings.ASYNC_DATABASE_URL or async_database_url(database_url()),
+                        poolclass=instrumented_pool(AsyncAdaptedQueuePool),
+                        **pool_options()
+                    )
+                    db_metrics.instrument(engine.sync_engine)
+                    self._async_engine = engine
+        return self._async_engine
+
+    def warm(self, connections: int):
+        """Open `connections` pooled connections now (held together, so the pool keeps them all)."""
+        with ExitStack() as stack:
+            for _ in range(connections):
+                stack.enter_context(self.engine.connect())
+
+    async def warm_async(self, connections: int):
+        async with AsyncExitStack() as stack:
+            for _ in range(connections):
+                await stack.enter_async_context(self.async_engine.connect())
 
-# SQLAlchemy engine
-engine = create_engine(settings.DATABASE_URL, echo=True)  # echo=True optional for logging SQL
+    async def dispose(self):
+        """Close pooled connections (shutdown)."""
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+        if self._engine is not None:
+            self._engine.dispose()
 
-# Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+database = Database()
+
+
+class EngineSession(Session):
+    """Session bound to database.engine unless given another bind."""
+
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else database.engine, **kwargs)
+
+
+class AsyncEngineSession(AsyncSession):
+    """AsyncSession bound to database.async_engine unless given another bind."""
+
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else database.async_engine, **kwargs)
+
+
+# Session factories
+SessionLocal = sessionmaker(class_=EngineSession, autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(class_=AsyncEngineSession, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -19,3 +124,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
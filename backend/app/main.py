@@ -1,8 +1,76 @@
-from fastapi import FastAPI
+import time
+
+# Measured from here: how long importing app.main (and the app it builds) takes
+IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import admin,doctor,appointment,patient  # Import your admin router (and any other routers)
+from app.api import admin,auth,doctor,appointment,patient  # Import your admin router (and any other routers)
+from app.core.admission import admission
+from app.core.change_bus import change_bus, create_transport
+from app.core.config import settings
+from app.core.idempotency import idempotency_cache
+from app.core.metrics import db_metrics
+from app.core.security import revocations, signing_key
+from app.core.timing import request_profiler, request_timings, server_timing
+from app.db.appointment_archive import archiver
+from app.db.appointment_store import appointment_store
+from app.db.session import database
+from app.services.doctor_directory import doctor_directory
+from app.services.doctor_search import doctor_search
+from app.services.events import event_hub
+from app.services.notifications import digest_flusher
+from app.services.outbox import outbox_snapshot, outbox_worker
+
+# Cold start breakdown for /metrics, in seconds
+startup_timings: dict[str, float] = {}
+
+
+async def warm_up():
+    """Open pooled connections and load in-memory indexes before the worker takes traffic,
+    so the first requests don't pay for them. Failures abort startup."""
+    steps = [
+        ("db_pool", lambda: run_in_threadpool(database.warm, settings.DB_POOL_WARM)),
+        ("async_db_pool", lambda: database.warm_async(settings.DB_POOL_WARM)),
+        ("doctor_search", lambda: run_in_threadpool(doctor_search.ensure_built)),
+        ("revocations", lambda: run_in_threadpool(revocations.reload)),
+    ]
+    if settings.APPOINTMENT_BACKEND != "sql":
+        steps.append(("appointment_store", lambda: run_in_threadpool(appointment_store.load)))
+    for name, step in steps:
+        started = time.perf_counter()
+        await step()
+        startup_timings[name] = round(time.perf_counter() - started, 4)
+
 
-app = FastAPI(title="Healthcare Management System API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Don't take traffic with a SECRET_KEY anyone could sign tokens with
+    signing_key()
+    # Listen for other workers' changes before loading anything they could change
+    transport = create_transport(change_bus.origin)
+    if transport is not None:
+        change_bus.start(transport)
+    await warm_up()
+    # Deliver queued emails (including any left over from a previous run)
+    outbox_worker.start()
+    digest_flusher.start()
+    archiver.start()
+    startup_timings["lifespan"] = round(time.perf_counter() - started, 4)
+    yield
+    event_hub.close_all()
+    await archiver.stop()
+    await digest_flusher.stop()
+    await outbox_worker.stop()
+    change_bus.stop()
+    appointment_store.close()
+    await database.dispose()
+
+
+app = FastAPI(title="Healthcare Management System API", lifespan=lifespan)
 
 # ✅ CORS Setup: Allow React frontend to talk to FastAPI backend
 origins = [
@@ -16,13 +84,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],        # Allow all HTTP methods (GET, POST, PUT, DELETE)
     allow_headers=["*"],        # Allow all headers
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing", "Retry-After", "Idempotent-Replayed"],  # pagination cursor; doctor list validator; phase timings; when to retry a 429/503; replayed by Idempotency-Key
 )
 
+# Per-route query counts, latency histograms and phase breakdown for /metrics,
+# the Server-Timing header, and the admin-enabled request profiler
+@app.middleware("http")
+async def track_request_timing(request: Request, call_next):
+    sampled = request_profiler.should_sample()
+    started = time.perf_counter()
+    try:
+        with db_metrics.track_request() as queries, request_timings.track(profile=sampled) as timing:
+            response = await call_next(request)
+    finally:
+        elapsed = time.perf_counter() - started
+        timing.phases["db"] = queries.seconds
+        route = request.scope.get("route")
+        label = f"{request.method} {route.path}" if route else "unmatched"
+        if sampled:
+            request_profiler.collect(label, request.url.path, timing, elapsed)
+    db_metrics.record_request(label, queries, elapsed)
+    request_timings.record(label, timing, elapsed)
+    if settings.SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing(timing, queries.count, elapsed)
+    return response
+
 # ✅ Include your routers
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 app.include_router(doctor.router, prefix="/doctor", tags=["Doctor"])
 app.include_router(patient.router, prefix="/patient", tags=["Patient"])
 app.include_router( appointment.router,prefix="/appointments", tags=["Appointments"] )
+app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 
 # Root route
 @app.get("/")
@@ -40,3 +132,24 @@ def list_routes():
             "methods": list(route.methods)
         })
     return {"routes": route_list}
+
+# Connection pool, per-route query and latency, email delivery, cache, event stream,
+# cross-worker sync and startup metrics
+@app.get("/metrics")
+def metrics():
+    return {
+        "startup": startup_timings,
+        **db_metrics.snapshot(),
+        "timings": request_timings.snapshot(),
+        "outbox": {**outbox_snapshot(), "digest_last_error": digest_flusher.last_error},
+        "doctor_directory": doctor_directory.snapshot(),
+        "doctor_search": doctor_search.snapshot(),
+        "events": event_hub.snapshot(),
+        "change_bus": change_bus.snapshot(),
+        "appointment_store": appointment_store.snapshot(),
+        "appointment_archive": archiver.snapshot(),
+        "admission": admission.snapshot(),
+        "idempotency": idempotency_cache.snapshot(),
+    }
+
+startup_timings["import"] = round(time.perf_counter() - IMPORT_STARTED, 4)
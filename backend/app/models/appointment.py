@@ -0,0 +1,54 @@
+from sqlalchemy import Column, String, Index
+from app.db.session import Base
+
+class Appointment(Base):
+    __tablename__ = "appointments"
+
+    appointment_id = Column(String, primary_key=True)
+    doctor_id = Column(String, nullable=True)
+    doctor_name = Column(String, nullable=True)
+    doctor_email = Column(String, nullable=True)
+    specialization = Column(String, nullable=True)
+    patient_username = Column(String, nullable=True)
+    patient_full_name = Column(String, nullable=True)
+    patient_email = Column(String, nullable=True)
+    time = Column(String, nullable=True)  # same free-form string the API accepts
+    start_at = Column(String, nullable=True)  # parsed slot, ISO UTC (see services/scheduling.py)
+    end_at = Column(String, nullable=True)
+    date = Column(String, nullable=True)
+    diagnosis = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending")
+    created_at = Column(String, nullable=True)  # ISO timestamps, as in appointments.json
+    updated_at = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_appointments_doctor_id_status", "doctor_id", "status"),
+        Index("ix_appointments_patient_username_time", "patient_username", "time"),
+        Index("ix_appointments_status", "status"),
+        Index("ix_appointments_doctor_id_start_at", "doctor_id", "start_at"),
+    )
+
+    # Keys used by older appointments.json records -> column names
+    LEGACY_KEYS = {"doctor": "doctor_name", "patient": "patient_full_name"}
+
+    @classmethod
+    def columns(cls) -> list[str]:
+        return [c.name for c in cls.__table__.columns]
+
+    @classmethod
+    def normalize(cls, record: dict) -> dict:
+        """Map an appointment dict (possibly a legacy one) onto the table's columns."""
+        columns = set(cls.columns())
+        row = {}
+        for key, value in record.items():
+            key = cls.LEGACY_KEYS.get(key, key)
+            if key in columns and row.get(key) is None:
+                row[key] = value
+        return row
+
+    def to_dict(self) -> dict:
+        return {
+            name: getattr(self, name)
+            for name in self.columns()
+            if getattr(self, name) is not None
+        }
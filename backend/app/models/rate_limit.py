@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Float, String, Index
+from app.db.session import Base
+
+class RateLimit(Base):
+    """One token bucket of the "database" rate limit backend (see core/admission.py)."""
+    __tablename__ = "rate_limits"
+
+    key = Column(String, primary_key=True)  # "patient:<username>" or "ip:<address>"
+    # When the bucket would next be full (epoch seconds); rows already full can be purged
+    full_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_rate_limits_full_at", "full_at"),
+    )
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Float, String, Index
+from app.db.session import Base
+
+class RevokedToken(Base):
+    """A token revoked before it expires (logout, or a refresh token already swapped), see core/security.py."""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    # The token's own expiry (epoch seconds); the row can be purged after it
+    expires_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_revoked_tokens_expires_at", "expires_at"),
+    )
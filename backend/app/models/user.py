@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Enum
+from sqlalchemy import Column, Float, String, Enum
 from sqlalchemy.dialects.postgresql import UUID
 from app.db.session import Base
 
@@ -19,5 +19,8 @@ class User(Base):
     full_name = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False, index=True)
     username = Column(String, unique=True, nullable=False)
-    password_plain = Column(String, nullable=False)  # store hashed password in real app
-    specialization = Column(String, nullable=True)
\ No newline at end of file
+    password_plain = Column(String, nullable=True)  # legacy; cleared once password_hash is set
+    password_hash = Column(String, nullable=True)  # argon2, see app/core/passwords.py
+    specialization = Column(String, nullable=True)
+    notification_mode = Column(String, nullable=False, default="immediate", server_default="immediate")  # or "digest"
+    tokens_valid_after = Column(Float, nullable=True)  # epoch seconds; tokens issued earlier are revoked (password change)
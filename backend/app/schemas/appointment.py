@@ -0,0 +1,60 @@
+# Save in: backend/app/schemas/appointment.py
+from pydantic import BaseModel, ConfigDict
+
+class AppointmentOut(BaseModel):
+    """An appointment record as stored (see app/models/appointment.py).
+
+    Everything but the id is optional: older JSON records lack newer
+    fields and ?fields= projections return a subset (routes use
+    response_model_exclude_unset so missing fields stay missing). Legacy
+    keys such as "doctor"/"patient" are passed through untouched.
+    """
+    model_config = ConfigDict(extra="allow")
+
+    appointment_id: str
+    doctor_id: str | None = None
+    doctor_name: str | None = None
+    doctor_email: str | None = None
+    specialization: str | None = None
+    patient_username: str | None = None
+    patient_full_name: str | None = None
+    patient_email: str | None = None
+    time: str | None = None
+    start_at: str | None = None
+    end_at: str | None = None
+    date: str | None = None
+    diagnosis: str | None = None
+    status: str | None = None
+    created_at: str | None = None
+    updated_at: str | None = None
+
+class AppointmentPage(BaseModel):
+    appointments: list[AppointmentOut]
+    next_cursor: str | None = None
+
+class PendingAppointments(BaseModel):
+    pending_appointments: list[AppointmentOut]
+
+class BookingResponse(BaseModel):
+    message: str
+    appointment_id: str
+
+class DecisionItem(BaseModel):
+    appointment_id: str
+    decision: str  # "accepted" or "rejected"
+
+class BatchDecisionRequest(BaseModel):
+    decisions: list[DecisionItem]
+    # Apply nothing if any item is invalid (unknown id, bad decision, duplicate)
+    all_or_nothing: bool = False
+
+class DecisionResult(BaseModel):
+    appointment_id: str
+    decision: str
+    ok: bool
+    error: str | None = None
+
+class BatchDecisionResponse(BaseModel):
+    applied: int
+    failed: int
+    results: list[DecisionResult]
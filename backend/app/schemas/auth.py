@@ -0,0 +1,30 @@
+# Save in: backend/app/schemas/auth.py
+from pydantic import BaseModel
+
+class TokenUser(BaseModel):
+    """The authenticated user as carried in an access token."""
+    id: str
+    username: str
+    full_name: str | None = None
+    email: str | None = None
+    role: str
+
+    @classmethod
+    def from_user(cls, user) -> "TokenUser":
+        return cls(id=str(user.id), username=user.username, full_name=user.full_name, email=user.email, role=user.role)
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "TokenUser":
+        return cls(
+            id=payload["sub"],
+            username=payload["username"],
+            full_name=payload.get("name"),
+            email=payload.get("email"),
+            role=payload["role"],
+        )
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: str | None = None
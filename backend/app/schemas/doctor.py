@@ -0,0 +1,30 @@
+# Save in: backend/app/schemas/doctor.py
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+class DoctorOut(BaseModel):
+    """A row of the admin doctor list."""
+    id: str
+    name: str
+    email: str
+    specialization: str | None = None
+
+class DoctorProfile(BaseModel):
+    id: str
+    name: str | None = None
+    email: str | None = None
+    username: str
+    notification_mode: str
+
+class DoctorSearchHit(BaseModel):
+    id: str
+    name: str
+    specialization: str | None = None
+
+class DoctorSearchResult(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    doctors: List[DoctorSearchHit]
+    facets: Dict[str, int]  # specialization -> doctors matching the name query
@@ -0,0 +1,238 @@
+import threading
+from typing import Callable
+
+from sqlalchemy import func, select, text
+
+from app.core.change_bus import change_bus
+from app.db.session import SessionLocal
+from app.models.appointment import Appointment
+
+
+def stats_key(record: dict) -> tuple[str, str | None, str | None]:
+    """(status, doctor_id, day of start_at) an appointment is counted under."""
+    doctor_id = record.get("doctor_id")
+    start_at = record.get("start_at")
+    return (
+        record.get("status") or "pending",
+        str(doctor_id) if doctor_id is not None else None,
+        start_at[:10] if start_at else None,
+    )
+
+
+def count_changes(changes) -> dict[tuple, int]:
+    """Net count changes for (old, new) record pairs; None stands for added / deleted."""
+    deltas: dict[tuple, int] = {}
+    for old, new in changes:
+        if old is not None:
+            key = stats_key(old)
+            deltas[key] = deltas.get(key, 0) - 1
+        if new is not None:
+            key = stats_key(new)
+            deltas[key] = deltas.get(key, 0) + 1
+    return {key: n for key, n in deltas.items() if n}
+
+
+def _bump(counts: dict[str, int], key: str, n: int):
+    value = counts.get(key, 0) + n
+    if value:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+class AppointmentCounters:
+    """Appointment counts by status, by doctor and by day, updated one change at a time.
+
+    Their size depends on how many doctors, days and statuses there are,
+    not on how many appointments, so reading them costs the same at any
+    volume. Appointments without a doctor or a parsed slot count in the
+    totals only.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.by_status: dict[str, int] = {}
+        self.by_doctor: dict[str, dict[str, int]] = {}  # doctor_id -> status -> count
+        self.by_day: dict[str, dict[str, int]] = {}  # YYYY-MM-DD -> status -> count
+
+    def change(self, key: tuple[str, str | None, str | None], n: int):
+        status, doctor_id, day = key
+        self.total += n
+        _bump(self.by_status, status, n)
+        for groups, group in ((self.by_doctor, doctor_id), (self.by_day, day)):
+            if group is None:
+                continue
+            counts = groups.setdefault(group, {})
+            _bump(counts, status, n)
+            if not counts:
+                del groups[group]
+
+    def replace(self, old: dict | None, new: dict | None):
+        """Count `new` instead of `old` (either may be None)."""
+        self.apply(count_changes([(old, new)]))
+
+    def apply(self, deltas: dict[tuple, int]):
+        for key, n in deltas.items():
+            self.change(key, n)
+
+    def absorb(self, counts: dict, sign: int = 1):
+        """Add (or with sign=-1 take away) counts in the to_dict() form."""
+        self.total += sign * counts["total"]
+        for status, n in counts["by_status"].items():
+            _bump(self.by_status, status, sign * n)
+        for name in ("by_doctor", "by_day"):
+            groups = getattr(self, name)
+            for group, statuses in counts[name].items():
+                target = groups.setdefault(group, {})
+                for status, n in statuses.items():
+                    _bump(target, status, sign * n)
+                if not target:
+                    del groups[group]
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "by_status": dict(self.by_status),
+            "by_doctor": {k: dict(v) for k, v in self.by_doctor.items()},
+            "by_day": {k: dict(v) for k, v in self.by_day.items()},
+        }
+
+    def copy(self) -> "AppointmentCounters":
+        counters = AppointmentCounters()
+        counters.absorb(self.to_dict())
+        return counters
+
+    def report(self, day_from: str | None = None, day_to: str | None = None) -> dict:
+        """Stats API body; day_from / day_to (inclusive YYYY-MM-DD) limit by_day."""
+        report = self.to_dict()
+        report["by_day"] = {
+            day: counts for day, counts in sorted(report["by_day"].items())
+            if (day_from is None or day >= day_from) and (day_to is None or day <= day_to)
+        }
+        return report
+
+
+class TransactionSnapshot:
+    """Which Postgres transactions a query could see (txid_current_snapshot() text)."""
+
+    def __init__(self, value: str):
+        xmin, xmax, in_progress = value.split(":")
+        self.xmin = int(xmin)
+        self.xmax = int(xmax)
+        self.in_progress = {int(xid) for xid in in_progress.split(",") if xid}
+
+    def includes(self, xid: int) -> bool:
+        return xid < self.xmin or (xid < self.xmax and xid not in self.in_progress)
+
+
+def transaction_id(db) -> int | None:
+    """Postgres id of the session's open write transaction; None on other databases."""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    return db.execute(text("SELECT txid_current()")).scalar()
+
+
+class SqlAppointmentCounters:
+    """AppointmentCounters for the sql backend, one copy per worker process.
+
+    Counted with a GROUP BY on first use, then kept in step by the
+    SqlAppointmentStore writes here and, through the change bus, in the
+    other processes; dropped and recounted when bus messages may have
+    been missed.
+
+    A write committed just before a recount must not be counted by both
+    the GROUP BY and its delta. On Postgres each delta carries its
+    transaction id and is skipped when the recount's snapshot already
+    saw that transaction, which holds across processes. Elsewhere writes
+    commit under the lock the recount holds, which covers this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._counters: AppointmentCounters | None = None
+        self._snapshot: TransactionSnapshot | None = None  # what the GROUP BY saw (Postgres)
+        self.rebuilds = 0
+        self.skipped = 0
+
+    def ensure_built(self):
+        if self._counters is not None:
+            return
+        with self._lock:
+            if self._counters is not None:
+                return
+            counters = AppointmentCounters()
+            snapshot = None
+            db = SessionLocal()
+            try:
+                if db.get_bind().dialect.name == "postgresql":
+                    # One snapshot for both statements, so it says exactly which writes the counts include
+                    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+                    snapshot = TransactionSnapshot(db.execute(text("SELECT txid_current_snapshot()::text")).scalar())
+                day = func.substr(Appointment.start_at, 1, 10)
+                query = select(Appointment.status, Appointment.doctor_id, day, func.count()).group_by(
+                    Appointment.status, Appointment.doctor_id, day
+                )
+                for status, doctor_id, day_value, n in db.execute(query):
+                    counters.change((status or "pending", doctor_id, day_value), n)
+            finally:
+                db.close()
+            self._counters = counters
+            self._snapshot = snapshot
+            self.rebuilds += 1
+
+    def commit(self, db, changes: Callable[[], list[tuple[dict | None, dict | None]]]):
+        """Commit a SqlAppointmentStore write and count it; `changes()` gives its (old, new) record pairs."""
+        xid = transaction_id(db)
+        if xid is not None:
+            db.commit()
+            self.record(changes(), xid)
+            return
+        with self._lock:
+            db.commit()
+            self.record(changes())
+
+    def record(self, changes: list[tuple[dict | None, dict | None]], xid: int | None = None):
+        """Count committed writes, given as (old, new) record pairs."""
+        deltas = count_changes(changes)
+        if deltas:
+            self.apply(deltas, xid)
+            change_bus.publish("appointment_stats", {"deltas": [[*key, n] for key, n in deltas.items()], "xid": xid})
+
+    def apply(self, deltas: dict[tuple, int], xid: int | None = None):
+        with self._lock:
+            if self._counters is None:
+                return  # picked up by the initial count
+            if xid is not None and self._snapshot is not None and self._snapshot.includes(xid):
+                self.skipped += 1  # already in the GROUP BY
+                return
+            self._counters.apply(deltas)
+
+    def apply_message(self, message: dict):
+        """A change published by another worker process."""
+        if message.get("rebuild"):
+            self.reset()
+        else:
+            self.apply({tuple(entry[:3]): entry[3] for entry in message["deltas"]}, message.get("xid"))
+
+    def reset(self):
+        """Forget the counts; recounted from the table on the next read."""
+        with self._lock:
+            self._counters = None
+            self._snapshot = None
+
+    def rebuild(self):
+        """Recount here now, and in the other processes on their next read."""
+        with self._lock:
+            self._counters = None
+            self._snapshot = None
+            self.ensure_built()
+        change_bus.publish("appointment_stats", {"rebuild": True})
+
+    def current(self) -> AppointmentCounters:
+        with self._lock:
+            self.ensure_built()
+            return self._counters.copy()
+
+
+sql_counters = SqlAppointmentCounters()
+change_bus.subscribe("appointment_stats", sql_counters.apply_message, sql_counters.reset)
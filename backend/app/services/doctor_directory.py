@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+
+from app.core.change_bus import change_bus
+from app.core.config import settings
+
+
+class CachedView(NamedTuple):
+    version: int
+    expires: float
+    body: bytes  # rendered JSON, served as-is
+    etag: str
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """True when an If-None-Match header names `etag` (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+class DoctorDirectory:
+    """In-process cache of rendered doctor listings.
+
+    Each entry (one per view key, e.g. the admin list) holds the JSON
+    body and a content-hash ETag. Entries expire after
+    DOCTOR_CACHE_TTL_SECONDS and the least recently used are dropped past
+    DOCTOR_CACHE_MAX_ENTRIES. Every write to doctors calls invalidate(),
+    which bumps the version; a load that raced with a write is not
+    cached, so a stale list never outlives the write that changed it.
+    Invalidations reach the other worker processes over the change bus.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._entries: OrderedDict[str, CachedView] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def invalidate(self, broadcast: bool = True):
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            self._entries.clear()
+        if broadcast:
+            change_bus.publish("doctor_directory")
+
+    def _lookup(self, key: str) -> CachedView | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != self.version or entry.expires <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def get(self, key: str, render: Callable[[], bytes]) -> CachedView:
+        """Cached view for `key`, calling render() (which may hit the database) on a miss."""
+        entry = self._lookup(key)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        # One loader at a time, so a burst of misses costs one query
+        with self._load_lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+                return entry
+            version = self.version
+            body = render()
+            entry = CachedView(version, time.monotonic() + self.ttl, body,
+                               f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+            with self._lock:
+                self.misses += 1
+                if version == self.version:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "invalidations": self.invalidations,
+            }
+
+
+doctor_directory = DoctorDirectory(settings.DOCTOR_CACHE_TTL_SECONDS, settings.DOCTOR_CACHE_MAX_ENTRIES)
+change_bus.subscribe(
+    "doctor_directory",
+    lambda data: doctor_directory.invalidate(broadcast=False),
+    lambda: doctor_directory.invalidate(broadcast=False),
+)
@@ -0,0 +1,215 @@
+import csv
+import io
+import json
+import uuid
+from typing import IO, Iterator
+
+from pydantic import BaseModel, EmailStr, ValidationError, model_validator
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.passwords import credential_verifier, pwd_context
+from app.models.user import User
+from app.services.doctor_search import doctor_search
+
+BATCH_SIZE = 500
+
+# Per-row errors reported back; the counts stay exact past this
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# Column order for COPY ... FROM STDIN
+COPY_COLUMNS = ("id", "role", "username", "full_name", "email", "password_hash", "specialization", "notification_mode")
+
+
+class DoctorImportRow(BaseModel):
+    """One doctor in an import file: a plain `password` (hashed here) or an existing `password_hash`."""
+    username: str
+    full_name: str
+    email: EmailStr
+    specialization: str
+    password: str | None = None
+    password_hash: str | None = None
+
+    @model_validator(mode="after")
+    def check_credentials(self):
+        if not self.password and not self.password_hash:
+            raise ValueError("password or password_hash is required")
+        if self.password_hash and not pwd_context.identify(self.password_hash):
+            raise ValueError("password_hash is not a supported hash")
+        return self
+
+
+def read_rows(upload: IO[bytes], fmt: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """Yield (row_number, raw_dict, parse_error) one row at a time."""
+    lines = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for number, row in enumerate(reader, start=1):
+            if None in row:
+                yield number, None, "too many columns"
+                continue
+            yield number, {k.strip(): (v.strip() if v else None) for k, v in row.items() if k}, None
+        return
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f"invalid JSON: {e.msg}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "expected a JSON object"
+            continue
+        yield number, row, None
+
+
+def _validation_message(error: ValidationError) -> str:
+    parts = []
+    for e in error.errors():
+        field = ".".join(str(p) for p in e["loc"])
+        parts.append(f"{field}: {e['msg']}" if field else e["msg"])
+    return "; ".join(parts)
+
+
+class DoctorImport:
+    """Streaming validation + batched load of an uploaded doctor file."""
+
+    def __init__(self, db: Session, batch_size: int = BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+        self._seen_usernames: set[str] = set()
+        self._seen_emails: set[str] = set()
+        dialect = db.get_bind().dialect
+        self.use_copy = dialect.name == "postgresql" and dialect.driver == "psycopg2"
+        # COPY goes through the raw DBAPI cursor, so its errors arrive unwrapped
+        self._integrity_errors = (IntegrityError, dialect.loaded_dbapi.IntegrityError)
+
+    def error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def run(self, upload: IO[bytes], fmt: str) -> dict:
+        batch: list[tuple[int, DoctorImportRow]] = []
+        for number, raw, parse_error in read_rows(upload, fmt):
+            self.rows += 1
+            if parse_error:
+                self.error(number, parse_error)
+                continue
+            try:
+                row = DoctorImportRow.model_validate(raw)
+            except ValidationError as e:
+                self.error(number, _validation_message(e))
+                continue
+            username, email = row.username, row.email.lower()
+            if username in self._seen_usernames or email in self._seen_emails:
+                self.error(number, "duplicate username or email earlier in the file")
+                continue
+            self._seen_usernames.add(username)
+            self._seen_emails.add(email)
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self._load(batch)
+                batch = []
+        if batch:
+            self._load(batch)
+        return {
+            "format": fmt,
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda e: e["row"]),
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+    # ======================
+    # Loading
+    # ======================
+    def _load(self, batch: list[tuple[int, DoctorImportRow]]):
+        usernames = [row.username for _, row in batch]
+        emails = [row.email for _, row in batch]
+        taken = set(self.db.scalars(select(User.username).where(User.username.in_(usernames))))
+        taken |= set(self.db.scalars(select(User.email).where(User.email.in_(emails))))
+
+        pending = []
+        for number, row in batch:
+            if row.username in taken or row.email in taken:
+                self.error(number, "username or email already exists")
+            else:
+                pending.append((number, row))
+        if not pending:
+            return
+
+        # Hashing is the slow part; run it on the password pool in parallel
+        plain = [row.password for _, row in pending if not row.password_hash]
+        hashes = iter(credential_verifier.hash_many(plain))
+        records = [
+            (number, {
+                "id": str(uuid.uuid4()),
+                "role": "doctor",
+                "username": row.username,
+                "full_name": row.full_name,
+                "email": row.email,
+                "password_hash": row.password_hash or next(hashes),
+                "specialization": row.specialization,
+                "notification_mode": "immediate",
+            })
+            for number, row in pending
+        ]
+
+        try:
+            if self.use_copy:
+                self._copy([r for _, r in records])
+            else:
+                self.db.execute(insert(User), [r for _, r in records])
+            self.db.commit()
+            self.imported += len(records)
+            self._index([r for _, r in records])
+        except self._integrity_errors:
+            # Lost a race with a concurrent write; retry row by row to find the culprits
+            self.db.rollback()
+            for number, record in records:
+                try:
+                    self.db.execute(insert(User), [record])
+                    self.db.commit()
+                    self.imported += 1
+                    self._index([record])
+                except IntegrityError:
+                    self.db.rollback()
+                    self.error(number, "username or email already exists")
+
+    def _index(self, records: list[dict]):
+        doctor_search.upsert_many((r["id"], r["full_name"], r["specialization"]) for r in records)
+
+    def _copy(self, records: list[dict]):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for record in records:
+            writer.writerow([record[c] for c in COPY_COLUMNS])
+        buffer.seek(0)
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY users ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+
+def detect_format(content_type: str | None, fmt: str | None) -> str | None:
+    if fmt:
+        return fmt if fmt in IMPORT_FORMATS else None
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
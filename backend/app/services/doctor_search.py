@@ -0,0 +1,362 @@
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from typing import Iterable
+
+from app.core.change_bus import change_bus
+from app.db.session import SessionLocal
+from app.models.user import User
+
+# Terms shorter than this are matched by prefix only
+FUZZY_MIN_LENGTH = 4
+
+# Spacing between the name-order ranks handed out by a (re)numbering;
+# single inserts take the midpoint between their neighbours
+RANK_GAP = 1 << 20
+
+# Sort keys are rank << SLOT_BITS | slot, so ordering ints yields the slot too
+SLOT_BITS = 32
+SLOT_MASK = (1 << SLOT_BITS) - 1
+
+# upsert_many() batches at least this large re-sort once instead of inserting row by row
+BULK_UPSERT_ROWS = 64
+
+# Recent results kept until the next write; autocomplete sends the same
+# short, broad prefixes over and over, and those are the slow ones
+RESULT_CACHE_SIZE = 256
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lower-case and strip accents, so "José" matches "jose"."""
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: str | None) -> list[str]:
+    return _TOKEN.findall(normalize(text)) if text else []
+
+
+def specialization_key(specialization: str | None) -> str | None:
+    return (normalize(specialization).strip() or None) if specialization else None
+
+
+def _deletes(token: str) -> set[str]:
+    """The token and every string one deletion away from it."""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _one_edit_apart(a: str, b: str) -> bool:
+    """At most one insertion, deletion, substitution or adjacent transposition apart."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class DoctorSearchIndex:
+    """In-memory inverted index over doctor names and specializations.
+
+    Built from the users table on the first search, then kept in step by
+    the write paths (admin add/update/delete/import, doctor profile) via
+    upsert()/remove(), which the change bus replays in the other worker
+    processes. Name terms match any word of the name by prefix;
+    with fuzzy on, terms of FUZZY_MIN_LENGTH+ characters also match words
+    one edit away, found through a deletion-neighbourhood index rather
+    than by scanning the vocabulary.
+
+    Internally doctors are small-int slots, so the set algebra and facet
+    counts stay cheap, and each slot carries an integer sort key in name
+    order: a page is the smallest keys of the match set rather than a
+    sort of the matching names.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.searches = 0
+        self.cache_hits = 0
+        self.renumbers = 0
+        self._results: OrderedDict[tuple, dict] = OrderedDict()
+        self._reset()
+
+    def _reset(self):
+        self.built = False
+        self._results.clear()
+        self._docs: dict[str, tuple[str, str | None, str | None]] = {}  # id -> (name, specialization, specialization key)
+        self._slots: dict[str, int] = {}
+        self._ids: list[str | None] = []  # slot -> doctor id
+        self._specialization_of: list[str | None] = []  # slot -> specialization key
+        self._sort_keys: list[int] = []  # slot -> rank << SLOT_BITS | slot
+        self._free: list[int] = []
+        self._order: list[tuple[str, str]] = []  # (normalized name, id), sorted
+        self._postings: dict[str, set[int]] = {}  # name word -> slots
+        self._vocabulary: list[str] = []  # name words, sorted, for prefix ranges
+        self._neighbours: dict[str, set[str]] = {}  # one-deletion variant -> name words
+        self._by_specialization: dict[str, set[int]] = {}
+        self._specialization_labels: dict[str, str] = {}
+
+    # ======================
+    # Maintenance
+    # ======================
+    def build(self, rows: Iterable[tuple[str, str, str | None]]):
+        with self._lock:
+            self._reset()
+            self._add_unsorted(rows)
+            self.built = True
+
+    def ensure_built(self):
+        if self.built:
+            return
+        with self._lock:
+            if self.built:
+                return
+            # Loaded under the lock: a concurrent write waits and then applies on top
+            db = SessionLocal()
+            try:
+                rows = db.query(User.id, User.full_name, User.specialization).filter(User.role == "doctor").all()
+            finally:
+                db.close()
+            self.build(rows)
+
+    def upsert(self, doctor_id: str, name: str, specialization: str | None, broadcast: bool = True):
+        with self._lock:
+            if self.built:  # otherwise picked up by the initial build
+                self._remove(doctor_id)
+                self._add(doctor_id, name, specialization)
+                self._place(doctor_id)
+        if broadcast:
+            change_bus.publish("doctor_search", {"upsert": [(doctor_id, name, specialization)]})
+
+    def upsert_many(self, rows: Iterable[tuple[str, str, str | None]], broadcast: bool = True):
+        rows = list(rows)
+        with self._lock:
+            if self.built and len(rows) < BULK_UPSERT_ROWS:
+                for row in rows:
+                    self.upsert(*row, broadcast=False)
+            elif self.built:
+                for doctor_id, _, _ in rows:
+                    self._remove(doctor_id)
+                self._add_unsorted(rows)
+        if broadcast and rows:
+            # Large imports exceed one bus message; peers then reset() and rebuild from the database
+            change_bus.publish("doctor_search", {"upsert": rows})
+
+    def remove(self, doctor_id: str, broadcast: bool = True):
+        with self._lock:
+            if self.built:
+                self._remove(doctor_id)
+        if broadcast:
+            change_bus.publish("doctor_search", {"remove": [doctor_id]})
+
+    def apply(self, change: dict):
+        """A change published by another worker process."""
+        self.upsert_many(change.get("upsert", ()), broadcast=False)
+        for doctor_id in change.get("remove", ()):
+            self.remove(doctor_id, broadcast=False)
+
+    def reset(self):
+        """Forget everything; rebuilt from the database on the next search."""
+        with self._lock:
+            self._reset()
+
+    def _add(self, doctor_id: str, name: str, specialization: str | None, new_words: list[str] | None = None):
+        key = specialization_key(specialization)
+        self._results.clear()
+        self._docs[doctor_id] = (name, specialization, key)
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = doctor_id
+            self._specialization_of[slot] = key
+        else:
+            slot = len(self._ids)
+            self._ids.append(doctor_id)
+            self._specialization_of.append(key)
+            self._sort_keys.append(0)
+        self._slots[doctor_id] = slot
+        for word in set(tokenize(name)):
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = set()
+                if new_words is None:
+                    self._vocabulary.insert(bisect_left(self._vocabulary, word), word)
+                else:
+                    new_words.append(word)
+                for variant in _deletes(word):
+                    self._neighbours.setdefault(variant, set()).add(word)
+            ids.add(slot)
+        if key:
+            self._by_specialization.setdefault(key, set()).add(slot)
+            self._specialization_labels.setdefault(key, specialization.strip())
+
+    def _add_unsorted(self, rows: list[tuple[str, str, str | None]]):
+        """Add many doctors, then sort and renumber once."""
+        new_words = []
+        for doctor_id, name, specialization in rows:
+            self._add(doctor_id, name, specialization, new_words)
+            self._order.append((normalize(name), doctor_id))
+        self._vocabulary.extend(new_words)
+        self._vocabulary.sort()
+        self._order.sort()
+        self._renumber()
+
+    def _place(self, doctor_id: str):
+        """Insert one doctor into the name order with a rank between its neighbours."""
+        sort_key = (normalize(self._docs[doctor_id][0]), doctor_id)
+        i = bisect_left(self._order, sort_key)
+        self._order.insert(i, sort_key)
+        below = self._rank(self._order[i - 1][1]) if i > 0 else None
+        above = self._rank(self._order[i + 1][1]) if i + 1 < len(self._order) else None
+        if below is None:
+            below = (above if above is not None else 0) - 2 * RANK_GAP
+        if above is None:
+            above = below + 2 * RANK_GAP
+        rank = (below + above) // 2
+        if rank == below:
+            self._renumber()  # gap used up by inserts at this spot
+            return
+        slot = self._slots[doctor_id]
+        self._sort_keys[slot] = rank << SLOT_BITS | slot
+
+    def _rank(self, doctor_id: str) -> int:
+        return self._sort_keys[self._slots[doctor_id]] >> SLOT_BITS
+
+    def _renumber(self):
+        self.renumbers += 1
+        for i, (_, doctor_id) in enumerate(self._order):
+            slot = self._slots[doctor_id]
+            self._sort_keys[slot] = i * RANK_GAP << SLOT_BITS | slot
+
+    def _remove(self, doctor_id: str):
+        doc = self._docs.pop(doctor_id, None)
+        if doc is None:
+            return
+        self._results.clear()
+        name, _, key = doc
+        del self._order[bisect_left(self._order, (normalize(name), doctor_id))]
+        slot = self._slots.pop(doctor_id)
+        self._ids[slot] = self._specialization_of[slot] = None
+        self._free.append(slot)
+        for word in set(tokenize(name)):
+            ids = self._postings[word]
+            ids.discard(slot)
+            if not ids:
+                del self._postings[word]
+                del self._vocabulary[bisect_left(self._vocabulary, word)]
+                for variant in _deletes(word):
+                    words = self._neighbours[variant]
+                    words.discard(word)
+                    if not words:
+                        del self._neighbours[variant]
+        if key:
+            ids = self._by_specialization[key]
+            ids.discard(slot)
+            if not ids:
+                del self._by_specialization[key]
+                del self._specialization_labels[key]
+
+    # ======================
+    # Queries
+    # ======================
+    def _match_term(self, term: str, fuzzy: bool) -> set[int]:
+        words = []
+        vocabulary = self._vocabulary
+        i = bisect_left(vocabulary, term)
+        while i < len(vocabulary) and vocabulary[i].startswith(term):
+            words.append(vocabulary[i])
+            i += 1
+        if fuzzy and len(term) >= FUZZY_MIN_LENGTH:
+            candidates = set()
+            for variant in _deletes(term):
+                candidates |= self._neighbours.get(variant, set())
+            words.extend(w for w in candidates if not w.startswith(term) and _one_edit_apart(term, w))
+        if len(words) == 1:
+            return self._postings[words[0]]
+        return set().union(*(self._postings[w] for w in words))
+
+    def _page(self, matched: set[int] | None, offset: int, limit: int) -> list[str]:
+        if matched is None:
+            return [doctor_id for _, doctor_id in self._order[offset:offset + limit]]
+        wanted = offset + limit
+        keys = map(self._sort_keys.__getitem__, matched)
+        keys = sorted(keys)[:wanted] if wanted * 4 > len(matched) else heapq.nsmallest(wanted, keys)
+        return [self._ids[key & SLOT_MASK] for key in keys[offset:]]
+
+    def search(self, q: str | None = None, specializations: list[str] | None = None,
+               offset: int = 0, limit: int = 20, fuzzy: bool = True) -> dict:
+        """One page of matches plus per-specialization counts.
+
+        Facet counts cover every name match, ignoring the specialization
+        filter, so clients can show how many doctors each option would give.
+        """
+        self.ensure_built()
+        terms = sorted(set(tokenize(q)), key=len, reverse=True)
+        keys = frozenset(specialization_key(s) for s in specializations or []) - {None}
+        cache_key = (tuple(terms), keys, offset, limit, fuzzy)
+        with self._lock:
+            self.searches += 1
+            result = self._results.get(cache_key)
+            if result is not None:
+                self.cache_hits += 1
+                self._results.move_to_end(cache_key)
+                return result
+
+            matched = None  # None: every doctor
+            for term in terms:
+                ids = self._match_term(term, fuzzy)
+                matched = ids if matched is None else matched & ids
+                if not matched:
+                    break
+
+            if matched is None:
+                counts = {key: len(ids) for key, ids in self._by_specialization.items()}
+            else:
+                counts = Counter(map(self._specialization_of.__getitem__, matched))
+                counts.pop(None, None)
+            facets = {self._specialization_labels[key]: n for key, n in sorted(counts.items())}
+
+            if keys:
+                selected = set().union(*(self._by_specialization.get(key, set()) for key in keys))
+                matched = selected if matched is None else matched & selected
+
+            total = len(self._docs) if matched is None else len(matched)
+            page = self._page(matched, offset, limit) if total else []
+            doctors = [
+                {"id": doctor_id, "name": self._docs[doctor_id][0], "specialization": self._docs[doctor_id][1]}
+                for doctor_id in page
+            ]
+            result = {"total": total, "offset": offset, "limit": limit, "doctors": doctors, "facets": facets}
+            self._results[cache_key] = result
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "built": self.built,
+                "doctors": len(self._docs),
+                "words": len(self._vocabulary),
+                "specializations": len(self._by_specialization),
+                "searches": self.searches,
+                "cache_hits": self.cache_hits,
+                "renumbers": self.renumbers,
+            }
+
+
+doctor_search = DoctorSearchIndex()
+change_bus.subscribe("doctor_search", doctor_search.apply, doctor_search.reset)
@@ -0,0 +1,206 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator
+
+import orjson
+from fastapi import HTTPException, status
+
+from app.core.change_bus import change_bus
+from app.core.config import settings
+
+# Appointment fields carried in every event; clients refetch for the rest
+EVENT_FIELDS = ("appointment_id", "doctor_id", "patient_username", "status", "time", "start_at", "end_at")
+
+
+def doctor_channel(doctor_id) -> str:
+    return f"doctor:{doctor_id}"
+
+
+def patient_channel(patient_username: str) -> str:
+    return f"patient:{patient_username}"
+
+
+class Subscription:
+    """One connected client: a bounded buffer drained by its stream.
+
+    Lives on the event loop that created it; publishers on other threads
+    hand events over with call_soon_threadsafe. When the buffer is full the
+    client is too slow to keep up: the buffer is dropped and the stream
+    ends with a single "resync" event, telling the client to reload its
+    list and reconnect, instead of queueing without bound.
+    """
+
+    def __init__(self, channels: tuple[str, ...], buffer_size: int):
+        self.channels = channels
+        self.buffer_size = buffer_size
+        self.loop = asyncio.get_running_loop()
+        self._buffer: deque[bytes] = deque()
+        self._ready = asyncio.Event()
+        self.overflowed = False
+        self.closed = False
+        self.unsubscribed = False
+
+    def deliver(self, frame: bytes) -> bool:
+        """Buffer one frame (on the subscriber's loop); False when the subscriber overflowed."""
+        if self.overflowed or self.closed:
+            return True
+        if len(self._buffer) >= self.buffer_size:
+            self.overflowed = True
+            self._buffer.clear()
+            self._ready.set()
+            return False
+        self._buffer.append(frame)
+        self._ready.set()
+        return True
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def frames(self, heartbeat: float) -> AsyncIterator[bytes]:
+        # Tells the browser how long to wait before reconnecting
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                await asyncio.wait_for(self._ready.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"  # keeps proxies from timing out an idle stream
+                continue
+            self._ready.clear()
+            while self._buffer:
+                yield self._buffer.popleft()
+            if self.overflowed:
+                yield b'event: resync\ndata: {"reason": "overflow"}\n\n'
+                return
+            if self.closed:
+                return
+
+
+class EventHub:
+    """In-process pub/sub for appointment changes, fanned out per channel.
+
+    Channels are "doctor:<id>" and "patient:<username>". publish() may be
+    called from any thread and never blocks on subscribers. It reaches
+    the clients connected to this process; publish_appointment() also
+    forwards the event to the other worker processes over the change bus.
+    """
+
+    def __init__(self, buffer_size: int, max_subscribers: int):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._channels: dict[str, set[Subscription]] = {}
+        self._count = 0
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+        self.rejected = 0
+
+    def subscribe(self, *channels: str) -> Subscription:
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many open event streams",
+                    headers={"Retry-After": "5"},
+                )
+            subscription = Subscription(channels, self.buffer_size)
+            for channel in channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription.unsubscribed:
+                return
+            subscription.unsubscribed = True
+            self._count -= 1
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def publish(self, event: str, data: dict, *channels: str):
+        """Send `event` to every subscriber of any of `channels` (each subscriber once)."""
+        with self._lock:
+            self.published += 1
+            targets = set()
+            for channel in channels:
+                targets |= self._channels.get(channel, set())
+        if not targets:
+            return
+        frame = b"id: %d\nevent: %s\ndata: %s\n\n" % (next(self._ids), event.encode(), orjson.dumps(data))
+        by_loop: dict[asyncio.AbstractEventLoop, list[Subscription]] = {}
+        for subscription in targets:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscriptions, frame)
+            except RuntimeError:
+                pass  # loop already closed; its streams are gone
+
+    def _deliver(self, subscriptions: list[Subscription], frame: bytes):
+        delivered = overflows = 0
+        for subscription in subscriptions:
+            if subscription.deliver(frame):
+                delivered += 1
+            else:
+                overflows += 1
+        with self._lock:
+            self.delivered += delivered
+            self.overflows += overflows
+
+    def close_all(self):
+        """End every open stream (shutdown)."""
+        with self._lock:
+            subscriptions = {s for subscribers in self._channels.values() for s in subscribers}
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.close)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": self._count,
+                "channels": len(self._channels),
+                "published": self.published,
+                "delivered": self.delivered,
+                "overflows": self.overflows,
+                "rejected": self.rejected,
+            }
+
+
+event_hub = EventHub(settings.EVENT_BUFFER_SIZE, settings.EVENT_MAX_SUBSCRIBERS)
+# Events are not replayed after missed messages; clients resync on reconnect
+change_bus.subscribe("events", lambda m: event_hub.publish(m["event"], m["data"], *m["channels"]))
+
+
+def publish_appointment(event: str, appointment: dict, *extra_channels: str):
+    """Push an appointment change to its doctor and patient (and any `extra_channels`)."""
+    data = {"type": event, **{f: appointment.get(f) for f in EVENT_FIELDS}, "at": datetime.utcnow().isoformat()}
+    channels = [doctor_channel(appointment.get("doctor_id")), *extra_channels]
+    if appointment.get("patient_username"):
+        channels.append(patient_channel(appointment["patient_username"]))
+    event_hub.publish(event, data, *channels)
+    change_bus.publish("events", {"event": event, "data": data, "channels": channels})
+
+
+async def event_stream(subscription: Subscription) -> AsyncIterator[bytes]:
+    """SSE body for a subscription; unsubscribes when the client goes away."""
+    started = time.monotonic()
+    try:
+        async for frame in subscription.frames(settings.EVENT_HEARTBEAT_SECONDS):
+            yield frame
+            if time.monotonic() - started > settings.EVENT_STREAM_MAX_SECONDS:
+                # Bounded lifetime: clients reconnect, which re-checks their credentials
+                return
+    finally:
+        event_hub.unsubscribe(subscription)
@@ -0,0 +1,140 @@
+import base64
+import binascii
+import csv
+import io
+from datetime import date, timedelta
+from typing import Iterator
+
+import orjson
+from fastapi import HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.db.appointment_archive import with_history
+from app.models.appointment import Appointment
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched from the store per call while streaming an export
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_cursor(appointment_id: str) -> str:
+    return base64.urlsafe_b64encode(appointment_id.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        appointment_id = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        appointment_id = None
+    if not appointment_id:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return appointment_id
+
+
+class AppointmentListing:
+    """Query parameters shared by the appointment list endpoints; use as a dependency.
+
+    Pages are keyset-paginated on appointment_id: `cursor` is the opaque
+    next_cursor from the previous page. format=ndjson|csv streams every
+    matching row (from `cursor` on) in EXPORT_BATCH_SIZE chunks instead of
+    returning a page. Archived appointments are included unless
+    history=false; date bounds keep the archive segments outside them closed.
+    """
+
+    def __init__(
+        self,
+        cursor: str | None = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        status: str | None = None,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        fields: str | None = Query(None, description="Comma-separated columns to return"),
+        format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+        history: bool = Query(True, description="Include archived past appointments"),
+    ):
+        self.after = decode_cursor(cursor) if cursor else None
+        self.limit = limit
+        self.status = status
+        if date_from and date_to and date_from > date_to:
+            raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+        # start_at is an ISO string, so date bounds compare lexicographically
+        self.start_from = date_from.isoformat() if date_from else None
+        self.start_before = (date_to + timedelta(days=1)).isoformat() if date_to else None
+        self.fields = None
+        if fields:
+            self.fields = [f.strip() for f in fields.split(",") if f.strip()]
+            if "appointment_id" not in self.fields:
+                # Always returned: it identifies the row and is the pagination key
+                self.fields.insert(0, "appointment_id")
+            unknown = set(self.fields) - set(Appointment.columns())
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        self.format = format
+        self.history = history
+
+    @property
+    def streaming(self) -> bool:
+        return self.format != "json"
+
+    def _filters(self, filters: dict) -> dict:
+        filters = {k: v for k, v in filters.items() if v is not None}
+        if self.status:
+            filters["status"] = self.status
+        return filters
+
+    def _source(self, store):
+        return with_history(store) if self.history else store
+
+    def project(self, record: dict) -> dict:
+        if self.fields is None:
+            return record
+        return {f: record[f] for f in self.fields if f in record}
+
+    def fetch(self, store, **filters) -> tuple[list[dict], str | None]:
+        """One page of projected records plus the cursor for the next page (None on the last)."""
+        records = self._source(store).page(self.limit + 1, after=self.after, start_from=self.start_from,
+                             start_before=self.start_before, **self._filters(filters))
+        next_cursor = encode_cursor(records[self.limit - 1]["appointment_id"]) if len(records) > self.limit else None
+        return [self.project(r) for r in records[:self.limit]], next_cursor
+
+    def iter_all(self, store, **filters) -> Iterator[dict]:
+        filters = self._filters(filters)
+        source = self._source(store)
+        after = self.after
+        while True:
+            records = source.page(EXPORT_BATCH_SIZE, after=after, start_from=self.start_from,
+                                 start_before=self.start_before, **filters)
+            for record in records:
+                yield self.project(record)
+            if len(records) < EXPORT_BATCH_SIZE:
+                return
+            after = records[-1]["appointment_id"]
+
+    def _ndjson(self, rows: Iterator[dict]) -> Iterator[bytes]:
+        for row in rows:
+            yield orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE)
+
+    def _csv(self, rows: Iterator[dict]) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=self.fields or Appointment.columns(), extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def export(self, store, filename: str, **filters) -> StreamingResponse:
+        rows = self.iter_all(store, **filters)
+        body = self._csv(rows) if self.format == "csv" else self._ndjson(rows)
+        return StreamingResponse(
+            body,
+            media_type=EXPORT_MEDIA_TYPES[self.format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}.{self.format}"'},
+        )
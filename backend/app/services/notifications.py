@@ -0,0 +1,213 @@
+import asyncio
+import html
+import logging
+import threading
+import time
+
+from app.core.change_bus import change_bus
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.user import User
+from app.services.outbox import Outbox, outbox, outbox_metrics
+from app.utils.email_utils import send_email
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_MODES = ("immediate", "digest")
+
+# How long a looked-up preference is trusted before asking the database again
+PREFERENCE_TTL_SECONDS = 60
+
+DIGEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digest_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    appointment_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    patient_name TEXT,
+    time TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (recipient_id, appointment_id)
+);
+"""
+
+EVENT_LABELS = {
+    "booked": "New appointment",
+    "rescheduled": "Rescheduled",
+    "cancelled": "Cancelled",
+}
+
+
+class NotificationPreferences:
+    """Per-user delivery mode ("immediate" or "digest"), cached in memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache: dict[str, tuple[str, float]] = {}
+
+    def get(self, user_id: str) -> str:
+        user_id = str(user_id)
+        with self._lock:
+            cached = self._cache.get(user_id)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        db = SessionLocal()
+        try:
+            mode = db.query(User.notification_mode).filter(User.id == user_id).scalar()
+        finally:
+            db.close()
+        mode = mode or "immediate"
+        self.set(user_id, mode, broadcast=False)
+        return mode
+
+    def set(self, user_id: str, mode: str, broadcast: bool = True):
+        with self._lock:
+            self._cache[str(user_id)] = (mode, time.monotonic() + PREFERENCE_TTL_SECONDS)
+        if broadcast:
+            change_bus.publish("preferences", {"user_id": str(user_id), "mode": mode})
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+preferences = NotificationPreferences()
+change_bus.subscribe("preferences", lambda m: preferences.set(m["user_id"], m["mode"], broadcast=False), preferences.clear)
+
+
+class DigestQueue:
+    """Pending doctor notifications, coalesced per appointment and sent as one email per window.
+
+    Events share the outbox SQLite file, so a flush consumes the events
+    and queues the digest in a single transaction. For each
+    (recipient, appointment) only the net change is kept: a booking
+    followed by a cancel disappears entirely, a booking followed by a
+    reschedule stays a booking at the new time, and otherwise the latest
+    event wins.
+    """
+
+    def __init__(self, outbox: Outbox):
+        self.outbox = outbox
+        self._schema_ready = False
+
+    def _ensure_schema(self, conn):
+        if not self._schema_ready:
+            conn.execute(DIGEST_SCHEMA)
+            self._schema_ready = True
+
+    def add(self, recipient_id: str, email: str, appointment_id: str, kind: str,
+            patient_name: str | None, time_label: str | None):
+        now = time.time()
+        with self.outbox.transaction() as conn:
+            self._ensure_schema(conn)
+            existing = conn.execute(
+                "SELECT id, kind FROM digest_events WHERE recipient_id = ? AND appointment_id = ?",
+                (str(recipient_id), appointment_id),
+            ).fetchone()
+            outbox_metrics.incr("digest_events")
+            if existing is None:
+                conn.execute(
+                    """INSERT INTO digest_events
+                       (recipient_id, email, appointment_id, kind, patient_name, time, created_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (str(recipient_id), email, appointment_id, kind, patient_name, time_label, now, now),
+                )
+                return
+            outbox_metrics.incr("digest_collapsed")
+            if existing["kind"] == "booked" and kind == "cancelled":
+                # Never saw it, no need to hear about it
+                conn.execute("DELETE FROM digest_events WHERE id = ?", (existing["id"],))
+                return
+            conn.execute(
+                "UPDATE digest_events SET kind = ?, email = ?, patient_name = ?, time = ?, updated_at = ? WHERE id = ?",
+                ("booked" if existing["kind"] == "booked" else kind, email, patient_name, time_label, now, existing["id"]),
+            )
+
+    def flush_due(self, window_seconds: float | None = None) -> int:
+        """Queue one digest for every recipient whose oldest pending event is a full window old."""
+        if window_seconds is None:
+            window_seconds = settings.DIGEST_WINDOW_MINUTES * 60
+        cutoff = time.time() - window_seconds
+        digests = 0
+        with self.outbox.transaction() as conn:
+            self._ensure_schema(conn)
+            due = [row[0] for row in conn.execute(
+                "SELECT recipient_id FROM digest_events GROUP BY recipient_id HAVING MIN(created_at) <= ?", (cutoff,)
+            )]
+            for recipient_id in due:
+                events = conn.execute(
+                    "SELECT * FROM digest_events WHERE recipient_id = ? ORDER BY created_at, id", (recipient_id,)
+                ).fetchall()
+                subject, body = render_digest(events)
+                self.outbox.insert(conn, [events[-1]["email"]], subject, body)
+                conn.execute("DELETE FROM digest_events WHERE recipient_id = ?", (recipient_id,))
+                digests += 1
+        if digests:
+            outbox_metrics.incr("digests", digests)
+            self.outbox.notify_listeners()
+        return digests
+
+
+digest_queue = DigestQueue(outbox)
+
+
+def render_digest(events) -> tuple[str, str]:
+    rows = "".join(
+        f"<li><b>{EVENT_LABELS.get(e['kind'], e['kind'])}</b>: {html.escape(e['patient_name'] or '')}"
+        f" at <b>{html.escape(e['time'] or '')}</b> (Appointment ID: {e['appointment_id']})</li>"
+        for e in events
+    )
+    count = len(events)
+    subject = f"Appointment updates ({count} change{'s' if count != 1 else ''})"
+    return subject, f"<p>Changes to your appointments since the last summary:</p><ul>{rows}</ul>"
+
+
+def notify_doctor(doctor_id: str | None, email: str | None, appointment_id: str, kind: str,
+                  subject: str, body: str, patient_name: str | None = None,
+                  time_label: str | None = None, mode: str | None = None):
+    """Send a doctor-facing appointment notification now, or add it to their digest.
+
+    `mode` can be passed when the caller already has the doctor row;
+    otherwise the doctor's preference is looked up (and cached).
+    """
+    if not email:
+        return
+    if doctor_id is not None and (mode or preferences.get(doctor_id)) == "digest":
+        digest_queue.add(doctor_id, email, appointment_id, kind, patient_name, time_label)
+    else:
+        send_email([email], subject, body)
+
+
+class DigestFlusher:
+    """Background task that flushes due digests every DIGEST_POLL_SECONDS."""
+
+    def __init__(self, queue: DigestQueue):
+        self.queue = queue
+        self._task: asyncio.Task | None = None
+        self.last_error: str | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.queue.flush_due)
+                self.last_error = None
+            except Exception as e:
+                # Keep going ("database is locked" and the like): due digests go out on a later pass
+                logger.exception("Flushing digests failed")
+                outbox_metrics.incr("digest_errors")
+                self.last_error = repr(e)
+            await asyncio.sleep(settings.DIGEST_POLL_SECONDS)
+
+
+digest_flusher = DigestFlusher(digest_queue)
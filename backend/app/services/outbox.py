@@ -0,0 +1,429 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from pathlib import Path
+from typing import Callable, Iterable
+
+import aiosmtplib
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lives next to appointments.json; one file shared by every worker process
+OUTBOX_FILE = Path(__file__).resolve().parent.parent / "db" / "outbox.sqlite3"
+
+# A message claimed by a sender that never reported back (crash, kill -9)
+# becomes claimable again after this long
+CLAIM_LEASE_SECONDS = 300
+
+# Longest pause of a sender loop after an unexpected error, doubling from 1s
+LOOP_ERROR_MAX_BACKOFF_SECONDS = 60
+
+# Delivered rows are kept this long for inspection, then purged
+SENT_RETENTION_SECONDS = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipients TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_status_next_attempt_at ON outbox (status, next_attempt_at);
+"""
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with +/-20% jitter so retries from a burst don't land together."""
+    delay = min(settings.OUTBOX_RETRY_MAX_SECONDS, settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class Outbox:
+    """Durable queue of outbound emails in a local SQLite table.
+
+    enqueue() commits the message before returning, so it survives a
+    restart of the API process. Senders claim due messages in batches
+    (BEGIN IMMEDIATE, so several processes can share the file) and report
+    each one back as sent or failed.
+    """
+
+    def __init__(self, path: Path = OUTBOX_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._listeners: list[Callable[[], None]] = []
+        self._next_purge = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Called (from any thread) after every enqueue, e.g. to wake a sender."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ======================
+    # Producer side
+    # ======================
+    def enqueue(self, recipients: Iterable[str], subject: str, body: str) -> int:
+        with self.transaction() as conn:
+            message_id = self.insert(conn, recipients, subject, body)
+        self.notify_listeners()
+        return message_id
+
+    def enqueue_many(self, messages: Iterable[tuple[Iterable[str], str, str]]) -> list[int]:
+        """Queue several (recipients, subject, body) messages in one transaction."""
+        with self.transaction() as conn:
+            ids = [self.insert(conn, *message) for message in messages]
+        if ids:
+            self.notify_listeners()
+        return ids
+
+    def insert(self, conn: sqlite3.Connection, recipients: Iterable[str], subject: str, body: str) -> int:
+        """Queue a message inside a caller's transaction(); call notify_listeners() after it commits."""
+        now = time.time()
+        cursor = conn.execute(
+            "INSERT INTO outbox (recipients, subject, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (json.dumps(list(recipients)), subject, body, now, now),
+        )
+        outbox_metrics.incr("enqueued")
+        return cursor.lastrowid
+
+    def notify_listeners(self):
+        for callback in list(self._listeners):
+            callback()
+
+    # ======================
+    # Sender side
+    # ======================
+    def claim(self, limit: int) -> list[dict]:
+        """Mark up to `limit` due messages as sending and return them, oldest first."""
+        now = time.time()
+        with self.transaction() as conn:
+            rows = conn.execute(
+                """SELECT * FROM outbox
+                   WHERE (status = 'queued' AND next_attempt_at <= ?)
+                      OR (status = 'sending' AND claimed_at < ?)
+                   ORDER BY next_attempt_at, id LIMIT ?""",
+                (now, now - CLAIM_LEASE_SECONDS, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row["id"]) for row in rows],
+            )
+        return [dict(row, recipients=json.loads(row["recipients"])) for row in rows]
+
+    def mark_sent(self, ids: list[int]):
+        if not ids:
+            return
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE outbox SET status = 'sent', sent_at = ?, attempts = attempts + 1, last_error = NULL WHERE id = ?",
+                [(now, i) for i in ids],
+            )
+
+    def mark_failed(self, message: dict, error: str, permanent: bool = False) -> str:
+        """Reschedule with backoff, or mark dead when permanent / out of attempts. Returns the new status."""
+        attempts = message["attempts"] + 1
+        dead = permanent or attempts >= settings.OUTBOX_MAX_ATTEMPTS
+        new_status = "dead" if dead else "queued"
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (new_status, attempts, time.time() + (0 if dead else retry_delay(attempts)), error[:500], message["id"]),
+            )
+        return new_status
+
+    def purge_sent(self):
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + 600
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (now - SENT_RETENTION_SECONDS,))
+
+    # ======================
+    # Report
+    # ======================
+    def counts(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            by_status = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status IN ('queued', 'sending')").fetchone()[0]
+        return {
+            "by_status": by_status,
+            "oldest_pending_age_s": round(time.time() - oldest, 1) if oldest else 0.0,
+        }
+
+
+class OutboxMetrics:
+    """Delivery counters for /metrics (per process)."""
+
+    FIELDS = ("enqueued", "sent", "retried", "dead", "batches", "connections_opened", "connection_errors",
+              "send_errors", "loop_errors", "digest_events", "digest_collapsed", "digests", "digest_errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(self.FIELDS, 0)
+        self.send_seconds = 0.0
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def record_send(self, seconds: float):
+        with self._lock:
+            self.counters["sent"] += 1
+            self.send_seconds += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            sent = self.counters["sent"]
+            return {
+                **self.counters,
+                "avg_send_ms": round(self.send_seconds / sent * 1000, 3) if sent else 0.0,
+                "messages_per_connection": round(sent / self.counters["connections_opened"], 1)
+                if self.counters["connections_opened"] else 0.0,
+            }
+
+
+outbox_metrics = OutboxMetrics()
+
+
+def smtp_client() -> aiosmtplib.SMTP:
+    """SMTP client built from the MAIL_* settings; connect() does STARTTLS and login."""
+    credentials = {}
+    if settings.USE_CREDENTIALS:
+        credentials = {"username": settings.MAIL_USERNAME, "password": settings.MAIL_PASSWORD}
+    return aiosmtplib.SMTP(
+        hostname=settings.MAIL_SERVER,
+        port=settings.MAIL_PORT,
+        use_tls=settings.MAIL_SSL_TLS,
+        start_tls=settings.MAIL_STARTTLS,
+        **credentials,
+    )
+
+
+def build_message(message: dict) -> EmailMessage:
+    # Gmail-style setups log in with the sending address, so that will do when MAIL_FROM is unset
+    sender = settings.MAIL_FROM or settings.MAIL_USERNAME
+    if not sender:
+        raise ValueError("MAIL_FROM is not set, so there is no sender address")
+    email = EmailMessage()
+    email["From"] = sender
+    email["To"] = ", ".join(message["recipients"])
+    email["Subject"] = message["subject"]
+    email["Date"] = formatdate(localtime=True)
+    email["Message-ID"] = make_msgid()
+    email.set_content(message["body"], subtype="html")
+    return email
+
+
+class SmtpSession:
+    """One long-lived SMTP connection, opened on first use and reused for every message after."""
+
+    def __init__(self, client_factory: Callable[[], aiosmtplib.SMTP]):
+        self._client_factory = client_factory
+        self._client: aiosmtplib.SMTP | None = None
+        self.last_used = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None and self._client.is_connected
+
+    async def send(self, email: EmailMessage):
+        if not self.connected:
+            self._client = self._client_factory()
+            await self._client.connect()
+            outbox_metrics.incr("connections_opened")
+        self.last_used = time.monotonic()
+        await self._client.send_message(email)
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is not None and client.is_connected:
+            try:
+                await client.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                client.close()
+
+    def drop(self):
+        """Abandon a connection left in an unknown state by an error."""
+        client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+
+class OutboxWorker:
+    """Delivers queued emails from an Outbox.
+
+    Runs OUTBOX_SMTP_CONNECTIONS sender loops on the event loop, each
+    holding its own SMTP connection open across batches and closing it
+    after OUTBOX_IDLE_SECONDS without traffic. Loops sleep until an
+    enqueue wakes them or OUTBOX_POLL_SECONDS pass (so retries that come
+    due are picked up).
+    """
+
+    def __init__(self, outbox: Outbox, client_factory: Callable[[], aiosmtplib.SMTP] = smtp_client,
+                 connections: int | None = None, batch_size: int | None = None):
+        self.outbox = outbox
+        self.client_factory = client_factory
+        self.connections = connections or settings.OUTBOX_SMTP_CONNECTIONS
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.last_error: str | None = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.outbox.add_listener(self.wake)
+        self._tasks = [asyncio.create_task(self._run(SmtpSession(self.client_factory))) for _ in range(self.connections)]
+
+    async def stop(self):
+        self.outbox.remove_listener(self.wake)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self, session: SmtpSession):
+        backoff = 0.0
+        try:
+            while True:
+                try:
+                    claimed = await self.deliver_batch(session)
+                    backoff, self.last_error = 0.0, None
+                    if claimed:
+                        continue
+                    if session.connected and time.monotonic() - session.last_used > settings.OUTBOX_IDLE_SECONDS:
+                        await session.close()
+                    await asyncio.to_thread(self.outbox.purge_sent)
+                except Exception as exc:
+                    # Keep the sender alive (e.g. the outbox file is locked); a claimed batch
+                    # left unreported is picked up again once its lease runs out
+                    logger.exception("Outbox sender loop failed")
+                    outbox_metrics.incr("loop_errors")
+                    self.last_error = repr(exc)
+                    session.drop()
+                    backoff = min(max(backoff * 2, 1.0), LOOP_ERROR_MAX_BACKOFF_SECONDS)
+                    await asyncio.sleep(backoff)
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            await session.close()
+
+    async def deliver_batch(self, session: SmtpSession) -> int:
+        """Claim one batch and send it over `session`. Returns how many messages were claimed."""
+        batch = await asyncio.to_thread(self.outbox.claim, self.batch_size)
+        if not batch:
+            return 0
+        outbox_metrics.incr("batches")
+        sent = []
+        try:
+            for message in batch:
+                started = time.perf_counter()
+                try:
+                    await session.send(build_message(message))
+                except aiosmtplib.SMTPRecipientsRefused as exc:
+                    codes = [refused.code for refused in exc.recipients]
+                    await self._failed(message, "; ".join(f"{r.code} {r.recipient}" for r in exc.recipients),
+                                       permanent=all(code >= 500 for code in codes))
+                except aiosmtplib.SMTPResponseException as exc:
+                    # 5xx is a permanent rejection (bad address etc.); 4xx is worth retrying
+                    await self._failed(message, f"{exc.code} {exc.message}", permanent=exc.code >= 500)
+                    if exc.code == 421:
+                        session.drop()
+                except (aiosmtplib.SMTPException, OSError) as exc:
+                    outbox_metrics.incr("connection_errors")
+                    session.drop()
+                    await self._failed(message, repr(exc))
+                except Exception as exc:
+                    # A bad message or settings (or a client bug): fail this one instead of the whole sender
+                    logger.exception("Sending outbox message %s failed", message["id"])
+                    outbox_metrics.incr("send_errors")
+                    session.drop()
+                    await self._failed(message, repr(exc))
+                else:
+                    outbox_metrics.record_send(time.perf_counter() - started)
+                    sent.append(message["id"])
+        finally:
+            # Also when reporting a failure broke off the batch: what went out must not be sent again
+            await asyncio.to_thread(self.outbox.mark_sent, sent)
+        return len(batch)
+
+    async def _failed(self, message: dict, error: str, permanent: bool = False):
+        status = await asyncio.to_thread(self.outbox.mark_failed, message, error, permanent)
+        outbox_metrics.incr("dead" if status == "dead" else "retried")
+
+    async def drain(self):
+        """Send everything currently due over a single connection, then close it."""
+        session = SmtpSession(self.client_factory)
+        try:
+            while await self.deliver_batch(session):
+                pass
+        finally:
+            await session.close()
+
+
+outbox = Outbox(Path(settings.OUTBOX_PATH) if settings.OUTBOX_PATH else OUTBOX_FILE)
+outbox_worker = OutboxWorker(outbox)
+
+
+def outbox_snapshot() -> dict:
+    return {**outbox_metrics.snapshot(), **outbox.counts(), "last_error": outbox_worker.last_error}
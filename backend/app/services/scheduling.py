@@ -0,0 +1,129 @@
+from bisect import bisect_left, insort
+from datetime import date as date_type, datetime, timedelta, timezone
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+# Appointments in these states occupy the doctor's slot; rejected/cancelled ones free it
+ACTIVE_STATUSES = {"pending", "booked", "accepted", "rescheduled"}
+
+# Fields whose change can move an appointment into a slot another one holds
+SLOT_FIELDS = {"doctor_id", "start_at", "end_at", "status"}
+
+# Clock-only formats accepted when a separate date is known ("10:30 AM", "15:00", ...)
+CLOCK_FORMATS = ("%I:%M %p", "%I:%M%p", "%I %p", "%I%p", "%H:%M", "%H:%M:%S")
+
+
+def parse_start(time: str | None, date: str | None = None) -> datetime | None:
+    """Turn the free-form appointment time into a naive UTC datetime, or None if it can't be placed."""
+    if not time:
+        return None
+    time = time.strip()
+    try:
+        start = datetime.fromisoformat(time.replace("Z", "+00:00"))
+    except ValueError:
+        start = None
+        if date:
+            try:
+                day = date_type.fromisoformat(date.strip())
+            except ValueError:
+                return None
+            for fmt in CLOCK_FORMATS:
+                try:
+                    start = datetime.combine(day, datetime.strptime(time.upper(), fmt).time())
+                    break
+                except ValueError:
+                    continue
+        if start is None:
+            return None
+    if start.tzinfo is not None:
+        start = start.astimezone(timezone.utc).replace(tzinfo=None)
+    return start
+
+
+def parse_slot(time: str | None, date: str | None = None) -> tuple[str, str] | None:
+    """Return (start_at, end_at) ISO strings for a booking, using the configured slot length."""
+    start = parse_start(time, date)
+    if start is None:
+        return None
+    end = start + timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+    return start.isoformat(timespec="seconds"), end.isoformat(timespec="seconds")
+
+
+def occupies_slot(record: dict) -> bool:
+    return (
+        record.get("status") in ACTIVE_STATUSES
+        and record.get("doctor_id") is not None
+        and record.get("start_at") is not None
+        and record.get("end_at") is not None
+    )
+
+
+class SlotTaken(HTTPException):
+    """Raised by the stores' *_if_free writes when the doctor's slot is already held."""
+
+    def __init__(self):
+        super().__init__(status_code=409, detail="Doctor already has an appointment at this time")
+
+
+def _slot_length(start_at: str, end_at: str) -> timedelta | None:
+    try:
+        return datetime.fromisoformat(end_at) - datetime.fromisoformat(start_at)
+    except ValueError:
+        return None
+
+
+class SlotIndex:
+    """Sorted interval index of one doctor's occupied slots.
+
+    Entries are kept in a list ordered by start time. An overlap lookup is
+    a bisect plus a walk back over the entries that start less than the
+    longest indexed slot before the new start (the only ones that can
+    still reach it), so slots of mixed lengths are all found. Adding or
+    removing is a bisect plus a list insert/delete: O(n), but a memmove
+    over one doctor's slots.
+    """
+
+    def __init__(self):
+        self._entries: list[tuple[str, str, str]] = []  # (start_at, appointment_id, end_at)
+        # Longest slot indexed so far (never shrinks); None if one couldn't be measured, which means scan everything
+        self._max_length: timedelta | None = timedelta(0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, start_at: str, end_at: str, appointment_id: str):
+        insort(self._entries, (start_at, appointment_id, end_at))
+        if self._max_length is not None:
+            length = _slot_length(start_at, end_at)
+            self._max_length = None if length is None else max(self._max_length, length)
+
+    def remove(self, start_at: str, end_at: str, appointment_id: str):
+        entry = (start_at, appointment_id, end_at)
+        i = bisect_left(self._entries, entry)
+        if i < len(self._entries) and self._entries[i] == entry:
+            del self._entries[i]
+
+    def _earliest_reaching(self, start_at: str) -> str | None:
+        """Slots starting before this end before start_at, however long they are (None: unknown)."""
+        if self._max_length is None:
+            return None
+        try:
+            return (datetime.fromisoformat(start_at) - self._max_length).isoformat(timespec="seconds")
+        except ValueError:
+            return None
+
+    def overlapping(self, start_at: str, end_at: str) -> list[str]:
+        """Ids of slots overlapping [start_at, end_at)."""
+        # Everything left of i starts before the new slot ends
+        i = bisect_left(self._entries, (end_at,))
+        earliest = self._earliest_reaching(start_at)
+        found = []
+        for j in range(i - 1, -1, -1):
+            slot_start, appointment_id, slot_end = self._entries[j]
+            if earliest is not None and slot_start < earliest:
+                break
+            if slot_end > start_at:
+                found.append(appointment_id)
+        return found
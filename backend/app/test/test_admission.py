@@ -0,0 +1,37 @@
+# app/test/test_admission.py
+import asyncio
+
+from app.core.admission import MemoryBuckets, WriteGate
+
+
+def test_token_bucket_allows_a_burst_then_the_refill_rate():
+    buckets = MemoryBuckets(max_keys=10)
+
+    async def take_many(key, n):
+        return [await buckets.take(key, rate=2, burst=3) for _ in range(n)]
+
+    waits = asyncio.run(take_many("patient:alice", 4))
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert 0.4 < waits[3] <= 0.5  # next token in half a second at 2/s
+    assert asyncio.run(take_many("patient:bob", 1)) == [0.0]  # buckets are per key
+
+
+def test_write_gate_queues_briefly_then_sheds():
+    async def scenario():
+        gate = WriteGate(limit=1, queue=1, timeout=0.05)
+        assert await gate.acquire() is None
+
+        waiting = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.waiting == 1
+        assert await gate.acquire() == "queue_full"
+
+        gate.release()  # handed straight to the waiter
+        assert await waiting is None
+        assert gate.active == 1
+
+        assert await gate.acquire() == "queue_timeout"
+        gate.release()
+        assert gate.active == 0 and gate.waiting == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,94 @@
+# app/test/test_appointment_archive.py
+from datetime import datetime
+
+from app.db.appointment_archive import AppointmentArchive, AppointmentHistory, Archiver
+from app.db.appointment_store import AppointmentStore
+from app.db.import_appointments import read_appointments
+
+
+def make_appointment(appointment_id, start_at, doctor_id="doc-1", patient_username="alice", status="accepted"):
+    return {
+        "appointment_id": appointment_id,
+        "doctor_id": doctor_id,
+        "patient_username": patient_username,
+        "status": status,
+        "start_at": start_at,
+        "end_at": start_at[:11] + "23:59:00",
+    }
+
+
+def test_archiver_moves_old_appointments_into_monthly_segments(tmp_path):
+    store = AppointmentStore(tmp_path / "appointments.json")
+    archive = AppointmentArchive(tmp_path / "archive")
+    store.add(make_appointment("APT-1", "2024-01-10T09:00:00"))
+    store.add(make_appointment("APT-2", "2024-01-20T09:00:00", patient_username="bob"))
+    store.add(make_appointment("APT-3", "2024-03-05T09:00:00", doctor_id="doc-2"))
+    store.add(make_appointment("APT-4", "2025-06-01T09:00:00", status="pending"))
+
+    assert Archiver(store, archive).run_once(now=datetime(2025, 6, 1)) == 3
+    assert [a["appointment_id"] for a in store.all()] == ["APT-4"]
+    assert sorted(p.name for p in (tmp_path / "archive").glob("*.gz")) == ["2024-01.jsonl.gz", "2024-03.jsonl.gz"]
+
+    # Another process only sees the files
+    history = AppointmentHistory(AppointmentStore(tmp_path / "appointments.json"), AppointmentArchive(tmp_path / "archive"))
+    assert [a["appointment_id"] for a in history.page(10)] == ["APT-1", "APT-2", "APT-3", "APT-4"]
+    assert [a["appointment_id"] for a in history.page(2, after="APT-1")] == ["APT-2", "APT-3"]
+    assert [a["appointment_id"] for a in history.page(10, patient_username="bob")] == ["APT-2"]
+
+    # Segments outside the date range or without the doctor aren't opened
+    reader = history.archive
+    read_before, skipped_before = reader.segments_read, reader.segments_skipped
+    assert [a["appointment_id"] for a in history.page(10, start_from="2024-03-01")] == ["APT-3", "APT-4"]
+    assert [a["appointment_id"] for a in history.page(10, doctor_id="doc-2")] == ["APT-3"]
+    assert reader.segments_read - read_before == 2
+    assert reader.segments_skipped - skipped_before == 2
+
+
+def test_hot_copy_wins_and_torn_appends_are_ignored(tmp_path):
+    store = AppointmentStore(tmp_path / "appointments.json")
+    archive = AppointmentArchive(tmp_path / "archive")
+    old = make_appointment("APT-1", "2024-01-10T09:00:00")
+    archive.append([old])
+    # Crashed before the record left the hot store, and it has changed since
+    store.add({**old, "status": "cancelled"})
+    with open(tmp_path / "archive" / "2024-01.jsonl.gz", "ab") as f:
+        f.write(b"\x1f\x8b half a member")
+
+    history = AppointmentHistory(store, archive)
+    assert [a["status"] for a in history.page(10)] == ["cancelled"]
+    assert history.page(10, status="accepted") == []
+
+    # The next run re-archives it over the torn bytes, and the newest copy wins
+    assert Archiver(store, archive).run_once(now=datetime(2025, 6, 1)) == 1
+    assert archive.snapshot()["segments"] == 1
+    assert [a["status"] for a in history.page(10)] == ["cancelled"]
+
+
+def test_sql_import_reads_the_archive_too(tmp_path):
+    store = AppointmentStore(tmp_path / "appointments.json")
+    store.add(make_appointment("APT-1", "2024-01-10T09:00:00"))
+    store.add(make_appointment("APT-2", "2025-06-01T09:00:00"))
+    Archiver(store, AppointmentArchive(tmp_path / "archive")).run_once(now=datetime(2025, 6, 1))
+    store.close()
+
+    assert sorted(a["appointment_id"] for a in read_appointments(tmp_path / "appointments.json")) == ["APT-1", "APT-2"]
+
+
+def test_deleting_a_doctors_appointments_reaches_the_archive(tmp_path):
+    store = AppointmentStore(tmp_path / "appointments.json")
+    archive = AppointmentArchive(tmp_path / "archive")
+    history = AppointmentHistory(store, archive)
+    store.add(make_appointment("APT-1", "2024-01-10T09:00:00"))
+    store.add(make_appointment("APT-2", "2024-01-20T09:00:00", doctor_id="doc-2"))
+    store.add(make_appointment("APT-3", "2025-06-01T09:00:00"))
+    Archiver(store, archive).run_once(now=datetime(2025, 6, 1))
+
+    assert history.delete_where(doctor_id="doc-1") == 2
+    assert [a["appointment_id"] for a in history.page(10)] == ["APT-2"]
+    assert history.counters().to_dict()["by_doctor"] == {"doc-2": {"accepted": 1}}
+    # Another process reads the tombstone from the segment, and a recount agrees
+    other = AppointmentArchive(tmp_path / "archive")
+    assert [a["appointment_id"] for a in other.all()] == ["APT-2"]
+    assert other.snapshot()["appointments"] == 1
+    history.rebuild_counters()
+    assert history.counters().total == 1
@@ -0,0 +1,77 @@
+# app/test/test_appointment_stats.py
+from datetime import datetime
+
+from app.db.appointment_archive import AppointmentArchive, AppointmentHistory, Archiver
+from app.db.appointment_store import AppointmentStore
+from app.services.appointment_stats import AppointmentCounters, SqlAppointmentCounters, TransactionSnapshot, count_changes
+
+
+def make_appointment(appointment_id, start_at, doctor_id="doc-1", status="pending"):
+    return {
+        "appointment_id": appointment_id,
+        "doctor_id": doctor_id,
+        "patient_username": "alice",
+        "status": status,
+        "start_at": start_at,
+        "end_at": start_at[:11] + "23:59:00",
+    }
+
+
+def test_counters_follow_every_write(tmp_path):
+    store = AppointmentStore(tmp_path / "appointments.json")
+    store.add(make_appointment("APT-1", "2025-10-02T09:00:00"))
+    store.add(make_appointment("APT-2", "2025-10-02T10:00:00", doctor_id="doc-2"))
+    store.add(make_appointment("APT-3", "2025-10-03T09:00:00"))
+    store.update("APT-1", status="accepted")
+    store.update_many({"APT-3": {"status": "rejected"}})
+    store.update("APT-2", doctor_id="doc-1", start_at="2025-10-03T11:00:00")
+
+    report = store.counters().report()
+    assert report["total"] == 3
+    assert report["by_status"] == {"accepted": 1, "rejected": 1, "pending": 1}
+    assert report["by_doctor"] == {"doc-1": {"accepted": 1, "rejected": 1, "pending": 1}}
+    assert report["by_day"] == {"2025-10-02": {"accepted": 1}, "2025-10-03": {"rejected": 1, "pending": 1}}
+
+    store.delete("APT-1")
+    assert store.delete_where(doctor_id="doc-1") == 2
+    assert store.counters().report() == {"total": 0, "by_status": {}, "by_doctor": {}, "by_day": {}}
+
+    # A fresh load counts the same as the writes did
+    store.add(make_appointment("APT-4", "2025-10-04T09:00:00"))
+    assert AppointmentStore(tmp_path / "appointments.json").counters().to_dict() == store.counters().to_dict()
+
+
+def test_archived_appointments_stay_counted(tmp_path):
+    store = AppointmentStore(tmp_path / "appointments.json")
+    archive = AppointmentArchive(tmp_path / "archive")
+    history = AppointmentHistory(store, archive)
+    store.add(make_appointment("APT-1", "2024-01-10T09:00:00", status="accepted"))
+    store.add(make_appointment("APT-2", "2024-02-10T09:00:00", status="rejected"))
+    store.add(make_appointment("APT-3", "2025-06-01T09:00:00"))
+    before = history.counters().to_dict()
+
+    assert Archiver(store, archive).run_once(now=datetime(2025, 6, 1)) == 2
+    assert store.counters().total == 1
+    assert history.counters().to_dict() == before
+    # Another process reads the archive's counts from its manifest
+    assert AppointmentArchive(tmp_path / "archive").counters().to_dict()["by_status"] == {"accepted": 1, "rejected": 1}
+
+    # A copy left in the hot store by a crash is counted twice until a rebuild
+    store.add(make_appointment("APT-1", "2024-01-10T09:00:00", status="accepted"))
+    assert history.counters().total == 4
+    history.rebuild_counters()
+    assert history.counters().to_dict() == before
+
+
+def test_sql_counters_skip_writes_the_recount_already_saw():
+    counters = SqlAppointmentCounters()
+    counters._counters = AppointmentCounters()
+    counters._snapshot = TransactionSnapshot("100:105:101,103")  # 101 and 103 were still running
+    added = count_changes([(None, make_appointment("APT-1", "2025-10-02T09:00:00"))])
+
+    for xid in (99, 102, 104):  # committed before the recount: already in the GROUP BY
+        counters.apply(added, xid)
+    assert counters.current().total == 0
+    for xid in (101, 103, 105, None):
+        counters.apply(added, xid)
+    assert counters.current().total == 4
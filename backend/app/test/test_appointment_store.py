@@ -0,0 +1,89 @@
+# app/test/test_appointment_store.py
+from app.db.appointment_store import AppointmentStore
+
+
+def make_appointment(appointment_id, doctor_id="doc-1", patient_username="alice", status="pending"):
+    return {
+        "appointment_id": appointment_id,
+        "doctor_id": doctor_id,
+        "patient_username": patient_username,
+        "status": status,
+        "time": "2025-10-02T15:00:00",
+    }
+
+
+def test_indexes_follow_updates_and_deletes(tmp_path):
+    store = AppointmentStore(tmp_path / "appointments.json")
+    store.add(make_appointment("APT-1"))
+    store.add(make_appointment("APT-2", doctor_id="doc-2"))
+    store.add(make_appointment("APT-3", patient_username="bob"))
+
+    assert [a["appointment_id"] for a in store.find(doctor_id="doc-1", status="pending")] == ["APT-1", "APT-3"]
+
+    store.update("APT-1", status="accepted")
+    assert [a["appointment_id"] for a in store.find(doctor_id="doc-1", status="pending")] == ["APT-3"]
+    assert [a["appointment_id"] for a in store.find(status="accepted")] == ["APT-1"]
+
+    store.delete("APT-3")
+    assert store.find(patient_username="bob") == []
+    assert store.delete_where(doctor_id="doc-2") == 1
+    assert store.count() == 1
+
+
+def test_journal_replay_and_compaction(tmp_path):
+    path = tmp_path / "appointments.json"
+    store = AppointmentStore(path, compact_every=3)
+    store.add(make_appointment("APT-1"))
+    store.add(make_appointment("APT-2"))
+    assert not path.exists()
+
+    store.update("APT-2", status="rejected")  # third journal entry triggers compaction
+    assert path.exists()
+    assert not store.journal_path.exists()
+
+    store.delete("APT-1")
+    store.close()
+
+    reloaded = AppointmentStore(path)
+    assert [a["appointment_id"] for a in reloaded.all()] == ["APT-2"]
+    assert reloaded.get("APT-2")["status"] == "rejected"
+
+
+def test_page_is_keyset_ordered_and_filtered(tmp_path):
+    store = AppointmentStore(tmp_path / "appointments.json")
+    for i in (3, 1, 4, 2, 5):
+        record = make_appointment(f"APT-{i}", doctor_id="doc-1" if i % 2 else "doc-2")
+        record["start_at"] = f"2025-10-0{i}T09:00:00"
+        store.add(record)
+
+    first = store.page(2)
+    assert [a["appointment_id"] for a in first] == ["APT-1", "APT-2"]
+    store.delete("APT-3")
+    assert [a["appointment_id"] for a in store.page(2, after="APT-2")] == ["APT-4", "APT-5"]
+
+    assert [a["appointment_id"] for a in store.page(10, doctor_id="doc-1")] == ["APT-1", "APT-5"]
+    # Filtered pages stay in step with writes after the first one
+    store.add(make_appointment("APT-0", doctor_id="doc-1"))
+    store.update("APT-5", doctor_id="doc-2")
+    assert [a["appointment_id"] for a in store.page(1, doctor_id="doc-1")] == ["APT-0"]
+    assert [a["appointment_id"] for a in store.page(10, after="APT-0", doctor_id="doc-1")] == ["APT-1"]
+    assert [a["appointment_id"] for a in store.page(10, after="APT-2", doctor_id="doc-2")] == ["APT-4", "APT-5"]
+    store.update("APT-5", doctor_id="doc-1")
+    window = store.page(10, start_from="2025-10-02", start_before="2025-10-05")
+    assert [a["appointment_id"] for a in window] == ["APT-2", "APT-4"]
+
+
+def test_update_many_is_one_journal_write(tmp_path):
+    path = tmp_path / "appointments.json"
+    store = AppointmentStore(path)
+    store.add(make_appointment("APT-1"))
+    store.add(make_appointment("APT-2"))
+
+    results = store.update_many({"APT-1": {"status": "accepted"}, "APT-2": {"status": "rejected"}, "APT-9": {"status": "accepted"}})
+    assert results["APT-9"] is None
+    assert [results[i]["status"] for i in ("APT-1", "APT-2")] == ["accepted", "rejected"]
+    assert store.find(status="pending") == []
+    store.close()
+
+    reloaded = AppointmentStore(path)
+    assert reloaded.get("APT-2")["status"] == "rejected"
@@ -0,0 +1,62 @@
+# app/test/test_change_bus.py
+import threading
+
+import orjson
+
+from app.core.change_bus import ChangeBus, SocketTransport
+from app.db.appointment_store import AppointmentStore
+
+
+def test_socket_bus_delivers_to_peers_and_resyncs_on_gaps(tmp_path):
+    sender, receiver = ChangeBus(), ChangeBus()
+    received, resynced = [], threading.Event()
+    delivered = threading.Event()
+
+    def handler(data):
+        received.append(data)
+        delivered.set()
+
+    receiver.subscribe("doctor_directory", handler, resynced.set)
+    sender.start(SocketTransport(tmp_path, sender.origin))
+    receiver.start(SocketTransport(tmp_path, receiver.origin))
+    try:
+        sender.publish("doctor_directory", {"id": "doc-1"})
+        assert delivered.wait(2)
+        assert received == [{"id": "doc-1"}]
+        assert not resynced.is_set()
+
+        # A message from the same sender that skips a sequence number: some were lost
+        receiver._receive(orjson.dumps({"o": sender.origin, "s": 5, "t": "doctor_directory", "at": 0, "d": None}))
+        assert resynced.is_set()
+        stats = receiver.snapshot()
+        assert stats["gaps"] == 1
+        assert stats["topics"]["doctor_directory"]["received"] == 2
+    finally:
+        sender.stop()
+        receiver.stop()
+    assert not list(tmp_path.glob("*.sock"))
+
+
+def test_store_catches_up_with_other_process_writes(tmp_path):
+    path = tmp_path / "appointments.json"
+    first = AppointmentStore(path, compact_every=4)
+    second = AppointmentStore(path, compact_every=4)
+    first.add({"appointment_id": "APT-1", "doctor_id": "doc-1", "status": "pending"})
+    assert second.count() == 1
+
+    first.update("APT-1", status="accepted")
+    assert second.get("APT-1")["status"] == "pending"  # until notified
+    assert second.catch_up() == 1
+    assert second.get("APT-1")["status"] == "accepted"
+
+    # Writes catch up first, so this delete sees APT-2; it is the fourth entry, so second compacts
+    first.add({"appointment_id": "APT-2", "doctor_id": "doc-1", "status": "pending"})
+    second.delete("APT-2")
+    assert not second.journal_path.exists()
+
+    # first notices the new snapshot and reloads from it before writing
+    first.add({"appointment_id": "APT-3", "doctor_id": "doc-2", "status": "pending"})
+    assert first.snapshot()["reloads"] == 1
+    assert sorted(a["appointment_id"] for a in first.all()) == ["APT-1", "APT-3"]
+    second.catch_up()
+    assert sorted(a["appointment_id"] for a in second.all()) == ["APT-1", "APT-3"]
@@ -0,0 +1,34 @@
+# app/test/test_doctor_directory.py
+from app.services.doctor_directory import DoctorDirectory, etag_matches
+
+
+def test_invalidate_drops_cached_view():
+    directory = DoctorDirectory(ttl=60, max_entries=4)
+    calls = []
+
+    def render():
+        calls.append(1)
+        return b'[{"id": "doc-%d"}]' % len(calls)
+
+    first = directory.get("admin:list", render)
+    assert directory.get("admin:list", render) is first
+    assert len(calls) == 1
+    assert etag_matches(first.etag, first.etag)
+    assert etag_matches(f'W/{first.etag}, "other"', first.etag)
+
+    directory.invalidate()
+    second = directory.get("admin:list", render)
+    assert len(calls) == 2
+    assert second.etag != first.etag
+    assert not etag_matches(first.etag, second.etag)
+
+
+def test_load_racing_a_write_is_not_cached():
+    directory = DoctorDirectory(ttl=60, max_entries=4)
+
+    def render():
+        directory.invalidate()  # a doctor changed while the list was being read
+        return b"[]"
+
+    directory.get("admin:list", render)
+    assert directory.snapshot()["entries"] == 0
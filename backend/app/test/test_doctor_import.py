@@ -0,0 +1,34 @@
+# app/test/test_doctor_import.py
+import io
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.passwords import pwd_context
+from app.models.user import User
+from app.services.doctor_import import DoctorImport
+
+HASH = pwd_context.hash("secret")
+
+
+def test_bad_rows_are_reported_and_the_rest_load(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    User.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id="doc-0", role="doctor", username="taken", full_name="Taken", email="taken@example.com"))
+    db.commit()
+
+    upload = io.BytesIO((
+        "username,full_name,email,specialization,password_hash\n"
+        f"ann,Ann,ann@example.com,Cardiology,\"{HASH}\"\n"
+        f"bob,Bob,not-an-email,Cardiology,\"{HASH}\"\n"
+        f"taken,Dup,other@example.com,Cardiology,\"{HASH}\"\n"
+        f"ann,Ann Again,ann2@example.com,Cardiology,\"{HASH}\"\n"
+        "cat,Cat,cat@example.com,Cardiology,\n"
+        f"dan,Dan,dan@example.com,Dermatology,\"{HASH}\"\n"
+    ).encode())
+    result = DoctorImport(db, batch_size=2).run(upload, "csv")
+
+    assert (result["rows"], result["imported"], result["failed"]) == (6, 2, 4)
+    assert [e["row"] for e in result["errors"]] == [2, 3, 4, 5]
+    assert sorted(u for (u,) in db.query(User.username)) == ["ann", "dan", "taken"]
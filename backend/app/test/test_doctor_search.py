@@ -0,0 +1,45 @@
+# app/test/test_doctor_search.py
+from app.services.doctor_search import DoctorSearchIndex
+
+
+def make_index():
+    index = DoctorSearchIndex()
+    index.build([
+        ("d1", "John Smith", "Cardiology"),
+        ("d2", "José Álvarez", "Dermatology"),
+        ("d3", "Joanna Smithers", "Cardiology"),
+        ("d4", "Mary Jones", "Neurology"),
+    ])
+    return index
+
+
+def names(result):
+    return [d["name"] for d in result["doctors"]]
+
+
+def test_prefix_fuzzy_and_facets():
+    index = make_index()
+    result = index.search("jo")
+    assert names(result) == ["Joanna Smithers", "John Smith", "José Álvarez", "Mary Jones"]
+    assert result["facets"] == {"Cardiology": 2, "Dermatology": 1, "Neurology": 1}
+
+    assert names(index.search("smith jo")) == ["Joanna Smithers", "John Smith"]
+    assert names(index.search("alvarez")) == ["José Álvarez"]
+    assert names(index.search("jhon")) == ["John Smith"]
+    assert index.search("jhon", fuzzy=False)["total"] == 0
+
+    filtered = index.search("jo", ["cardiology"], limit=1)
+    assert filtered["total"] == 2 and names(filtered) == ["Joanna Smithers"]
+    assert filtered["facets"]["Neurology"] == 1  # facets ignore the specialization filter
+
+
+def test_writes_update_the_index():
+    index = make_index()
+    assert index.search("jo")["total"] == 4
+    index.upsert("d1", "Aaron Smith", "Oncology")
+    index.remove("d4")
+    index.upsert("d5", "Jon Snow", None)
+    result = index.search("jo")
+    assert names(result) == ["Joanna Smithers", "Jon Snow", "José Álvarez"]
+    assert index.search(specializations=["Oncology"])["doctors"][0]["id"] == "d1"
+    assert "Neurology" not in index.search()["facets"]
@@ -0,0 +1,51 @@
+# app/test/test_events.py
+import asyncio
+import threading
+
+from app.services.events import EventHub
+
+
+async def read_all(subscription) -> list[bytes]:
+    return [frame async for frame in subscription.frames(heartbeat=1)]
+
+
+def test_slow_subscriber_is_cut_off_with_resync():
+    async def scenario():
+        hub = EventHub(buffer_size=3, max_subscribers=10)
+        other = hub.subscribe("doctor:1")
+        slow = hub.subscribe("doctor:1", "patient:alice")
+
+        # Published from another thread, as the sync routes do
+        thread = threading.Thread(target=lambda: [hub.publish("booked", {"n": i}, "doctor:1") for i in range(5)])
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0)  # let the loop run the hand-over
+
+        frames = await read_all(slow)
+        assert frames[-1].startswith(b"event: resync")
+        assert len(frames) == 2  # retry hint + resync; the backlog was dropped
+
+        # Nothing drained the other one either
+        assert (await read_all(other))[-1].startswith(b"event: resync")
+
+        hub.unsubscribe(slow)
+        hub.unsubscribe(slow)
+        assert hub.snapshot()["subscribers"] == 1
+        assert hub.snapshot()["overflows"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_subscriber_receives_events_for_its_channels_once():
+    async def scenario():
+        hub = EventHub(buffer_size=10, max_subscribers=10)
+        subscription = hub.subscribe("doctor:1", "patient:alice")
+        hub.publish("booked", {"appointment_id": "APT-1"}, "doctor:1", "patient:alice")
+        hub.publish("booked", {"appointment_id": "APT-2"}, "doctor:2")
+        await asyncio.sleep(0)
+        subscription.close()
+        frames = await read_all(subscription)
+        assert len(frames) == 2
+        assert b'"APT-1"' in frames[1] and frames[1].startswith(b"id: 1\nevent: booked\n")
+
+    asyncio.run(scenario())
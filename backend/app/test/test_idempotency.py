@@ -0,0 +1,65 @@
+# app/test/test_idempotency.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.core.idempotency import IdempotencyCache
+
+
+def test_duplicates_wait_for_the_first_and_get_its_response():
+    cache = IdempotencyCache(max_keys=10, ttl=60, wait=5)
+    calls = []
+
+    async def book():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return JSONResponse({"appointment_id": f"APT-{len(calls)}"})
+
+    async def scenario():
+        responses = await asyncio.gather(*(cache.run("key-1", "same", book) for _ in range(5)))
+        assert len(calls) == 1
+        assert {r.body for r in responses} == {b'{"appointment_id":"APT-1"}'}
+        assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 4
+
+        with pytest.raises(HTTPException) as exc:
+            await cache.run("key-1", "different body", book)
+        assert exc.value.status_code == 422
+
+    asyncio.run(scenario())
+
+
+def test_rejections_are_kept_but_shed_requests_run_again():
+    cache = IdempotencyCache(max_keys=10, ttl=60, wait=5)
+
+    def failing(code):
+        async def call():
+            raise HTTPException(status_code=code, detail="nope")
+        return call
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                await cache.run("busy", "same", failing(503))
+        assert cache.stored == 0  # nothing kept; the retry ran
+
+        with pytest.raises(HTTPException):
+            await cache.run("taken", "same", failing(409))
+        replay = await cache.run("taken", "same", failing(500))
+        assert (replay.status_code, replay.body) == (409, b'{"detail":"nope"}')
+
+    asyncio.run(scenario())
+
+
+def test_results_from_other_workers_are_replayed():
+    cache = IdempotencyCache(max_keys=10, ttl=60, wait=5)
+    cache.apply_message({"key": "key-1", "fingerprint": "same", "claim": 2e9})
+    cache.apply_message({"key": "key-1", "fingerprint": "same", "expires_at": 2e9,
+                         "response": [200, [["content-type", "application/json"]], '{"ok":true}']})
+
+    async def not_again():
+        raise AssertionError("ran twice")
+
+    replay = asyncio.run(cache.run("key-1", "same", not_again))
+    assert replay.body == b'{"ok":true}' and replay.headers["content-type"] == "application/json"
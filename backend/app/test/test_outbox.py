@@ -0,0 +1,152 @@
+# app/test/test_outbox.py
+import asyncio
+import time
+
+import aiosmtplib
+import pytest
+
+from app.core.config import settings
+from app.services.notifications import DigestQueue
+from app.services.outbox import Outbox, OutboxWorker
+
+
+@pytest.fixture(autouse=True)
+def mail_sender(monkeypatch):
+    monkeypatch.setattr(settings, "MAIL_FROM", "clinic@example.com")
+
+
+class SmtpStandIn:
+    """Just enough of an SMTP server to accept mail on localhost and record it."""
+
+    def __init__(self, reject: str | None = None):
+        self.reject = reject
+        self.messages: list[bytes] = []
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 stand-in ESMTP\r\n")
+        while line := await reader.readline():
+            verb = line[:4].upper()
+            if verb == b"EHLO":
+                writer.write(b"250-stand-in\r\n250 8BITMIME\r\n")
+            elif verb == b"RCPT" and self.reject and self.reject.encode() in line:
+                writer.write(b"550 No such user\r\n")
+            elif verb == b"DATA":
+                writer.write(b"354 Go ahead\r\n")
+                await writer.drain()
+                data = b""
+                while (chunk := await reader.readline()) != b".\r\n":
+                    data += chunk
+                self.messages.append(data)
+                writer.write(b"250 Queued\r\n")
+            elif verb == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+
+def make_worker(outbox, port):
+    return OutboxWorker(
+        outbox,
+        client_factory=lambda: aiosmtplib.SMTP(hostname="127.0.0.1", port=port, start_tls=False),
+        batch_size=2,
+    )
+
+
+def test_messages_share_one_connection(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.sqlite3")
+    for i in range(5):
+        outbox.enqueue([f"patient{i}@example.com"], f"Appointment {i}", f"<p>Body {i}</p>")
+
+    async def scenario():
+        smtp = SmtpStandIn()
+        port = await smtp.start()
+        await make_worker(outbox, port).drain()
+        await smtp.stop()
+        return smtp
+
+    smtp = asyncio.run(scenario())
+    assert len(smtp.messages) == 5
+    assert smtp.connections == 1
+    assert b"Subject: Appointment 4" in smtp.messages[-1]
+    assert outbox.counts()["by_status"] == {"sent": 5}
+
+
+def test_failures_are_retried_or_dead(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.sqlite3")
+    outbox.enqueue(["nobody@example.com"], "Rejected", "<p>x</p>")
+    outbox.enqueue(["doctor@example.com"], "Retry", "<p>x</p>")
+
+    async def scenario():
+        smtp = SmtpStandIn(reject="nobody@")
+        port = await smtp.start()
+        await smtp.stop()
+        # Server down: nothing is lost, both are rescheduled with backoff
+        await make_worker(outbox, port).drain()
+        return smtp
+
+    asyncio.run(scenario())
+    assert outbox.counts()["by_status"] == {"queued": 2}
+    assert outbox.claim(10) == []  # not due yet
+
+    with outbox.transaction() as conn:
+        conn.execute("UPDATE outbox SET next_attempt_at = ?", (time.time(),))
+
+    async def retry():
+        smtp = SmtpStandIn(reject="nobody@")
+        port = await smtp.start()
+        await make_worker(outbox, port).drain()
+        await smtp.stop()
+        return smtp
+
+    smtp = asyncio.run(retry())
+    assert len(smtp.messages) == 1
+    assert outbox.counts()["by_status"] == {"dead": 1, "sent": 1}
+
+
+def test_unexpected_errors_fail_the_message_not_the_sender(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MAIL_FROM", None)
+    monkeypatch.setattr(settings, "MAIL_USERNAME", None)
+    outbox = Outbox(tmp_path / "outbox.sqlite3")
+    outbox.enqueue(["doctor@example.com"], "No sender", "<p>x</p>")
+
+    asyncio.run(make_worker(outbox, 1).drain())
+    assert outbox.counts()["by_status"] == {"queued": 1}  # retried later, not stuck in "sending"
+    with outbox.transaction() as conn:
+        assert "MAIL_FROM" in conn.execute("SELECT last_error FROM outbox").fetchone()[0]
+
+
+def test_digest_collapses_superseded_events(tmp_path):
+    outbox = Outbox(tmp_path / "outbox.sqlite3")
+    digests = DigestQueue(outbox)
+    digests.add("doc-1", "doc@example.com", "APT-1", "booked", "Pat", "10:00")
+    digests.add("doc-1", "doc@example.com", "APT-1", "cancelled", "Pat", "10:00")  # nets out
+    digests.add("doc-1", "doc@example.com", "APT-2", "booked", "Sam", "11:00")
+    digests.add("doc-1", "doc@example.com", "APT-2", "rescheduled", "Sam", "15:00")
+    digests.add("doc-1", "doc@example.com", "APT-3", "cancelled", "Kim", "12:00")
+    digests.add("doc-2", "other@example.com", "APT-4", "booked", "Lee", "09:00")
+
+    assert digests.flush_due(window_seconds=3600) == 0  # window still open
+    assert digests.flush_due(window_seconds=0) == 2
+
+    messages = sorted(outbox.claim(10), key=lambda m: m["recipients"])
+    assert [m["recipients"] for m in messages] == [["doc@example.com"], ["other@example.com"]]
+    body = messages[0]["body"]
+    assert "APT-1" not in body
+    assert "<b>New appointment</b>: Sam at <b>15:00</b>" in body
+    assert "<b>Cancelled</b>: Kim" in body
+    assert digests.flush_due(window_seconds=0) == 0
@@ -0,0 +1,69 @@
+# app/test/test_scheduling.py
+import pytest
+
+from app.db.appointment_store import AppointmentStore
+from app.services.scheduling import SlotIndex, SlotTaken, parse_slot
+
+
+def test_parse_slot_formats():
+    assert parse_slot("2025-10-02T15:00:00") == ("2025-10-02T15:00:00", "2025-10-02T15:30:00")
+    assert parse_slot("2025-10-02T15:00:00Z") == ("2025-10-02T15:00:00", "2025-10-02T15:30:00")
+    assert parse_slot("10:30 AM", "2025-10-02") == ("2025-10-02T10:30:00", "2025-10-02T11:00:00")
+    assert parse_slot("10:30 AM") is None
+    assert parse_slot("sometime next week") is None
+
+
+def test_slot_index_overlaps():
+    slots = SlotIndex()
+    slots.add("2025-10-02T09:00:00", "2025-10-02T09:30:00", "A")
+    slots.add("2025-10-02T10:00:00", "2025-10-02T10:30:00", "B")
+
+    assert slots.overlapping("2025-10-02T09:30:00", "2025-10-02T10:00:00") == []
+    assert slots.overlapping("2025-10-02T09:15:00", "2025-10-02T09:45:00") == ["A"]
+    assert sorted(slots.overlapping("2025-10-02T09:00:00", "2025-10-02T11:00:00")) == ["A", "B"]
+
+    slots.remove("2025-10-02T09:00:00", "2025-10-02T09:30:00", "A")
+    assert slots.overlapping("2025-10-02T09:15:00", "2025-10-02T09:45:00") == []
+
+
+def test_store_conflicts_follow_status(tmp_path):
+    store = AppointmentStore(tmp_path / "appointments.json")
+    start_at, end_at = parse_slot("2025-10-02T15:00:00")
+    store.add({"appointment_id": "APT-1", "doctor_id": "doc-1", "status": "pending",
+               "start_at": start_at, "end_at": end_at})
+
+    assert [a["appointment_id"] for a in store.find_conflicts("doc-1", start_at, end_at)] == ["APT-1"]
+    assert store.find_conflicts("doc-1", start_at, end_at, exclude_id="APT-1") == []
+    assert store.find_conflicts("doc-2", start_at, end_at) == []
+
+    store.update("APT-1", status="rejected")
+    assert store.find_conflicts("doc-1", start_at, end_at) == []
+
+
+def test_slot_index_finds_longer_slots_behind_shorter_ones():
+    slots = SlotIndex()
+    slots.add("2025-10-02T09:00:00", "2025-10-02T10:00:00", "A")  # booked under a 60 minute slot length
+    slots.add("2025-10-02T09:15:00", "2025-10-02T09:45:00", "B")
+
+    assert slots.overlapping("2025-10-02T09:50:00", "2025-10-02T10:20:00") == ["A"]
+    assert sorted(slots.overlapping("2025-10-02T09:40:00", "2025-10-02T09:50:00")) == ["A", "B"]
+    assert slots.overlapping("2025-10-02T10:00:00", "2025-10-02T10:30:00") == []
+
+
+def test_two_workers_cannot_book_the_same_slot(tmp_path):
+    # Two processes sharing the files; the second hasn't heard about the first's booking
+    first = AppointmentStore(tmp_path / "appointments.json")
+    second = AppointmentStore(tmp_path / "appointments.json")
+    second.load()
+    start_at, end_at = parse_slot("2025-10-02T15:00:00")
+    booking = {"doctor_id": "doc-1", "status": "pending", "start_at": start_at, "end_at": end_at}
+
+    first.add_if_free({**booking, "appointment_id": "APT-1"})
+    with pytest.raises(SlotTaken):
+        second.add_if_free({**booking, "appointment_id": "APT-2"})
+
+    second.add_if_free({**booking, "appointment_id": "APT-2", "start_at": end_at, "end_at": end_at[:11] + "16:00:00"})
+    with pytest.raises(SlotTaken):
+        first.update_if_free("APT-2", start_at=start_at, end_at=end_at)
+    assert first.update_if_free("APT-2", diagnosis="checkup")["start_at"] == end_at
+    assert [a["appointment_id"] for a in AppointmentStore(tmp_path / "appointments.json").find_conflicts("doc-1", start_at, end_at)] == ["APT-1"]
@@ -0,0 +1,58 @@
+# app/test/test_security.py
+import time
+
+import pytest
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.security import RevocationList, create_tokens, decode_token
+from app.db.session import Base
+from app.models.revoked_token import RevokedToken
+from app.models.user import User
+from app.schemas.auth import TokenUser
+
+ADMIN = TokenUser(id="1", role="admin", username="admin", full_name="Admin", email="admin@example.com")
+
+
+@pytest.mark.parametrize("key", ["", "short"])
+def test_tokens_are_refused_without_a_strong_secret_key(monkeypatch, key):
+    forged = jwt.encode({"sub": "1", "role": "admin", "type": "access", "iat": 0, "exp": 2**31}, key, algorithm="HS256")
+    monkeypatch.setattr(settings, "SECRET_KEY", key)
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        decode_token(forged)
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        create_tokens(ADMIN)
+
+
+def test_revocations_survive_a_restart(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "SECRET_KEY", "test-secret-key-that-is-long-enough")
+    engine = create_engine(f"sqlite:///{tmp_path / 'auth.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__, RevokedToken.__table__])
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    db.add(User(id="1", role="doctor", full_name="Doc", email="doc@example.com", username="doc"))
+    db.commit()
+
+    tokens = create_tokens(ADMIN.model_copy(update={"role": "doctor"}))
+    access, refresh = decode_token(tokens["access_token"]), decode_token(tokens["refresh_token"], "refresh")
+    RevocationList().store(db, access, refresh)  # logout
+
+    restarted = RevocationList()
+    assert RevocationList.revoked_in_database(db, refresh, None)
+    assert not restarted.is_revoked(access)
+    restarted.reload(session_factory)
+    assert restarted.is_revoked(access)
+
+    # A password change revokes everything issued before it, also after a restart
+    tokens = create_tokens(ADMIN.model_copy(update={"role": "doctor"}))
+    access, refresh = decode_token(tokens["access_token"]), decode_token(tokens["refresh_token"], "refresh")
+    user = db.get(User, "1")
+    user.tokens_valid_after = time.time()
+    db.commit()
+    assert RevocationList.revoked_in_database(db, refresh, user.tokens_valid_after)
+    restarted = RevocationList()
+    restarted.reload(session_factory)
+    assert restarted.is_revoked(access) and restarted.is_revoked(refresh)
+    db.close()
@@ -0,0 +1,34 @@
+# app/test/test_timing.py
+from app.core.timing import LatencyHistogram, RequestTimings, server_timing, timed
+
+
+def test_nested_phases_count_once():
+    timings = RequestTimings()
+
+    @timed("store")
+    def inner():
+        return "ok"
+
+    @timed("store")
+    def outer():
+        return inner()
+
+    with timings.track() as timing:
+        assert outer() == "ok"
+    assert timing.phases["store"] > 0
+    assert inner() == "ok"  # outside a request: no-op
+
+    timings.record("GET /x", timing, 0.004)
+    header = server_timing(timing, queries=2, seconds=0.004)
+    assert header.startswith("total;dur=4.00, db;dur=0.00;desc=\"2 queries\", store;dur=")
+    assert "auth" not in header
+    assert timings.snapshot()["GET /x"]["requests"] == 1
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in [0.5] * 90 + [40] * 9 + [20000]:
+        histogram.record(ms)
+    assert histogram.percentile(50) <= 1
+    assert 25 < histogram.percentile(95) <= 50
+    assert histogram.percentile(100) == 20000
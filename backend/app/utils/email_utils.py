@@ -1,14 +1,15 @@
-from fastapi_mail import FastMail, MessageSchema
 from typing import List
 from pydantic import EmailStr
-from app.core.config import MAIL_CONFIG
+from app.services.outbox import outbox
 
-async def send_email(to: List[EmailStr], subject: str, body: str):
-    message = MessageSchema(
-        subject=subject,
-        recipients=to,
-        body=body,
-        subtype="html"
-    )
-    fm = FastMail(MAIL_CONFIG)
-    await fm.send_message(message)
+def send_email(to: List[EmailStr], subject: str, body: str) -> int:
+    """Queue an HTML email for delivery; returns the outbox id.
+
+    The message is committed to the outbox before this returns and sent
+    by the outbox worker over a pooled SMTP connection, with retries.
+    """
+    return outbox.enqueue(to, subject, body)
+
+def send_emails(messages: List[tuple[List[EmailStr], str, str]]) -> List[int]:
+    """send_email for several (to, subject, body) messages, committed together."""
+    return outbox.enqueue_many(messages)
@@ -0,0 +1,33 @@
+import os
+import random
+import threading
+import time
+
+# Per-process discriminator so several uvicorn workers never hand out the same id
+_NODE = (os.getpid() ^ random.getrandbits(16)) & 0xFFFF
+
+# Last timestamp handed out, in microseconds; ids keep increasing even if
+# the wall clock steps back or two calls land in the same microsecond.
+# Locked rather than a lock-free itertools.count: following the clock means
+# re-seeding the counter, and two threads re-seeding at once could hand out
+# the same id. The lock only covers a clock read and a compare (well under a
+# microsecond), next to milliseconds of store I/O per booking.
+_lock = threading.Lock()
+_last = 0
+
+
+def _next_timestamp() -> int:
+    global _last
+    with _lock:
+        _last = max(_last + 1, time.time_ns() // 1000)
+        return _last
+
+
+def new_appointment_id() -> str:
+    """Return a unique, time-ordered appointment id like APT-1792266330123456-3fa2.
+
+    The numeric part is the creation time in microseconds, fixed width, so
+    ids from one process sort lexicographically in issue order and ids
+    from different processes by creation time.
+    """
+    return f"APT-{_next_timestamp():016d}-{_NODE:04x}"
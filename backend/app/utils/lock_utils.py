@@ -0,0 +1,56 @@
+import threading
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+SHARDS = 64
+
+
+class ShardedLock:
+    """A fixed pool of locks picked by hashing a key (e.g. a doctor id).
+
+    Writers for the same key are serialized while different keys usually
+    land on different shards and run in parallel. Memory stays constant no
+    matter how many keys exist.
+    """
+
+    def __init__(self, shards: int = SHARDS):
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def _shard(self, key) -> int:
+        return hash(str(key)) % len(self._locks)
+
+    @contextmanager
+    def hold(self, *keys):
+        # Acquire each distinct shard once, always in index order, so two
+        # callers locking the same pair of keys can't deadlock.
+        shards = sorted({self._shard(k) for k in keys if k is not None})
+        acquired = []
+        try:
+            for shard in shards:
+                self._locks[shard].acquire()
+                acquired.append(shard)
+            yield
+        finally:
+            for shard in reversed(acquired):
+                self._locks[shard].release()
+
+
+# Serializes appointment writes per doctor
+doctor_locks = ShardedLock()
+
+
+@contextmanager
+def holding_appointment(store, appointment_id: str, *doctor_ids: str):
+    """Hold doctor_locks for the appointment's doctor (and `doctor_ids`) and yield the
+    appointment as read under them, so a write that got in first isn't overwritten.
+    Looks again if it moved to another doctor while waiting for the locks."""
+    while True:
+        seen = store.get(appointment_id)
+        if seen is None:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        with doctor_locks.hold(seen.get("doctor_id"), *doctor_ids):
+            appointment = store.get(appointment_id)
+            if appointment is not None and appointment.get("doctor_id") == seen.get("doctor_id"):
+                yield appointment
+                return
@@ -0,0 +1,97 @@
+"""Doctor search latency over a large synthetic directory.
+
+Builds the in-memory search index from generated doctors (no database)
+and times DoctorSearchIndex.search for typical queries: short and long
+name prefixes, typos, specialization filters and deep pages, both cold
+(result cache cleared, as right after a write) and cached. Also times
+single-doctor upserts, the cost every doctor write pays to keep the
+index current.
+
+Usage (from backend/):
+    python -m benchmarks.bench_doctor_search --doctors 100000 --repeat 200
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-not-for-production")
+for var in ("MAIL_USERNAME", "MAIL_PASSWORD"):
+    os.environ.setdefault(var, "bench")
+os.environ.setdefault("MAIL_FROM", "bench@example.com")
+
+from app.services.doctor_search import DoctorSearchIndex  # noqa: E402
+
+FIRST = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+         "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+         "Priya", "Wei", "Fatima", "Mohammed", "José", "Aiko", "Olga", "Kwame", "Ananya", "Lars"]
+SPECIALIZATIONS = ["Cardiology", "Dermatology", "Neurology", "Pediatrics", "Oncology", "Orthopedics",
+                   "Psychiatry", "Radiology", "Gastroenterology", "Ophthalmology", "Urology", "Endocrinology"]
+
+QUERIES = [
+    ("all, first page", {}),
+    ("prefix 'j'", {"q": "j"}),
+    ("prefix 'mar'", {"q": "mar"}),
+    ("two terms", {"q": "mary h"}),
+    ("typo 'jhon'", {"q": "jhon"}),
+    ("rare surname", {"q": "zzqx"}),
+    ("specialization", {"specializations": ["Neurology"]}),
+    ("prefix + spec", {"q": "s", "specializations": ["Oncology", "Urology"]}),
+    ("deep page", {"q": "m", "offset": 5000}),
+]
+
+
+def make_surnames(count: int, rng: random.Random) -> list[str]:
+    letters = "abcdefghijklmnoprstuvwy"
+    return [rng.choice(letters).upper() + "".join(rng.choice(letters) for _ in range(rng.randint(4, 8)))
+            for _ in range(count)]
+
+
+def make_doctors(count: int, seed: int = 7) -> list[tuple[str, str, str]]:
+    rng = random.Random(seed)
+    surnames = make_surnames(max(count // 10, 100), rng) + ["Hartwell"]
+    return [
+        (f"doc-{i}", f"{rng.choice(FIRST)} {rng.choice(surnames)}", rng.choice(SPECIALIZATIONS))
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--doctors", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = make_doctors(args.doctors)
+    index = DoctorSearchIndex()
+    started = time.perf_counter()
+    index.build(rows)
+    print(f"built index of {args.doctors} doctors in {time.perf_counter() - started:.2f}s: {index.snapshot()}")
+
+    print(f"{'query':>18} {'total':>8} {'cold_p50':>9} {'cold_p99':>9} {'cached_p50':>11}")
+    for label, params in QUERIES:
+        cold, cached = [], []
+        for _ in range(args.repeat):
+            index._results.clear()
+            t = time.perf_counter()
+            result = index.search(**params)
+            cold.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            index.search(**params)
+            cached.append(time.perf_counter() - t)
+        cold.sort()
+        print(f"{label:>18} {result['total']:>8} {statistics.median(cold) * 1000:>9.2f} "
+              f"{cold[int(len(cold) * 0.99) - 1] * 1000:>9.2f} {statistics.median(cached) * 1000:>11.3f}")
+
+    timings = []
+    for i in range(args.repeat):
+        t = time.perf_counter()
+        index.upsert(f"doc-{i}", f"Renamed Doctor{i}", "Cardiology")
+        timings.append(time.perf_counter() - t)
+    print(f"{'upsert':>18} {'':>8} {statistics.median(timings) * 1000:>9.2f} {max(timings) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Login throughput / latency under concurrent logins.
+
+Runs the FastAPI app in-process (httpx ASGI transport) against a
+throwaway SQLite database, seeds doctors with argon2 hashes, then fires
+concurrent /doctor/doctor/login requests while a probe keeps hitting
+GET / to show whether the event loop stays responsive.
+
+Usage (from backend/):
+    python -m benchmarks.bench_login --logins 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_login.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_PATH}")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-not-for-production")
+
+import httpx  # noqa: E402
+
+from app.core.passwords import credential_verifier, pwd_context  # noqa: E402
+from app.db.session import Base, SessionLocal, database  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+PASSWORD = "Doctor#Pass1"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed(doctors: int):
+    Base.metadata.create_all(database.engine, tables=[User.__table__])
+    password_hash = pwd_context.hash(PASSWORD)
+    db = SessionLocal()
+    db.query(User).delete()
+    for i in range(doctors):
+        db.add(User(id=f"doc-{i}", role="doctor", username=f"doctor{i}", full_name=f"Doctor {i}",
+                    email=f"doctor{i}@example.com", password_hash=password_hash))
+    db.commit()
+    db.close()
+
+
+async def run(logins: int, concurrency: int, doctors: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    latencies, probe_latencies, statuses = [], [], {}
+    queue = asyncio.Queue()
+    for i in range(logins):
+        queue.put_nowait(i)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while True:
+                try:
+                    i = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                body = {"username": f"doctor{i % doctors}", "password": PASSWORD}
+                started = time.perf_counter()
+                response = await client.post("/doctor/doctor/login", json=body)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "hash_workers": credential_verifier.workers,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(logins / elapsed, 1),
+        "login_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "login_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "statuses": statuses,
+        "loop_probe_p99_ms": round(percentile(probe_latencies, 99) * 1000, 1) if probe_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--doctors", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.doctors)
+    result = asyncio.run(run(args.logins, args.concurrency, args.doctors))
+    for key, value in result.items():
+        print(f"{key:>18}: {value}")
+
+
+if __name__ == "__main__":
+    main()
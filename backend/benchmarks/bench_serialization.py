@@ -0,0 +1,123 @@
+"""Response serialization cost for large appointment / doctor lists.
+
+Mounts the same 10k-element payload behind a few tiny FastAPI apps and
+times full in-process requests (httpx ASGI transport), so only the
+response path differs:
+
+    untyped        ad-hoc dict, no response model (jsonable_encoder + json.dumps)
+    list_of_dict   response_model=List[dict] / dict-valued page
+    orjson         ORJSONResponse as the default response class, no model
+    typed          typed schemas from app/schemas (what the routers use)
+    typed_orjson   typed schemas with ORJSONResponse as the default
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization --rows 10000 --repeat 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import warnings
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+
+from app.schemas.appointment import AppointmentPage
+from app.schemas.doctor import DoctorOut
+
+# ORJSONResponse is deprecated in recent FastAPI releases; it is measured here on purpose
+warnings.filterwarnings("ignore", message="ORJSONResponse is deprecated")
+
+
+def make_appointments(rows: int) -> list[dict]:
+    return [
+        {
+            "appointment_id": f"APT-{1760000000000000 + i:016d}-0a1b",
+            "doctor_id": f"doc-{i % 50}",
+            "doctor_name": f"Doctor {i % 50}",
+            "doctor_email": f"doctor{i % 50}@example.com",
+            "specialization": "Cardiology",
+            "patient_username": f"patient{i}",
+            "patient_full_name": f"Patient {i}",
+            "patient_email": f"patient{i}@example.com",
+            "time": "2025-10-02T15:00:00",
+            "start_at": "2025-10-02T15:00:00",
+            "end_at": "2025-10-02T15:30:00",
+            "status": "pending",
+            "created_at": "2025-10-01T09:12:44.120931",
+        }
+        for i in range(rows)
+    ]
+
+
+def make_doctors(rows: int) -> list[dict]:
+    return [
+        {"id": f"doc-{i}", "name": f"Doctor {i}", "email": f"doctor{i}@example.com", "specialization": "Cardiology"}
+        for i in range(rows)
+    ]
+
+
+def build_app(variant: str, appointments: list[dict], doctors: list[dict]) -> FastAPI:
+    orjson_default = variant in ("orjson", "typed_orjson")
+    app = FastAPI(default_response_class=ORJSONResponse) if orjson_default else FastAPI()
+    page = {"appointments": appointments, "next_cursor": None}
+
+    if variant in ("typed", "typed_orjson"):
+        @app.get("/appointments", response_model=AppointmentPage, response_model_exclude_unset=True)
+        def typed_appointments():
+            return page
+
+        @app.get("/doctors", response_model=List[DoctorOut])
+        def typed_doctors():
+            return doctors
+    elif variant == "list_of_dict":
+        @app.get("/appointments", response_model=dict)
+        def dict_appointments():
+            return page
+
+        @app.get("/doctors", response_model=List[dict])
+        def dict_doctors():
+            return doctors
+    else:
+        @app.get("/appointments")
+        def untyped_appointments():
+            return page
+
+        @app.get("/doctors")
+        def untyped_doctors():
+            return doctors
+
+    return app
+
+
+async def time_requests(app: FastAPI, path: str, repeat: int) -> tuple[list[float], int]:
+    timings = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.get(path)  # warm-up
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = await client.get(path)
+            timings.append(time.perf_counter() - started)
+    return timings, len(response.content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    appointments, doctors = make_appointments(args.rows), make_doctors(args.rows)
+    print(f"{'variant':>14} {'endpoint':>14} {'median_ms':>10} {'min_ms':>8} {'bytes':>10}")
+    for variant in ("untyped", "list_of_dict", "orjson", "typed", "typed_orjson"):
+        app = build_app(variant, appointments, doctors)
+        for path in ("/appointments", "/doctors"):
+            timings, size = asyncio.run(time_requests(app, path, args.repeat))
+            print(f"{variant:>14} {path:>14} {statistics.median(timings) * 1000:>10.1f} "
+                  f"{min(timings) * 1000:>8.1f} {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Cold start time of a worker: interpreter + `import app.main` + lifespan startup.
+
+Each run is a fresh Python process against a throwaway SQLite database
+(or DATABASE_URL if set), so nothing is cached in-process between runs.
+Reports the median of --runs for each stage, then the slowest imports of
+one run from `python -X importtime`.
+
+Usage (from backend/):
+    python -m benchmarks.cold_start --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Run in the child process: time the import and the lifespan startup separately
+CHILD = r"""
+import asyncio, json, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+async def boot():
+    async with app.main.lifespan(app.main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(boot())
+print(json.dumps({
+    "import": imported - started,
+    "lifespan": ready - imported,
+    "steps": app.main.startup_timings,
+}))
+"""
+
+SETUP = """
+from app.db.session import Base, database
+import app.models.appointment, app.models.user
+Base.metadata.create_all(database.engine)
+"""
+
+
+def child_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'cold_start.db')}")
+    env.setdefault("SECRET_KEY", "bench-secret-key-not-for-production")
+    env.setdefault("APPOINTMENT_PATH", os.path.join(workdir, "appointments.json"))
+    env.setdefault("OUTBOX_PATH", os.path.join(workdir, "outbox.sqlite3"))
+    return env
+
+
+def run(env: dict) -> dict:
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - started
+    return result
+
+
+def slowest_imports(env: dict, top: int) -> list[tuple[float, str]]:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                         env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = child_env(workdir)
+        subprocess.run([sys.executable, "-c", SETUP], env=env, check=True)
+        results = [run(env) for _ in range(args.runs)]
+
+        print(f"{args.runs} runs, median (min-max) in ms")
+        for stage in ("process", "import", "lifespan"):
+            values = [r[stage] * 1000 for r in results]
+            print(f"  {stage:<20} {statistics.median(values):8.1f}  ({min(values):.1f}-{max(values):.1f})")
+        for step in results[0]["steps"]:
+            values = [r["steps"][step] * 1000 for r in results if step in r["steps"]]
+            print(f"    {step:<18} {statistics.median(values):8.1f}")
+
+        print(f"\nslowest imports (cumulative ms, one run)")
+        for ms, name in slowest_imports(env, args.top):
+            print(f"  {ms:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+"""Mixed-traffic load test for the scheduling API.
+
+Seeds a local stand-in database (SQLite plus the JSON appointment store,
+or the appointments table with --backend sql) with synthetic doctors,
+patients and 10k-1M appointments, then drives a weighted mix of
+
+    book        POST /patient/patient/appointments/book
+    pending     GET  /doctor/doctor/appointments/pending
+    decide      PUT  /doctor/doctor/appointments/{id}/decision
+    reschedule  PUT  /patient/patient/appointments/reschedule/{id}
+    admin_list  GET  /admin/admin/appointments?limit=100
+
+from --concurrency workers and reports throughput and p50/p95/p99 latency
+per endpoint. Every run is written as JSON (config, git commit, results)
+under benchmarks/results/, and --compare prints the change against an
+earlier result file.
+
+Seeding and traffic are deterministic for a given --seed, so runs are
+comparable. 409s from bookings that hit a taken slot are expected and
+not counted as errors.
+
+Usage (from backend/):
+    # in-process (httpx ASGI transport), seeded into a throwaway directory
+    python -m benchmarks.load_test --appointments 10000 --requests 5000
+
+    # against uvicorn: seed, start the server with the printed environment, then drive it
+    python -m benchmarks.load_test --data-dir /tmp/lt --appointments 1000000 --seed-only
+    python -m benchmarks.load_test --data-dir /tmp/lt --appointments 1000000 --url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+OPERATIONS = ("book", "pending", "decide", "reschedule", "admin_list")
+DEFAULT_MIX = "book=25,pending=30,decide=20,reschedule=10,admin_list=15"
+
+# Seeded appointments fill each doctor's 08:00-16:00 working day, 30 minutes apart, from SEED_START on;
+# new bookings go to SEED_START + 10 years so they never collide with seeded ones
+SEED_START = datetime(2024, 1, 1, 8, 0)
+SLOTS_PER_DAY = 16
+BOOKING_START = datetime(2034, 1, 1, 8, 0)
+
+SEED_STATUSES = (("pending", 40), ("accepted", 35), ("rejected", 10), ("rescheduled", 15))
+
+ADMIN_AUTH = ("danielle.johnsonA01", "Admin#01Pass")
+PASSWORD = "Load#Test1"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"unknown operation in --mix: {name.strip()} (choose from {', '.join(OPERATIONS)})")
+        weights[name.strip()] = int(weight)
+    return weights
+
+
+def configure_environment(args):
+    """Point the app at the load-test data directory; must run before anything imports app.*"""
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{data_dir / 'load_test.db'}"
+    os.environ["APPOINTMENT_BACKEND"] = args.backend
+    os.environ["APPOINTMENT_PATH"] = str(data_dir / "appointments.json")
+    os.environ["OUTBOX_PATH"] = str(data_dir / "outbox.sqlite3")
+    os.environ.setdefault("SECRET_KEY", "load-test-secret-key-not-for-production")
+    for var in ("MAIL_USERNAME", "MAIL_PASSWORD"):
+        os.environ.setdefault(var, "load-test")
+    os.environ.setdefault("MAIL_FROM", "load-test@example.com")
+    # Enough connections for the worker count, so the pool is not what gets measured
+    os.environ.setdefault("DB_POOL_SIZE", str(max(args.concurrency, 5)))
+    # A few clients book for many patients at full speed; per-client limits would only measure 429s
+    for var in ("RATE_LIMIT_PATIENT_PER_SECOND", "RATE_LIMIT_IP_PER_SECOND"):
+        os.environ.setdefault(var, "0")
+
+
+def slot_time(start: datetime, k: int) -> str:
+    day, slot = divmod(k, SLOTS_PER_DAY)
+    return (start + timedelta(days=day, minutes=30 * slot)).isoformat()
+
+
+# ======================
+# Synthetic data
+# ======================
+class Dataset:
+    """Deterministic users and appointments for a given size and seed."""
+
+    def __init__(self, doctors: int, patients: int, appointments: int, seed: int):
+        self.doctor_ids = [f"load-doc-{i}" for i in range(doctors)]
+        self.patients = [f"loadpatient{i}" for i in range(patients)]
+        self.appointments = appointments
+        self.seed = seed
+
+    def appointment_rows(self):
+        rng = random.Random(self.seed)
+        statuses = [s for s, weight in SEED_STATUSES for _ in range(weight)]
+        created = SEED_START.isoformat()
+        doctors = len(self.doctor_ids)
+        for i in range(self.appointments):
+            d, k = i % doctors, i // doctors
+            patient = rng.choice(self.patients)
+            start = slot_time(SEED_START, k)
+            yield {
+                "appointment_id": f"APT-{1700000000000000 + i:016d}-{i % 65536:04x}",
+                "doctor_id": self.doctor_ids[d],
+                "doctor_name": f"Doctor {d}",
+                "doctor_email": f"load-doc-{d}@example.com",
+                "specialization": "General",
+                "patient_username": patient,
+                "patient_full_name": f"Patient {patient[11:]}",
+                "patient_email": f"{patient}@example.com",
+                "time": start,
+                "start_at": start,
+                "end_at": (datetime.fromisoformat(start) + timedelta(minutes=30)).isoformat(),
+                "status": rng.choice(statuses),
+                "created_at": created,
+            }
+
+    def seed_database(self, backend: str, appointment_path: Path):
+        from sqlalchemy import insert
+
+        from app.core.passwords import pwd_context
+        from app.db.session import Base, SessionLocal, database
+        from app.models.appointment import Appointment
+        from app.models.revoked_token import RevokedToken
+        from app.models.user import User
+
+        tables = [User.__table__, Appointment.__table__, RevokedToken.__table__]
+        Base.metadata.drop_all(database.engine, tables=tables)
+        Base.metadata.create_all(database.engine, tables=tables)
+        password_hash = pwd_context.hash(PASSWORD)
+        users = [
+            {"id": doctor_id, "role": "doctor", "username": doctor_id, "full_name": f"Doctor {i}",
+             "email": f"{doctor_id}@example.com", "password_hash": password_hash, "specialization": "General",
+             "notification_mode": "immediate"}
+            for i, doctor_id in enumerate(self.doctor_ids)
+        ] + [
+            {"id": f"id-{username}", "role": "patient", "username": username, "full_name": f"Patient {username[11:]}",
+             "email": f"{username}@example.com", "password_hash": password_hash, "notification_mode": "immediate"}
+            for username in self.patients
+        ]
+        with SessionLocal() as db:
+            db.execute(insert(User), users)
+            if backend == "sql":
+                batch = []
+                for row in self.appointment_rows():
+                    batch.append(row)
+                    if len(batch) == 10_000:
+                        db.execute(insert(Appointment), batch)
+                        batch = []
+                if batch:
+                    db.execute(insert(Appointment), batch)
+            db.commit()
+
+        appointment_path.with_suffix(".journal").unlink(missing_ok=True)
+        # Streamed out row by row so 1M appointments never sit in memory twice
+        with open(appointment_path, "w", encoding="utf-8") as f:
+            f.write('{"appointments":[')
+            for i, row in enumerate(self.appointment_rows() if backend == "json" else ()):
+                f.write(("," if i else "") + json.dumps(row, separators=(",", ":")))
+            f.write("]}")
+
+
+# ======================
+# Traffic
+# ======================
+class Traffic:
+    """Picks the next request of the mix and tracks the ids later requests need."""
+
+    def __init__(self, dataset: Dataset, weights: dict[str, int], seed: int):
+        from app.core.security import create_tokens
+        from app.schemas.auth import TokenUser
+
+        self.rng = random.Random(seed + 1)
+        self.operations = list(weights)
+        self.weights = list(weights.values())
+        self.doctor_ids = dataset.doctor_ids
+        self.patients = dataset.patients
+        self.pending: dict[str, list[str]] = {d: [] for d in dataset.doctor_ids}
+        self.active: list[tuple[str, str]] = []  # (appointment_id, patient_username)
+        for row in dataset.appointment_rows():
+            if row["status"] == "pending":
+                self.pending[row["doctor_id"]].append(row["appointment_id"])
+            if row["status"] != "rejected" and len(self.active) < 100_000:
+                self.active.append((row["appointment_id"], row["patient_username"]))
+        # Minted directly instead of logging in: login cost is what bench_login measures
+        self.tokens = {
+            doctor_id: create_tokens(TokenUser(id=doctor_id, username=doctor_id, full_name=doctor_id,
+                                               email=f"{doctor_id}@example.com", role="doctor"))["access_token"]
+            for doctor_id in dataset.doctor_ids
+        }
+        self.booking_slots = 0
+
+    def next_request(self) -> tuple[str, str, str, dict]:
+        """(operation, method, url, httpx request kwargs)"""
+        op = self.rng.choices(self.operations, self.weights)[0]
+        doctor_id = self.rng.choice(self.doctor_ids)
+        if op == "decide":
+            with_pending = [d for d in (doctor_id, *self.rng.sample(self.doctor_ids, min(8, len(self.doctor_ids))))
+                            if self.pending[d]]
+            if not with_pending:
+                op = "pending"
+            else:
+                doctor_id = with_pending[0]
+                appointment_id = self.pending[doctor_id].pop(self.rng.randrange(len(self.pending[doctor_id])))
+                return op, "PUT", f"/doctor/doctor/appointments/{appointment_id}/decision", {
+                    "params": {"decision": self.rng.choice(("accepted", "rejected"))},
+                    "headers": {"Authorization": f"Bearer {self.tokens[doctor_id]}"},
+                }
+        if op == "pending":
+            return op, "GET", "/doctor/doctor/appointments/pending", {
+                "headers": {"Authorization": f"Bearer {self.tokens[doctor_id]}"},
+            }
+        if op == "book":
+            self.booking_slots += 1
+            return op, "POST", "/patient/patient/appointments/book", {
+                "params": {"patient_username": self.rng.choice(self.patients)},
+                "json": {"doctor_id": doctor_id, "time": slot_time(BOOKING_START, self.rng.randrange(100_000))},
+            }
+        if op == "reschedule":
+            appointment_id, patient = self.rng.choice(self.active)
+            return op, "PUT", f"/patient/patient/appointments/reschedule/{appointment_id}", {
+                "params": {"patient_username": patient,
+                           "new_time": slot_time(BOOKING_START, 100_000 + self.rng.randrange(100_000))},
+            }
+        return "admin_list", "GET", "/admin/admin/appointments", {
+            "params": {"limit": 100, **({"status": "pending"} if self.rng.random() < 0.5 else {})},
+            "auth": ADMIN_AUTH,
+        }
+
+    def record(self, op: str, response) -> bool:
+        """Remember ids from a response; True when the status is an expected outcome."""
+        if op == "book":
+            if response.status_code == 200:
+                appointment_id = response.json()["appointment_id"]
+                doctor_id = json.loads(response.request.content)["doctor_id"]
+                self.pending[doctor_id].append(appointment_id)
+                return True
+            return response.status_code == 409  # slot already taken
+        if op == "reschedule":
+            return response.status_code in (200, 404, 409)  # 404: cancelled/removed meanwhile
+        return response.status_code == 200
+
+
+async def drive(client, traffic: Traffic, requests: int, concurrency: int) -> dict:
+    samples: dict[str, list[float]] = {}
+    statuses: dict[str, dict[str, int]] = {}
+    errors: dict[str, int] = {}
+    remaining = [requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            op, method, url, kwargs = traffic.next_request()
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            samples.setdefault(op, []).append(time.perf_counter() - started)
+            codes = statuses.setdefault(op, {})
+            codes[str(response.status_code)] = codes.get(str(response.status_code), 0) + 1
+            if not traffic.record(op, response):
+                errors[op] = errors.get(op, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"samples": samples, "statuses": statuses, "errors": errors}
+
+
+async def run_traffic(args, traffic: Traffic) -> dict:
+    import httpx
+
+    if args.url:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=args.concurrency))
+        base_url = args.url
+    else:
+        from app.main import app
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://load-test"
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60) as client:
+        if args.warmup:
+            await drive(client, traffic, args.warmup, args.concurrency)
+        started = time.perf_counter()
+        outcome = await drive(client, traffic, args.requests, args.concurrency)
+        elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for op, values in sorted(outcome["samples"].items()):
+        endpoints[op] = {
+            "requests": len(values),
+            "throughput_per_s": round(len(values) / elapsed, 1),
+            "errors": outcome["errors"].get(op, 0),
+            "statuses": outcome["statuses"][op],
+            "mean_ms": round(statistics.fmean(values) * 1000, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(max(values) * 1000, 2),
+        }
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": args.requests,
+        "throughput_per_s": round(args.requests / elapsed, 1),
+        "errors": sum(outcome["errors"].values()),
+        "endpoints": endpoints,
+    }
+
+
+# ======================
+# Reporting
+# ======================
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result: dict):
+    totals = result["results"]
+    print(f"\n{totals['requests']} requests in {totals['elapsed_s']}s: "
+          f"{totals['throughput_per_s']} req/s, {totals['errors']} errors")
+    print(f"{'endpoint':>12} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8}")
+    for op, e in totals["endpoints"].items():
+        print(f"{op:>12} {e['requests']:>9} {e['throughput_per_s']:>8} {e['errors']:>7} "
+              f"{e['p50_ms']:>8} {e['p95_ms']:>8} {e['p99_ms']:>8} {e['max_ms']:>8}")
+
+
+def print_comparison(result: dict, baseline_path: str):
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    differs = {k: (baseline["config"].get(k), v) for k, v in result["config"].items()
+               if k != "seed_seconds" and baseline["config"].get(k) != v}
+    if differs:
+        print("  note, config differs: " + ", ".join(f"{k} {old} -> {new}" for k, (old, new) in differs.items()))
+    print(f"{'endpoint':>12} {'req/s':>16} {'p50_ms':>16} {'p95_ms':>16} {'p99_ms':>16}")
+
+    def delta(new, old):
+        change = f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+        return f"{new} ({change})"
+
+    for op, e in result["results"]["endpoints"].items():
+        old = baseline["results"]["endpoints"].get(op)
+        if old is None:
+            continue
+        print(f"{op:>12} {delta(e['throughput_per_s'], old['throughput_per_s']):>16} "
+              f"{delta(e['p50_ms'], old['p50_ms']):>16} {delta(e['p95_ms'], old['p95_ms']):>16} "
+              f"{delta(e['p99_ms'], old['p99_ms']):>16}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=10_000)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--patients", type=int, default=5_000)
+    parser.add_argument("--backend", choices=("json", "sql"), default="json")
+    parser.add_argument("--requests", type=int, default=5_000, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight,... (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", help="where the database and store live (default: a temp dir)")
+    parser.add_argument("--seed-only", action="store_true", help="seed --data-dir and print the server environment")
+    parser.add_argument("--url", help="drive a running server (seeded with --seed-only) instead of the in-process app")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<backend>-<size>-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    if args.url and not args.data_dir:
+        parser.error("--url needs the --data-dir that was seeded for the server")
+    args.data_dir = args.data_dir or tempfile.mkdtemp(prefix="load-test-")
+    configure_environment(args)
+
+    dataset = Dataset(args.doctors, args.patients, args.appointments, args.seed)
+    seed_seconds = None
+    if not args.url:
+        started = time.perf_counter()
+        dataset.seed_database(args.backend, Path(os.environ["APPOINTMENT_PATH"]))
+        seed_seconds = round(time.perf_counter() - started, 2)
+        print(f"seeded {args.doctors} doctors, {args.patients} patients, {args.appointments} appointments "
+              f"({args.backend}) in {seed_seconds}s")
+    if args.seed_only:
+        print("\nStart the server with:")
+        for var in ("DATABASE_URL", "APPOINTMENT_BACKEND", "APPOINTMENT_PATH", "OUTBOX_PATH", "SECRET_KEY",
+                    "RATE_LIMIT_PATIENT_PER_SECOND", "RATE_LIMIT_IP_PER_SECOND"):
+            print(f"    export {var}={os.environ[var]}")
+        print("    uvicorn app.main:app")
+        return
+
+    traffic = Traffic(dataset, weights, args.seed)
+    results = asyncio.run(run_traffic(args, traffic))
+    result = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "target": args.url or "in-process",
+        },
+        "config": {
+            "backend": args.backend,
+            "appointments": args.appointments,
+            "doctors": args.doctors,
+            "patients": args.patients,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "mix": weights,
+            "seed": args.seed,
+            "seed_seconds": seed_seconds,
+        },
+        "results": results,
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{args.backend}-{args.appointments}-{datetime.utcnow():%Y%m%dT%H%M%SZ}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print_report(result)
+    if args.compare:
+        print_comparison(result, args.compare)
+    print(f"\nresults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,9 +20,22 @@ export const loginAdmin = async (username, password) => {
 // --------------------
 // Appointments
 // --------------------
-export const getAppointments = async () => {
-  const res = await axios.get(`${API_BASE}/appointments`, { auth: AUTH });
-  return res.data.appointments;
+// One page of appointments; pass its next_cursor back for the next one (null after the last page)
+export const getAppointments = async ({ cursor, limit = 50 } = {}) => {
+  const res = await axios.get(`${API_BASE}/appointments`, {
+    params: { limit, ...(cursor && { cursor }) },
+    auth: AUTH,
+  });
+  return res.data;
+};
+
+// Counts by status / doctor / day, kept up to date on the server (no need to download every appointment)
+export const getAppointmentStats = async ({ dateFrom, dateTo } = {}) => {
+  const res = await axios.get(`${API_BASE}/stats`, {
+    params: { date_from: dateFrom, date_to: dateTo },
+    auth: AUTH,
+  });
+  return res.data;
 };
 
 export const addAppointment = async (appointmentData) => {
@@ -46,6 +59,15 @@ export const getDoctors = async () => {
   return res.data;
 };
 
+// Server-side search: name prefix / typo matching, specialization filter and counts
+export const searchDoctors = async ({ q, specialization, offset = 0, limit = 20 } = {}) => {
+  const res = await axios.get("http://127.0.0.1:8000/doctor/doctor/search", {
+    params: { q, specialization, offset, limit },
+    paramsSerializer: { indexes: null }, // specialization=a&specialization=b
+  });
+  return res.data;
+};
+
 export const addDoctor = async (name, email, password, specialization) => {
   const res = await axios.post(
     `${API_BASE}/doctors`,
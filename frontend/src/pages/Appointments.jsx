@@ -4,6 +4,7 @@ import doctorSpecializationsData from "../data/doctorSpecializations.json";
 
 const Appointments = () => {
   const [appointments, setAppointments] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [doctors, setDoctors] = useState([]);
   const [diagnoses, setDiagnoses] = useState([
     "Cardiology",
@@ -38,10 +39,21 @@ const Appointments = () => {
     "General": "General"
   };
 
-  // Fetch appointments
+  // Fetch appointments, a page at a time
   const fetchAppointments = async () => {
-    const data = await getAppointments();
-    setAppointments(data);
+    const page = await getAppointments();
+    setAppointments(page.appointments);
+    setNextCursor(page.next_cursor);
+  };
+
+  const loadMore = async () => {
+    const page = await getAppointments({ cursor: nextCursor });
+    // Skip ones already shown (added here since the first page was fetched)
+    setAppointments(shown => [
+      ...shown,
+      ...page.appointments.filter(a => !shown.some(s => s.appointment_id === a.appointment_id))
+    ]);
+    setNextCursor(page.next_cursor);
   };
 
   // Fetch doctors
@@ -192,6 +204,7 @@ const Appointments = () => {
           ))}
         </tbody>
       </table>
+      {nextCursor && <button onClick={loadMore} style={{ marginTop: "10px" }}>Load more</button>}
     </div>
   );
 };
@@ -1,20 +1,28 @@
 import React, { useEffect, useState } from "react";
 import Sidebar from "../components/Sidebar";
-import { getDoctors, getAppointments } from "../api/admin";
+import { getDoctors, getAppointments, getAppointmentStats } from "../api/admin";
+
+// Appointments shown per page; the totals come from getAppointmentStats
+const PAGE_SIZE = 20;
 
 export default function Dashboard({ admin }) {
   const [doctors, setDoctors] = useState([]);
   const [appointments, setAppointments] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [stats, setStats] = useState(null);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
         const docs = await getDoctors();
-        const apps = await getAppointments();
+        const page = await getAppointments({ limit: PAGE_SIZE });
+        const counts = await getAppointmentStats();
 
         // ✅ Use DB specialization directly
         setDoctors(docs);
-        setAppointments(apps);
+        setAppointments(page.appointments);
+        setNextCursor(page.next_cursor);
+        setStats(counts);
       } catch (err) {
         console.error("Error loading dashboard data:", err);
       }
@@ -22,6 +30,16 @@ export default function Dashboard({ admin }) {
     fetchData();
   }, []);
 
+  const loadMore = async () => {
+    try {
+      const page = await getAppointments({ cursor: nextCursor, limit: PAGE_SIZE });
+      setAppointments((shown) => [...shown, ...page.appointments]);
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      console.error("Error loading more appointments:", err);
+    }
+  };
+
   return (
     <div style={{ display: "flex" }}>
       <Sidebar />
@@ -29,6 +47,27 @@ export default function Dashboard({ admin }) {
         <h2>Welcome, {admin}</h2>
         <p>Here’s a quick overview of your system.</p>
 
+        {/* Appointment Counts */}
+        {stats && (
+          <div style={{ display: "flex", gap: "15px", flexWrap: "wrap", marginBottom: "30px" }}>
+            {[["total", stats.total], ...Object.entries(stats.by_status)].map(([label, count]) => (
+              <div
+                key={label}
+                style={{
+                  border: "1px solid #ddd",
+                  borderRadius: "8px",
+                  padding: "15px",
+                  minWidth: "120px",
+                  background: "#f9f9f9",
+                }}
+              >
+                <p style={{ margin: 0, color: "#666", textTransform: "capitalize" }}>{label}</p>
+                <h3 style={{ margin: "5px 0 0" }}>{count}</h3>
+              </div>
+            ))}
+          </div>
+        )}
+
         {/* Doctors Section */}
         <h3>Doctors Overview</h3>
         <div
@@ -60,7 +99,7 @@ export default function Dashboard({ admin }) {
         </div>
 
         {/* Appointments Section */}
-        <h3>Recent Appointments</h3>
+        <h3>Appointments</h3>
         <table
           border="1"
           cellPadding="8"
@@ -106,6 +145,11 @@ export default function Dashboard({ admin }) {
             )}
           </tbody>
         </table>
+        {nextCursor && (
+          <button onClick={loadMore} style={{ marginTop: "10px" }}>
+            Load more
+          </button>
+        )}
       </div>
     </div>
   );